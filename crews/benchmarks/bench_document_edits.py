@@ -0,0 +1,91 @@
+"""
+Compare edit_document with the single-pass edit_document_batched and edit_document_streaming,
+reporting the best time and the peak Python memory of one run, then time validating the same
+edits from JSON: model_validate_json per payload, against parse_compact_edits per payload and
+parse_edit_batch, which validate into the compact form without building the models.
+
+    python -m benchmarks.bench_document_edits [--lines 10000] [--edits 1000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from crews.document_edits import DocumentEdits, DocumentLineAdd, DocumentLineEdit, DocumentLinesDelete, edit_document, edit_document_batched, edit_document_streaming, parse_compact_edits, parse_edit_batch
+
+def make_edits(line_count: int, edit_count: int, seed: int = 0) -> DocumentEdits:
+    """Random add/edit/delete edits on distinct lines, so both engines agree on the result."""
+    rng = random.Random(seed)
+    edits = []
+    for line_number in sorted(rng.sample(range(1, line_count + 1), edit_count)):
+        kind = rng.choice(["add", "edit", "delete"])
+        if kind == "add":
+            edits.append(DocumentLineAdd(line_number=line_number, new_line=f"Added below {line_number}"))
+        elif kind == "edit":
+            edits.append(DocumentLineEdit(line_number=line_number, new_line=f"Edited {line_number}"))
+        else:
+            edits.append(DocumentLinesDelete(line_numbers=(line_number, line_number)))
+    rng.shuffle(edits)
+    return DocumentEdits(edits=edits)
+
+def run_engine(engine, lines, edits, trace: bool = False) -> float:
+    """Seconds one run of `engine` took, or with trace=True, its peak traced memory in bytes."""
+    with tempfile.NamedTemporaryFile("w", delete=False, suffix=".md") as fh:
+        fh.writelines(lines)
+    try:
+        if trace:
+            tracemalloc.start()
+            try:
+                engine(fh.name, edits)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            return peak
+        start = time.perf_counter()
+        engine(fh.name, edits)
+        return time.perf_counter() - start
+    finally:
+        os.remove(fh.name)
+
+def time_engine(engine, lines, edits, repeat: int) -> float:
+    return min(run_engine(engine, lines, edits) for _ in range(repeat))
+
+def timed(work) -> float:
+    start = time.perf_counter()
+    work()
+    return time.perf_counter() - start
+
+def peak_memory(engine, lines, edits) -> int:
+    return run_engine(engine, lines, edits, trace=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=10_000)
+    parser.add_argument("--edits", type=int, default=1_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    lines = [f"Line {i}\n" for i in range(1, args.lines + 1)]
+    edits = make_edits(args.lines, args.edits)
+
+    print(f"{args.lines} lines, {args.edits} edits (best of {args.repeat})")
+    reference = None
+    for engine in (edit_document, edit_document_batched, edit_document_streaming):
+        elapsed = time_engine(engine, lines, edits, args.repeat)
+        peak = peak_memory(engine, lines, edits)
+        reference = reference or elapsed
+        print(f"  {engine.__name__:<24} {elapsed * 1000:8.2f} ms  ({reference / elapsed:.1f}x)  peak {peak / 1024:8.0f} KiB")
+
+    payloads = [edits.model_dump_json() for _ in range(20)]
+    batch = "[" + ",".join(payloads) + "]"
+    per_payload = min(timed(lambda: [DocumentEdits.model_validate_json(payload) for payload in payloads]) for _ in range(args.repeat))
+    compact = min(timed(lambda: [parse_compact_edits(payload) for payload in payloads]) for _ in range(args.repeat))
+    batched = min(timed(lambda: parse_edit_batch(batch)) for _ in range(args.repeat))
+    print(f"Validating {len(payloads)} payloads of {args.edits} edits")
+    print(f"  {'model_validate_json':<24} {per_payload * 1000:8.2f} ms")
+    print(f"  {'parse_compact_edits':<24} {compact * 1000:8.2f} ms  ({per_payload / compact:.1f}x)")
+    print(f"  {'parse_edit_batch':<24} {batched * 1000:8.2f} ms  ({per_payload / batched:.1f}x)")
+
+if __name__ == "__main__":
+    main()
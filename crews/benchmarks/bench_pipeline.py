@@ -0,0 +1,181 @@
+"""
+Run the whole crews.index.run() pipeline (outline -> game master review -> editor review -> section filling)
+offline, with ChatAnthropic and DuckDuckGoSearchRun swapped for the deterministic stubs in benchmarks.stubs.
+For each outline size it reports wall time, the latency of every stage, LLM and search calls,
+file opens and replaces under the campaign directory, and peak Python memory.
+
+    python -m benchmarks.bench_pipeline [--sizes 10,100,1000] [--latency 0.0] [--search-latency 0.0]
+                                        [--fill-concurrency 1] [--rpm 0] [--no-memory] [--json results.json] [--verbose]
+
+Crew memory is turned off, since crewAI's default memory embeds with OpenAI; the LLM and search caches
+are turned off too (LLM_CACHE_PATH="", SEARCH_CACHE_PATH=""), so every run makes every call, and so is the request rate limit
+(RATE_LIMIT_RPM=0) unless --rpm is given. Peak memory comes from
+tracemalloc, which slows the run down; pass --no-memory for clean wall times.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List
+from unittest import mock
+from benchmarks.stubs import StubChatModel, StubSearchTool
+from crews import index
+from crews.checkpoint import PIPELINE_STAGES, CampaignCheckpoint
+
+class FileIOCounter:
+    """Counts opens (split into reads and writes) and renames of paths under `root`, through an audit hook."""
+
+    def __init__(self):
+        self.root = None
+        self.reads = 0
+        self.writes = 0
+        self.replaces = 0
+        # Audit hooks can't be removed, so one hook is installed and pointed at each run in turn
+        sys.addaudithook(self._hook)
+
+    def start(self, root: str):
+        self.root = os.path.realpath(root)
+        self.reads = self.writes = self.replaces = 0
+
+    def stop(self):
+        self.root = None
+
+    def _inside(self, path) -> bool:
+        if isinstance(path, int):
+            return False
+        return os.path.realpath(os.fsdecode(path)).startswith(self.root)
+
+    def _hook(self, event: str, args):
+        if self.root is None:
+            return
+        if event == "open":
+            path, mode, flags = args
+            if path is None or not self._inside(path):
+                return
+            if mode is not None:
+                writing = any(c in mode for c in "wax+")
+            else:
+                writing = bool(flags & (os.O_WRONLY | os.O_RDWR))
+            if writing:
+                self.writes += 1
+            else:
+                self.reads += 1
+        elif event == "os.rename" and self._inside(args[1]):
+            self.replaces += 1
+
+class StageClock:
+    """Timestamps each complete_stage() call, which run_campaign makes as every pipeline stage finishes."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.finished: Dict[str, float] = {}
+        self._complete_stage = CampaignCheckpoint.complete_stage
+
+    def patch(self):
+        clock = self
+
+        def complete_stage(checkpoint, stage: str):
+            clock.finished[stage] = time.perf_counter()
+            return clock._complete_stage(checkpoint, stage)
+
+        return mock.patch.object(CampaignCheckpoint, "complete_stage", complete_stage)
+
+    def latencies(self, end: float) -> Dict[str, float]:
+        latencies = {}
+        previous = self.start
+        for stage in PIPELINE_STAGES:
+            if stage in self.finished:
+                latencies[stage] = self.finished[stage] - previous
+                previous = self.finished[stage]
+        latencies["04_design_doc"] = end - previous
+        return latencies
+
+def run_pipeline(header_count: int, args, io_counter: FileIOCounter) -> dict:
+    llms: List[StubChatModel] = []
+    searches: List[StubSearchTool] = []
+
+    def chat_model(**kwargs):
+        llm = StubChatModel(header_count=header_count, latency=args.latency, streaming=kwargs.get("streaming", False), callbacks=kwargs.get("callbacks"))
+        llms.append(llm)
+        return llm
+
+    def search_tool():
+        search = StubSearchTool(latency=args.search_latency)
+        searches.append(search)
+        return search
+
+    crew_class = index.Crew
+    with tempfile.TemporaryDirectory() as workdir, contextlib.ExitStack() as stack:
+        stack.enter_context(mock.patch.dict(os.environ, {"LLM_CACHE_PATH": "", "SEARCH_CACHE_PATH": "", "PROMPT_CACHE": "0", "OTEL_SDK_DISABLED": "true", "RATE_LIMIT_RPM": str(args.rpm)}))
+        stack.enter_context(mock.patch.object(index, "ChatAnthropic", chat_model))
+        stack.enter_context(mock.patch.object(index, "DuckDuckGoSearchRun", search_tool))
+        stack.enter_context(mock.patch.object(index, "Crew", lambda *a, **kw: crew_class(*a, **{**kw, "memory": False})))
+        if not args.verbose:
+            stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        clock = StageClock()
+        stack.enter_context(clock.patch())
+        io_counter.start(workdir)
+        if args.memory:
+            tracemalloc.start()
+        try:
+            clock.start = time.perf_counter()
+            index.run(theme="Benchmark", fill_concurrency=args.fill_concurrency)
+            end = time.perf_counter()
+            peak = tracemalloc.get_traced_memory()[1] if args.memory else None
+        finally:
+            if args.memory:
+                tracemalloc.stop()
+            io_counter.stop()
+            os.chdir(cwd)
+
+    return {
+        "headers": header_count,
+        "wall": end - clock.start,
+        "stages": clock.latencies(end),
+        "llm_calls": sum(llm.calls for llm in llms),
+        "search_calls": sum(search.calls for search in searches),
+        "file_reads": io_counter.reads,
+        "file_writes": io_counter.writes,
+        "file_replaces": io_counter.replaces,
+        "peak_memory": peak,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000", help="Comma-separated outline sizes, in headers")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds each stub LLM call takes")
+    parser.add_argument("--search-latency", type=float, default=0.0, help="Seconds each stub search takes")
+    parser.add_argument("--fill-concurrency", type=int, default=1)
+    parser.add_argument("--rpm", type=float, default=0, help="Requests per minute for the shared scheduler, 0 for no limit")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="Skip tracemalloc")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--verbose", action="store_true", help="Keep the crews' console output")
+    args = parser.parse_args()
+
+    io_counter = FileIOCounter()
+    results = []
+    for header_count in (int(size) for size in args.sizes.split(",")):
+        result = run_pipeline(header_count, args, io_counter)
+        results.append(result)
+        stages = "  ".join(f"{stage} {seconds:7.2f}s" for stage, seconds in result["stages"].items())
+        peak = f"{result['peak_memory'] / 1024 / 1024:7.1f} MiB" if result["peak_memory"] is not None else "n/a"
+        print(f"{header_count:5} headers  wall {result['wall']:7.2f}s  {stages}")
+        print(
+            f"             llm calls {result['llm_calls']}  searches {result['search_calls']}  "
+            f"opens r/w {result['file_reads']}/{result['file_writes']}  replaces {result['file_replaces']}  peak {peak}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+if __name__ == "__main__":
+    main()
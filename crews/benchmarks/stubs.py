@@ -0,0 +1,106 @@
+"""
+Deterministic local stand-ins for ChatAnthropic and DuckDuckGoSearchRun, so the crews can run offline.
+Each call sleeps for a fixed latency, then answers from a hash of the prompt: the same prompt always
+gets the same answer, and nothing leaves the machine.
+"""
+import hashlib
+import re
+import threading
+import time
+from typing import Any, Iterator, List, Optional
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import BaseTool
+
+WORD_CHUNK = re.compile(r"\S+\s*|\s+")
+
+WORDS = (
+    "ancient", "clockwork", "river", "paradox", "sentinel", "ember", "archive", "tower", "echo", "rider",
+    "storm", "lantern", "gate", "hollow", "relic", "summit", "tide", "whisper", "forge", "horizon",
+)
+
+def make_outline(header_count: int, subsections: int = 4) -> str:
+    """A `# Title` followed by `## ` sections of up to `subsections` `### ` headers, `header_count` headers in all."""
+    lines = ["# Benchmark Campaign"]
+    section = 0
+    while len(lines) < header_count:
+        section += 1
+        lines.append(f"## Section {section}")
+        for sub in range(1, subsections + 1):
+            if len(lines) >= header_count:
+                break
+            lines.append(f"### Section {section}.{sub}")
+    return "\n".join(lines[:header_count]) + "\n"
+
+def make_body(seed: str, line_count: int) -> str:
+    """`line_count` lines of filler text, chosen by `seed`."""
+    digest = hashlib.sha256(seed.encode('utf-8')).digest()
+    lines = []
+    for line in range(line_count):
+        words = [WORDS[digest[(line * 7 + i) % len(digest)] % len(WORDS)] for i in range(12)]
+        lines.append(" ".join(words).capitalize() + ".")
+    return "\n".join(lines)
+
+class StubChatModel(BaseChatModel):
+    """
+    Answers crewAI's ReAct prompts straight away with `Final Answer:`.
+    Outline tasks (whose expected output asks for header lines) get make_outline(header_count);
+    anything else gets a make_body() section. With streaming=True the answer arrives word by word.
+    """
+
+    header_count: int = 10
+    body_lines: int = 5
+    latency: float = 0.0
+    streaming: bool = False
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat"
+
+    def _answer(self, messages: List[BaseMessage]) -> str:
+        prompt = "\n".join(str(message.content) for message in messages)
+        with _counter_lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if "only header lines" in prompt:
+            answer = make_outline(self.header_count)
+        else:
+            answer = make_body(prompt, self.body_lines)
+        return "Thought: I now can give a great answer\nFinal Answer: " + answer
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        if self.streaming:
+            # Like ChatAnthropic, a streaming model streams even when called through invoke()
+            content = ""
+            for chunk in self._stream(messages, stop=stop, **kwargs):
+                if run_manager is not None:
+                    run_manager.on_llm_new_token(chunk.message.content, chunk=chunk)
+                content += chunk.message.content
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._answer(messages)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        # Each word with the whitespace after it
+        for word in WORD_CHUNK.findall(self._answer(messages)):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+
+class StubSearchTool(BaseTool):
+    """A search tool that returns a few lines of filler text for any query."""
+
+    name: str = "duckduckgo_search"
+    description: str = "A search engine. Input should be a search query."
+    latency: float = 0.0
+    calls: int = 0
+
+    def _run(self, query: str, **kwargs: Any) -> str:
+        with _counter_lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return make_body(query, 3)
+
+_counter_lock = threading.Lock()
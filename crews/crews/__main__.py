@@ -1,3 +1,3 @@
-from .index import run
+from .cli import main
 
-run()
\ No newline at end of file
+main()
\ No newline at end of file
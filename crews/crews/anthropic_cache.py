@@ -0,0 +1,19 @@
+from typing import Any, Dict, List, Optional
+from langchain_anthropic import ChatAnthropic
+from langchain_core.messages import BaseMessage
+from crews.prompts import restore_cache_control
+
+# Sent as the anthropic-beta header; cache_control is ignored without it
+PROMPT_CACHING_BETA = "prompt-caching-2024-07-31"
+
+class CachingChatAnthropic(ChatAnthropic):
+    """
+    ChatAnthropic that sends the cache_control flags StablePrefixes.mark puts on content blocks.
+    langchain-anthropic 0.1.x rebuilds text blocks from their text alone, which drops them.
+    Give it default_headers={"anthropic-beta": PROMPT_CACHING_BETA}.
+    """
+
+    def _format_params(self, *, messages: List[BaseMessage], stop: Optional[List[str]] = None, **kwargs: Any) -> Dict:
+        params = super()._format_params(messages=messages, stop=stop, **kwargs)
+        restore_cache_control(messages, params["messages"])
+        return params
@@ -0,0 +1,139 @@
+"""
+Generate many campaigns in one go, each in its own process and output directory, all drawing on one rate limit.
+
+    batch_crew "Time-Travel Conundrum" "Sunken Kingdom" [--themes-file themes.txt] [--workers N]
+               [--fill-concurrency N] [--output batch_<ts>]
+
+Writes summary.json and summary.md to the output directory when every campaign has finished or failed.
+"""
+import argparse
+import json
+import math
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, List, Optional
+from pydantic import BaseModel
+from crews.outline import slugify
+from crews.rate_limit import SchedulerManager, limits_from_env, set_scheduler
+
+class CampaignResult(BaseModel):
+    theme: str
+    campaign_dir: str
+    status: str
+    error: Optional[str] = None
+    seconds: float = 0.0
+    sections: int = 0
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+def read_themes(path: str) -> List[str]:
+    """One theme per line; blank lines and lines starting with # are skipped."""
+    with open(path, 'r', encoding='utf-8') as fh:
+        return [line.strip() for line in fh if line.strip() and not line.lstrip().startswith("#")]
+
+def _init_worker(model: Optional[str], scheduler: Any):
+    set_scheduler(model, scheduler)
+
+def run_one(theme: str, campaign_dir: str, fill_concurrency: Optional[int] = None) -> CampaignResult:
+    """Run one campaign into `campaign_dir`, catching its failure so the rest of the batch carries on."""
+    # Imported here so the parent process never loads crewAI
+    from crews.index import run
+
+    start = time.perf_counter()
+    try:
+        tracer = run(theme, fill_concurrency=fill_concurrency, campaign_dir=campaign_dir)
+    except Exception:
+        return CampaignResult(theme=theme, campaign_dir=campaign_dir, status="failed", error=traceback.format_exc(), seconds=time.perf_counter() - start)
+
+    kickoffs = tracer.metrics()["kickoffs"]
+    return CampaignResult(
+        theme=theme,
+        campaign_dir=campaign_dir,
+        status="done",
+        seconds=time.perf_counter() - start,
+        sections=kickoffs.get("fill_section", {}).get("count", 0),
+        llm_calls=sum(totals["llm_calls"] for totals in kickoffs.values()),
+        prompt_tokens=sum(totals["prompt_tokens"] for totals in kickoffs.values()),
+        completion_tokens=sum(totals["completion_tokens"] for totals in kickoffs.values()),
+    )
+
+def run_batch(
+    themes: List[str],
+    output_dir: str,
+    workers: Optional[int] = None,
+    fill_concurrency: Optional[int] = None,
+    runner: Callable[..., CampaignResult] = run_one,
+) -> List[CampaignResult]:
+    """
+    Run a campaign per theme on a pool of `workers` processes (default: one per core), in
+    <output_dir>/<NNN>_<theme slug>. Every process sends CLAUDE_MODEL requests through one
+    RateScheduler, hosted by a SchedulerManager, so the batch as a whole keeps to RATE_LIMIT_RPM/TPM.
+    Results come back in theme order.
+    """
+    output = Path(output_dir)
+    os.makedirs(output, exist_ok=True)
+    campaign_dirs = [str(output / f"{number:03d}_{slugify(theme)}") for number, theme in enumerate(themes, start=1)]
+
+    rpm, tpm = limits_from_env()
+    with SchedulerManager() as manager:
+        scheduler = manager.RateScheduler(rpm=rpm, tpm=tpm)
+        results: List[Optional[CampaignResult]] = [None] * len(themes)
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker, initargs=(os.environ.get("CLAUDE_MODEL"), scheduler)) as pool:
+            futures = {pool.submit(runner, theme, campaign_dir, fill_concurrency): index for index, (theme, campaign_dir) in enumerate(zip(themes, campaign_dirs))}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    results[index] = future.result()
+                except Exception:
+                    # The worker process itself died
+                    results[index] = CampaignResult(theme=themes[index], campaign_dir=campaign_dirs[index], status="failed", error=traceback.format_exc())
+                print(f"{results[index].status}: {themes[index]} ({results[index].campaign_dir})")
+        rate_limit = scheduler.stats()
+
+    write_summary(output, results, rate_limit)
+    return results
+
+def write_summary(output: Path, results: List[CampaignResult], rate_limit: dict):
+    with open(output / "summary.json", 'w', encoding='utf-8') as fh:
+        json.dump({"campaigns": [result.model_dump() for result in results], "rate_limit": rate_limit}, fh, indent=2)
+
+    lines = [
+        "| Theme | Status | Seconds | Sections | LLM calls | Prompt tokens | Completion tokens | Directory |",
+        "| --- | --- | --- | --- | --- | --- | --- | --- |",
+    ]
+    for result in results:
+        lines.append(
+            f"| {result.theme} | {result.status} | {result.seconds:.1f} | {result.sections} | {result.llm_calls} "
+            f"| {result.prompt_tokens} | {result.completion_tokens} | {result.campaign_dir} |"
+        )
+    done = sum(result.status == "done" for result in results)
+    lines += ["", f"{done} of {len(results)} campaigns done. Rate limiter: {rate_limit}", ""]
+    with open(output / "summary.md", 'w', encoding='utf-8') as fh:
+        fh.write("\n".join(lines))
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("themes", nargs="*", help="Campaign themes")
+    parser.add_argument("--themes-file", help="A file with one theme per line")
+    parser.add_argument("--workers", type=int, help="Campaigns run at once (default: one per core)")
+    parser.add_argument("--fill-concurrency", type=int, help="Sections filled at once within each campaign")
+    parser.add_argument("--output", help="Output directory (default: batch_<ts>)")
+    args = parser.parse_args(argv)
+
+    themes = list(args.themes)
+    if args.themes_file:
+        themes += read_themes(args.themes_file)
+    if not themes:
+        parser.error("give at least one theme, or --themes-file")
+
+    output = args.output or "batch_" + str(math.floor(time.time()))
+    results = run_batch(themes, output, workers=args.workers, fill_concurrency=args.fill_concurrency)
+    if any(result.status != "done" for result in results):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import os
+import threading
+from pathlib import Path
+from typing import List, Union
+from pydantic import BaseModel, Field, PrivateAttr
+
+MANIFEST_FILE = "manifest.json"
+
+# The outline crew's tasks, in the order they run. Each one writes <stage>.md into the campaign dir.
+PIPELINE_STAGES = ["01_outline_init", "02_game_master_review", "03_editor_review"]
+
+class CampaignCheckpoint(BaseModel):
+    """Which parts of a campaign run are already on disk, saved as manifest.json in the campaign dir."""
+
+    campaign_dir: str = Field(..., description="The campaign_<ts> directory this manifest lives in")
+    theme: str
+    stages_done: List[str] = Field(default_factory=list, description="Pipeline stages whose output file has been written")
+    sections_done: List[str] = Field(default_factory=list, description="Outline header lines flushed to 04_design_doc.md, in order")
+    design_doc_bytes: int = Field(0, description="Size of 04_design_doc.md when sections_done was last saved")
+    # Pipeline stages finish on different threads, and saves share one temp file
+    _lock: threading.RLock = PrivateAttr(default_factory=threading.RLock)
+
+    @classmethod
+    def create(cls, campaign_dir: Union[str, Path], theme: str) -> "CampaignCheckpoint":
+        checkpoint = cls(campaign_dir=str(campaign_dir), theme=theme)
+        checkpoint.save()
+        return checkpoint
+
+    @classmethod
+    def load(cls, campaign_dir: Union[str, Path]) -> "CampaignCheckpoint":
+        with open(Path(campaign_dir) / MANIFEST_FILE, "r", encoding="utf-8") as fh:
+            checkpoint = cls.model_validate_json(fh.read())
+        checkpoint.campaign_dir = str(campaign_dir)
+        return checkpoint
+
+    @property
+    def path(self) -> Path:
+        return Path(self.campaign_dir) / MANIFEST_FILE
+
+    def save(self):
+        # Write then rename, so a crash mid-save never leaves a half-written manifest
+        tmp_path = self.path.with_suffix(".json.tmp")
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                fh.write(self.model_dump_json(indent=2))
+            os.replace(tmp_path, self.path)
+
+    def is_stage_done(self, stage: str) -> bool:
+        return stage in self.stages_done
+
+    def remaining_stages(self) -> List[str]:
+        return [stage for stage in PIPELINE_STAGES if stage not in self.stages_done]
+
+    def complete_stage(self, stage: str):
+        with self._lock:
+            if stage not in self.stages_done:
+                self.stages_done.append(stage)
+                self.save()
+
+    def complete_sections(self, headers: List[str], design_doc_bytes: int):
+        with self._lock:
+            self.sections_done.extend(headers)
+            self.design_doc_bytes = design_doc_bytes
+            self.save()
+
+def latest_campaign_dir(root: Union[str, Path] = ".") -> Path:
+    """The campaign_<ts> directory under `root` with the newest timestamp. Other campaign_* entries are ignored."""
+    campaign_dirs = sorted(
+        (path for path in Path(root).glob("campaign_*") if path.is_dir() and path.name[len("campaign_"):].isdigit()),
+        key=lambda path: int(path.name[len("campaign_"):]),
+    )
+    if not campaign_dirs:
+        raise FileNotFoundError("No campaign_<ts> directory to resume")
+    return campaign_dirs[-1]
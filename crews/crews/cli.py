@@ -0,0 +1,188 @@
+"""
+Run and inspect campaigns.
+
+    python -m crews [run] [--theme THEME] [--fill-concurrency N] [--campaign-dir DIR]
+    python -m crews resume [CAMPAIGN_DIR] [--fill-concurrency N]
+    python -m crews status [CAMPAIGN_DIR]
+    python -m crews apply-edits DOC EDITS_JSON [--base-version N]
+    python -m crews batch THEME... [batch_crew options]
+
+Put --profile-startup before any command to report how long each module took to import.
+Only run and resume load crewAI, and only once they get going, so the other commands start quickly.
+"""
+import argparse
+import json
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+COMMANDS = ("run", "resume", "status", "apply-edits", "batch")
+
+class ImportTime(NamedTuple):
+    module: str
+    depth: int  # 0 for a module imported directly, 1 for one it imported, ...
+    self_us: int
+    cumulative_us: int
+
+def parse_importtime(lines: Iterable[str]) -> Tuple[List[ImportTime], List[str]]:
+    """Split stderr from `python -X importtime` into its import timings and everything else."""
+    imports: List[ImportTime] = []
+    other: List[str] = []
+    for line in lines:
+        if not line.startswith("import time:"):
+            other.append(line)
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header line
+        name = fields[2].rstrip()
+        stripped = name.lstrip()
+        imports.append(ImportTime(stripped, (len(name) - len(stripped) - 1) // 2, int(fields[0]), int(fields[1])))
+    return imports, other
+
+def format_import_report(imports: List[ImportTime], top: int = 20) -> str:
+    total = sum(entry.cumulative_us for entry in imports if entry.depth == 0)
+    by_package: Dict[str, int] = defaultdict(int)
+    for entry in imports:
+        by_package[entry.module.split(".")[0]] += entry.self_us
+    lines = [f"Startup imports: {total / 1000:.1f} ms across {len(imports)} modules", "By package (self time):"]
+    for package, self_us in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]:
+        lines.append(f"  {self_us / 1000:9.1f} ms  {package}")
+    lines.append("Slowest modules (including what they import):")
+    for entry in sorted(imports, key=lambda entry: entry.cumulative_us, reverse=True)[:top]:
+        lines.append(f"  {entry.cumulative_us / 1000:9.1f} ms  {entry.module}")
+    return "\n".join(lines) + "\n"
+
+def profile_startup(argv: List[str], top: int = 20) -> int:
+    """Run the command in a child interpreter under -X importtime, passing its other stderr through, then report."""
+    process = subprocess.Popen([sys.executable, "-X", "importtime", "-m", "crews", *argv], stderr=subprocess.PIPE, text=True)
+    timings: List[str] = []
+    for line in process.stderr:
+        if line.startswith("import time:"):
+            timings.append(line)
+        else:
+            sys.stderr.write(line)
+    returncode = process.wait()
+    imports, _ = parse_importtime(timings)
+    sys.stderr.write(format_import_report(imports, top=top))
+    return returncode
+
+def campaign_status(campaign_dir: str) -> dict:
+    """What a campaign's manifest, outline and trace say about how far it got, without loading crewAI."""
+    from crews.checkpoint import PIPELINE_STAGES, CampaignCheckpoint
+    from crews.outline import OutlineTree
+
+    checkpoint = CampaignCheckpoint.load(campaign_dir)
+    status = {
+        "campaign_dir": str(campaign_dir),
+        "theme": checkpoint.theme,
+        "stages_done": [stage for stage in PIPELINE_STAGES if checkpoint.is_stage_done(stage)],
+        "sections_done": len(checkpoint.sections_done),
+        "sections": None,
+        "next": None,
+        "llm_calls": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+    }
+    remaining = checkpoint.remaining_stages()
+    outline_path = Path(campaign_dir) / "03_editor_review.md"
+    if remaining:
+        status["next"] = remaining[0]
+    elif outline_path.exists():
+        outline = OutlineTree.load(outline_path)
+        status["sections"] = len(outline)
+        if status["sections_done"] < len(outline):
+            status["next"] = outline.sections[status["sections_done"]].line.rstrip("\n")
+
+    trace_path = Path(campaign_dir) / "trace.jsonl"
+    if trace_path.exists():
+        with open(trace_path, 'r', encoding='utf-8') as fh:
+            for line in fh:
+                record = json.loads(line)
+                if record.get("type") == "kickoff":
+                    for counter in ("llm_calls", "prompt_tokens", "completion_tokens"):
+                        status[counter] += record.get(counter, 0)
+    return status
+
+def print_status(status: dict):
+    sections = f"{status['sections_done']}/{status['sections']}" if status["sections"] is not None else f"{status['sections_done']}/?"
+    print(f"Campaign: {status['campaign_dir']}")
+    print(f"Theme:    {status['theme']}")
+    print(f"Stages:   {', '.join(status['stages_done']) or 'none done'}")
+    print(f"Sections: {sections} filled")
+    print(f"Next:     {status['next'] or 'nothing, the campaign is finished'}")
+    print(f"LLM:      {status['llm_calls']} calls, {status['prompt_tokens']} prompt and {status['completion_tokens']} completion tokens")
+
+def apply_edits(doc: str, edits: str, base_version: Optional[int] = None) -> int:
+    """Apply a DocumentEdits JSON file ('-' for stdin) to `doc` through its edit journal. Returns the new version."""
+    from crews.document_edits import DocumentEdits
+    from crews.edit_journal import get_journal
+
+    if edits == "-":
+        data = sys.stdin.read()
+    else:
+        with open(edits, 'r', encoding='utf-8') as fh:
+            data = fh.read()
+    return get_journal(doc).apply(DocumentEdits.model_validate_json(data), base_version=base_version)
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m crews", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile-startup", action="store_true", help="Report import time per module once the command finishes")
+    commands = parser.add_subparsers(dest="command")
+
+    run = commands.add_parser("run", help="Generate a new campaign")
+    run.add_argument("--theme", default="Time-Travel Conundrum")
+    run.add_argument("--fill-concurrency", type=int, help="Sections filled at once (default: FILL_CONCURRENCY or 1)")
+    run.add_argument("--campaign-dir", help="Output directory (default: campaign_<ts>)")
+
+    resume = commands.add_parser("resume", help="Pick a crashed run back up")
+    resume.add_argument("campaign_dir", nargs="?", help="Default: the newest campaign_<ts> directory")
+    resume.add_argument("--fill-concurrency", type=int)
+
+    status = commands.add_parser("status", help="Show how far a campaign got")
+    status.add_argument("campaign_dir", nargs="?", help="Default: the newest campaign_<ts> directory")
+    status.add_argument("--json", action="store_true", help="Print the status as JSON")
+
+    edits = commands.add_parser("apply-edits", help="Apply DocumentEdits JSON to a document, journaled")
+    edits.add_argument("doc")
+    edits.add_argument("edits", help="A DocumentEdits JSON file, or - for stdin")
+    edits.add_argument("--base-version", type=int, help="The document version the edits' line numbers refer to (required unless the JSON has base_version)")
+
+    # Its arguments are handed to batch_crew as they are
+    commands.add_parser("batch", help="Generate many campaigns (see batch --help)", add_help=False)
+    return parser
+
+def main(argv: Optional[List[str]] = None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    # Only ahead of the command: after it, the same text could be a theme or an option for batch
+    if argv and argv[0] == "--profile-startup":
+        raise SystemExit(profile_startup(argv[1:]))
+    if argv and argv[0] == "batch":
+        from crews.batch import main as batch_main
+        return batch_main(argv[1:])
+    # A bare `python -m crews`, or one with only run's options, runs a campaign as it always has
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ("-h", "--help")):
+        argv.insert(0, "run")
+    args = build_parser().parse_args(argv)
+
+    if args.command == "status":
+        from crews.checkpoint import latest_campaign_dir
+        status = campaign_status(args.campaign_dir or str(latest_campaign_dir()))
+        if args.json:
+            print(json.dumps(status, indent=2))
+        else:
+            print_status(status)
+    elif args.command == "apply-edits":
+        print(f"Document version: {apply_edits(args.doc, args.edits, base_version=args.base_version)}")
+    elif args.command == "resume":
+        from crews.index import resume
+        from crews.checkpoint import latest_campaign_dir
+        resume(args.campaign_dir or str(latest_campaign_dir()), fill_concurrency=args.fill_concurrency)
+    else:
+        from crews.index import run
+        run(args.theme, fill_concurrency=args.fill_concurrency, campaign_dir=args.campaign_dir)
+
+if __name__ == "__main__":
+    main()
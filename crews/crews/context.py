@@ -0,0 +1,141 @@
+import hashlib
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Set
+from crews.outline import OutlineTree
+
+WORD = re.compile(r"[a-z0-9][a-z0-9'-]*")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have he her his i in into is it its of on or our she that the their them they
+this to was we were will with you your one two three key section
+""".split())
+
+def count_tokens(text: str) -> int:
+    """Roughly four characters per token, which is close enough to budget with."""
+    return len(text) // 4 + 1
+
+def terms(text: str) -> Counter:
+    return Counter(word for word in WORD.findall(text.lower()) if word not in STOPWORDS and len(word) > 2)
+
+def summarize(text: str, max_tokens: int) -> str:
+    """The leading sentences of `text` that fit in `max_tokens`, or its first words if even one sentence doesn't."""
+    summary = ""
+    for sentence in SENTENCE_END.split(" ".join(text.split())):
+        candidate = f"{summary} {sentence}".strip()
+        if count_tokens(candidate) > max_tokens:
+            break
+        summary = candidate
+    if not summary:
+        words: List[str] = []
+        for word in text.split():
+            if count_tokens(" ".join(words + [word])) > max_tokens:
+                break
+            words.append(word)
+        summary = " ".join(words)
+    return summary
+
+class WrittenSection(NamedTuple):
+    id: str
+    index: int
+    line: str
+    body: str
+    summary: str
+    terms: Counter
+
+class ContextBuilder:
+    """
+    Picks what the writer sees of the sections written so far, within a token budget.
+    Candidates are ranked by keyword overlap (tf-idf cosine) with the titles along the new section's header
+    path, with a boost for its own ancestors and for the section it is written after. Those two are given
+    in full when they fit; everything else by its summary, which is worked out once when the section is added.
+    """
+
+    def __init__(self, tree: OutlineTree, budget: int = 800, summary_tokens: int = 60):
+        self.tree = tree
+        self.budget = budget
+        self.summary_tokens = summary_tokens
+        self._written: Dict[str, WrittenSection] = {}
+        self._summaries: Dict[str, str] = {}
+        self._document_frequency: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._written)
+
+    def add(self, section_id: str, body: str):
+        section = self.tree[section_id]
+        key = hashlib.sha256(body.encode('utf-8')).hexdigest()
+        summary = self._summaries.get(key)
+        if summary is None:
+            summary = self._summaries[key] = summarize(body, self.summary_tokens)
+        section_terms = terms(section.title + " " + body)
+        with self._lock:
+            previous = self._written.get(section_id)
+            if previous is not None:
+                self._document_frequency.subtract(previous.terms.keys())
+            self._document_frequency.update(section_terms.keys())
+            self._written[section_id] = WrittenSection(section_id, section.index, section.line, body, summary, section_terms)
+
+    def add_document(self, lines: List[str], count: int):
+        """Add the first `count` sections of the tree from a design doc that has them written out (resuming)."""
+        sections = self.tree.sections[:count]
+        current = None
+        body: List[str] = []
+        position = 0
+        for line in lines:
+            if position < len(sections) and line == sections[position].line:
+                if current is not None:
+                    self.add(current.id, "".join(body).rstrip("\n"))
+                current = sections[position]
+                body = []
+                position += 1
+            elif current is not None:
+                body.append(line)
+        if current is not None:
+            self.add(current.id, "".join(body).rstrip("\n"))
+
+    def _score(self, query: Counter, written: WrittenSection, total: int) -> float:
+        if not query or not written.terms:
+            return 0.0
+        weights = {term: math.log((1 + total) / (1 + self._document_frequency[term])) + 1 for term in query}
+        dot = sum(query[term] * written.terms[term] * weights[term] ** 2 for term in query if term in written.terms)
+        if not dot:
+            return 0.0
+        query_norm = math.sqrt(sum((count * weights[term]) ** 2 for term, count in query.items()))
+        section_norm = math.sqrt(sum(count ** 2 for count in written.terms.values()))
+        return dot / (query_norm * section_norm)
+
+    def build(self, section_id: str, scope: Optional[Set[str]] = None) -> str:
+        """
+        The context for writing `section_id`, drawn from the sections in `scope` (default: everything written),
+        in outline order, with each one's header line before its text.
+        """
+        section = self.tree[section_id]
+        ancestors = {ancestor.id for ancestor in self.tree.ancestors(section_id)}
+        close = ancestors | set(section.depends_on)
+        query = terms(" ".join(s.title for s in self.tree.ancestors(section_id)) + " " + section.title)
+
+        with self._lock:
+            candidates = [w for w in self._written.values() if w.id != section_id and (scope is None or w.id in scope)]
+            total = len(self._written)
+            ranked = []
+            for written in candidates:
+                score = self._score(query, written, total) + (1.0 if written.id in close else 0.0)
+                if score > 0:
+                    ranked.append((score, written.index, written))
+        ranked.sort(key=lambda item: (item[0], item[1]), reverse=True)
+
+        chosen: Dict[int, str] = {}
+        remaining = self.budget
+        for _, _, written in ranked:
+            texts = [written.body, written.summary] if written.id in close else [written.summary]
+            for text in texts:
+                cost = count_tokens(written.line + text)
+                if text and cost <= remaining:
+                    chosen[written.index] = written.line + text + "\n"
+                    remaining -= cost
+                    break
+        return "\n".join(chosen[index] for index in sorted(chosen))
@@ -0,0 +1,105 @@
+from collections import deque
+from pathlib import Path
+from typing import Callable, List, Optional, Union
+
+class ContextWindow:
+    """The last few lines written, kept in a bounded deque so reading the context never rescans the document."""
+
+    def __init__(self, max_lines: int = 10):
+        self.max_lines = max_lines
+        self._lines = deque(maxlen=max_lines)
+
+    def push(self, text: str):
+        self._lines.extend(text.splitlines(keepends=True))
+
+    def text(self) -> str:
+        return "\n".join(self._lines)
+
+class DesignDocument:
+    """
+    The design doc being filled out, owned by the filling loop.
+    Sections are appended to an in-memory line buffer and written to disk in batches,
+    so appending and building context cost the same for the first section as the last.
+    """
+
+    def __init__(self, path: Union[str, Path], context_lines: int = 10, flush_every: int = 5, on_flush: Optional[Callable[[List[str], int], None]] = None):
+        self.path = Path(path)
+        self.lines: List[str] = []
+        self.window = ContextWindow(context_lines)
+        self.flush_every = flush_every
+        # on_flush(header lines, file size) runs after those sections are on disk, e.g. to checkpoint them
+        self.on_flush = on_flush
+        self._pending: List[str] = []
+        self._pending_headers: List[str] = []
+        self._stream = None
+        self._stream_start = 0
+
+    @classmethod
+    def load(cls, path: Union[str, Path], **kwargs) -> "DesignDocument":
+        """Pick up a partially written document, e.g. when resuming a campaign."""
+        doc = cls(path, **kwargs)
+        with open(doc.path, "r", encoding="utf-8") as fh:
+            doc.lines = fh.readlines()
+        doc.window.push("".join(doc.lines[-doc.window.max_lines:]))
+        return doc
+
+    def start_section(self, header: str):
+        """
+        Start streaming a section straight to disk, so the file can be tailed while the model writes.
+        The streamed text is provisional: append_section replaces it with the final body.
+        """
+        self.flush()
+        self._stream = open(self.path, "a", encoding="utf-8")
+        self._stream_start = self._stream.tell()
+        self.write_token(header)
+
+    def write_token(self, token: str):
+        if self._stream is None:
+            return
+        self._stream.write(token)
+        self._stream.flush()
+
+    def _end_stream(self):
+        self._stream.seek(self._stream_start)
+        self._stream.truncate()
+        self._stream.close()
+        self._stream = None
+
+    def append_section(self, header: str, body: str):
+        streamed = self._stream is not None
+        if streamed:
+            self._end_stream()
+
+        text = header + body + "\n"
+        new_lines = text.splitlines(keepends=True)
+        self.lines.extend(new_lines)
+        self._pending.extend(new_lines)
+        self.window.push(text)
+
+        self._pending_headers.append(header)
+        if streamed or len(self._pending_headers) >= self.flush_every:
+            self.flush()
+
+    def context(self) -> str:
+        return self.window.text()
+
+    def flush(self):
+        if not self._pending:
+            return
+        with open(self.path, "a", encoding="utf-8") as fh:
+            fh.writelines(self._pending)
+            size = fh.tell()
+        headers = self._pending_headers
+        self._pending = []
+        self._pending_headers = []
+        if self.on_flush is not None:
+            self.on_flush(headers, size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._stream is not None:
+            # A section cut off mid-stream is not complete; leave the file as of the last flush
+            self._end_stream()
+        self.flush()
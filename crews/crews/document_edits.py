@@ -1,14 +1,23 @@
+import difflib
 import math
+import os
+import shutil
+import tempfile
+from array import array
+from bisect import bisect_right
 from textwrap import dedent
-from typing import Annotated, List, Literal, Optional, Tuple, Union
-from pydantic import BaseModel, Field
+from itertools import islice
+from typing import Annotated, Callable, Dict, Iterable, Iterator, List, Literal, NamedTuple, Optional, Tuple, Union
+from pydantic import BaseModel, Field, TypeAdapter
+from typing_extensions import TypedDict
+from crews.line_index import get_line_index
 
 # class DocumentEditBase(BaseModel):
 #     pass
 
 class DocumentLinesDelete(BaseModel):
     """Delete a range of lines from the file"""
-    edit_type: Literal['delete']
+    edit_type: Literal['delete'] = 'delete'
 
     line_numbers: Tuple[int, int] = Field(..., description="A range of numbers to delete, inclusive. To delete a single line, put the same number twice. [0,0] will delete the first line of the file.")
 
@@ -17,100 +26,418 @@ class DocumentLineAdd(BaseModel):
     Add a new line below the specified line number.
     This is how to add a line in the middle of the file, or to add a line to the end of the file.
     """
-    edit_type: Literal['add']
+    edit_type: Literal['add'] = 'add'
 
-    line_number: Optional[int] = Field(..., description="A new line will be added below this line number in the file. None means to add the line to the end of the file")
+    line_number: Optional[int] = Field(..., description="A new line will be added below this line number in the file. None means to add the line to the end of the file, and 0 adds it at the top")
     new_line: str = Field(..., description="The line you want to add at the given line number")
 
 class DocumentLineEdit(BaseModel):
     """Editing a single line from the file"""
-    edit_type: Literal['edit']
+    edit_type: Literal['edit'] = 'edit'
 
     line_number: int = Field(..., description="The line number in the text file you want to replace.")
     new_line: str = Field(..., description="The line you want to replace the existing line in the file")
 
+# Older name, still used by callers and tests
+DocumentLinesAdd = DocumentLineAdd
+
 LineEdit = Annotated[Union[DocumentLineEdit , DocumentLineAdd , DocumentLinesDelete], Field(discriminator="edit_type")]
 
 class DocumentEdits(BaseModel):
     """A collection of edits to be made to the file"""
 
     edits: List[LineEdit]
+    base_version: Optional[int] = Field(None, description="The document version the line numbers were read from, as given by the Document Fetch Tool. Required to apply the edits")
 
 document_edits_example = dedent("""\
                                 Your response should take the form of a DocumentEdits JSON object. Here is an example:   
                                 {{
-                                    edits: [
+                                    "edits": [
                                         {{
-                                            edit_type: "delete",
-                                            line_numbers: [5, 7]
+                                            "edit_type": "delete",
+                                            "line_numbers": [5, 7]
                                         }},
                                         {{
-                                            edit_type: "add",
-                                            line_number: 5,
-                                            new_line: "Line 6 is here, baby!"
+                                            "edit_type": "add",
+                                            "line_number": 7,
+                                            "new_line": "This line takes the place of lines 5 to 7!"
                                         }},
                                         {{
-                                            edit_type: "add",
-                                            line_number: null,
-                                            new_line: "This line will go at the end of the file!"
+                                            "edit_type": "add",
+                                            "line_number": null,
+                                            "new_line": "This line will go at the end of the file!"
                                         }},
                                         {{
-                                            edit_type: "edit",
-                                            line_number: 9,
-                                            new_line: "This is the new line_number. I have replaced it!"
+                                            "edit_type": "edit",
+                                            "line_number": 9,
+                                            "new_line": "This is the new line_number. I have replaced it!"
                                         }}
-                                    ]
+                                    ],
+                                    "base_version": 3
                                 }}
                                 """)
 
-def sort_document_edits(edit: LineEdit):
-    if isinstance(edit, DocumentLinesDelete):
-        return min(edit.line_numbers)
-    if isinstance(edit, DocumentLineEdit):
-        return edit.line_number
-    if isinstance(edit, DocumentLineAdd):
-        return edit.line_number if edit.line_number is not None else float('inf')
+def parse_document_edits(data: Union[str, bytes, dict, DocumentEdits]) -> DocumentEdits:
+    """A DocumentEdits from an agent's output: JSON text, a dict, or one that's already validated (returned as is)."""
+    if isinstance(data, DocumentEdits):
+        return data
+    if isinstance(data, (str, bytes)):
+        return DocumentEdits.model_validate_json(data)
+    return DocumentEdits.model_validate(data)
+
+# An add with no line number goes at the end of the document
+OP_DELETE, OP_ADD, OP_EDIT, OP_APPEND = 0, 1, 2, 3
+
+class CompactEdits(NamedTuple):
+    """
+    DocumentEdits as parallel arrays, one (op, start, end, text index) row per edit, with each edit's line
+    (newline included) in `texts`. Sorting and applying read the rows instead of dispatching on model types.
+    Adds and edits have start == end; deletes have text index -1, appends start 0.
+    """
+    ops: array
+    starts: array
+    ends: array
+    text_indexes: array
+    texts: List[str]
+    base_version: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self.ops)
+
+    def __iter__(self) -> Iterator[Tuple[int, int, int, int]]:
+        return zip(self.ops, self.starts, self.ends, self.text_indexes)
 
-def edit_document(file_path: str, document_edit: DocumentEdits):
+    def sort_keys(self) -> List[float]:
+        """The line each edit is ordered by, as sort_document_edits gives it."""
+        return [
+            math.inf if op == OP_APPEND else min(start, end)
+            for op, start, end in zip(self.ops, self.starts, self.ends)
+        ]
+
+    def apply_order(self) -> List[int]:
+        """
+        Row indexes bottom up, the order edit_document applies them in. Ties go last row first, so adds
+        below the same line end up in the order given; appends go on the end instead, so first row first.
+        """
+        # One int per row, line-major, so the sort compares ints rather than tuples
+        count = len(self.ops)
+        last = max(self.starts, default=0) + 1
+        keys = [
+            (last * count + count - index) if op == OP_APPEND else min(start, end) * count + index
+            for index, (op, start, end) in enumerate(zip(self.ops, self.starts, self.ends))
+        ]
+        return sorted(range(count), key=keys.__getitem__, reverse=True)
+
+def compact_rows(rows: Iterable[Tuple[str, Optional[int], Optional[int], Optional[str]]], base_version: Optional[int] = None) -> CompactEdits:
+    """A CompactEdits from (edit type, start, end, new line) rows; deletes have no new line, appends no start."""
+    ops, starts, ends, text_indexes = [], [], [], []
+    texts: List[str] = []
+    for edit_type, start, end, new_line in rows:
+        if new_line is None:
+            ops.append(OP_DELETE)
+            text_indexes.append(-1)
+        else:
+            if start is None:
+                start = end = 0
+                ops.append(OP_APPEND)
+            else:
+                ops.append(OP_ADD if edit_type == 'add' else OP_EDIT)
+            text_indexes.append(len(texts))
+            texts.append(new_line + "\n")
+        starts.append(start)
+        ends.append(end)
+    return CompactEdits(array('b', ops), array('q', starts), array('q', ends), array('q', text_indexes), texts, base_version)
+
+def compact_edits(document_edit: DocumentEdits) -> CompactEdits:
+    return compact_rows((
+        ('delete', *edit.line_numbers, None) if edit.edit_type == 'delete'
+        else (edit.edit_type, edit.line_number, edit.line_number, edit.new_line)
+        for edit in document_edit.edits
+    ), document_edit.base_version)
+
+# The same payloads as DocumentEdits, validated into plain dicts: building the models is most of the cost of
+# validating them, and the compact form doesn't need them
+class LinesDeletePayload(TypedDict):
+    edit_type: Literal['delete']
+    line_numbers: Tuple[int, int]
+
+class LineAddPayload(TypedDict):
+    edit_type: Literal['add']
+    line_number: Optional[int]
+    new_line: str
+
+class LineEditPayload(TypedDict):
+    edit_type: Literal['edit']
+    line_number: int
+    new_line: str
+
+class DocumentEditsPayload(TypedDict, total=False):
+    edits: List[Annotated[Union[LinesDeletePayload, LineAddPayload, LineEditPayload], Field(discriminator="edit_type")]]
+    base_version: Optional[int]
+
+DOCUMENT_EDITS_PAYLOAD = TypeAdapter(DocumentEditsPayload)
+DOCUMENT_EDITS_BATCH = TypeAdapter(List[DocumentEditsPayload])
+
+def compact_payload(payload: dict) -> CompactEdits:
+    return compact_rows((
+        ('delete', *edit["line_numbers"], None) if edit["edit_type"] == 'delete'
+        else (edit["edit_type"], edit["line_number"], edit["line_number"], edit["new_line"])
+        for edit in payload.get("edits", ())
+    ), payload.get("base_version"))
+
+def parse_compact_edits(data: Union[str, bytes]) -> CompactEdits:
+    """Validate one DocumentEdits JSON payload straight into its compact form, without building the models."""
+    return compact_payload(DOCUMENT_EDITS_PAYLOAD.validate_json(data))
+
+def parse_edit_batch(data: Union[str, bytes]) -> List[CompactEdits]:
+    """Validate a JSON array of DocumentEdits in one call, into their compact forms."""
+    return [compact_payload(payload) for payload in DOCUMENT_EDITS_BATCH.validate_json(data)]
+
+def sort_document_edits(edit: LineEdit) -> float:
+    """The line edit_document orders `edit` by."""
+    return compact_edits(DocumentEdits.model_construct(edits=[edit])).sort_keys()[0]
+
+def edit_document(file_path: str, document_edit: Union[DocumentEdits, CompactEdits]):
     # Read the content of the file
     with open(file_path, 'r') as file:
         lines = file.readlines()
 
-    for edit in sorted(document_edit.edits, key=sort_document_edits, reverse=True):
-        if isinstance(edit, DocumentLinesDelete):
-            start, end = edit.line_numbers
-            if start < 1 or end > len(lines):
+    compact = document_edit if isinstance(document_edit, CompactEdits) else compact_edits(document_edit)
+    ops, starts, ends, text_indexes, texts = compact.ops, compact.starts, compact.ends, compact.text_indexes, compact.texts
+    # Line numbers refer to the document as it was read, not as edits already applied (appends first of all) left it
+    line_count = len(lines)
+    for index in compact.apply_order():
+        op, start, end = ops[index], starts[index], ends[index]
+        if op == OP_DELETE:
+            if start < 1 or end > line_count:
                 raise IndexError("Line number out of range for delete operation")
             if start == end:
                 del lines[start - 1]
             else:
                 del lines[start - 1:end]
-        
-        elif isinstance(edit, DocumentLineAdd):
-            line_number = edit.line_number
-            if line_number is not None and (line_number <= 0 or line_number > len(lines)):
+
+        elif op == OP_APPEND:
+            lines.append(texts[text_indexes[index]])
+
+        elif op == OP_ADD:
+            if start < 0 or start > line_count:
                 raise IndexError("Line number out of range for add operation")
-            if line_number is None:
-                lines.append(edit.new_line + "\n")
-            else:
-                lines.insert(line_number, edit.new_line + "\n")
+            lines.insert(start, texts[text_indexes[index]])
 
-        elif isinstance(edit, DocumentLineEdit):
-            line_number = edit.line_number
-            if line_number <= 0 or line_number > len(lines):
+        else:
+            if start <= 0 or start > line_count:
                 raise IndexError("Line number out of range for edit operation")
-            lines[line_number-1] = edit.new_line + "\n"
+            lines[start - 1] = texts[text_indexes[index]]
     
     # Write the modified content back to the file
     with open(file_path, 'w') as file:
         file.writelines(lines)
 
 
-def fetch_doc_with_line_numbers(doc_path: str):
-    with open(doc_path, 'r', encoding='utf-8') as fh:
-        ret_str = ""
-        count = 1
-        for line in fh:
-            ret_str += f"\n{count}: {line}"
-            count = count + 1
-        return ret_str
\ No newline at end of file
+class EditPlan(NamedTuple):
+    """A validated DocumentEdits, indexed by the original line number each edit touches."""
+    touched: List[int]
+    replacements: Dict[int, str]
+    inserts: Dict[int, List[str]]
+    delete_ends: Dict[int, int]
+    appends: List[str]
+
+def plan_document_edits(line_count: int, document_edit: Union[DocumentEdits, CompactEdits]) -> EditPlan:
+    """
+    Validate edits against a document of `line_count` lines.
+    Like edit_document, line numbers refer to the document before any edit is applied,
+    but overlapping edits raise ValueError instead of shifting each other,
+    and an add below line 0 goes at the top of the document.
+    """
+    replacements = {}
+    inserts = {}
+    appends = []
+    deletes = []
+
+    compact = document_edit if isinstance(document_edit, CompactEdits) else compact_edits(document_edit)
+    texts = compact.texts
+    for op, start, end, text_index in compact:
+        if op == OP_DELETE:
+            if start < 1 or end > line_count:
+                raise IndexError("Line number out of range for delete operation")
+            if start > end:
+                raise ValueError(f"Delete range {start}-{end} is backwards")
+            deletes.append((start, end))
+
+        elif op == OP_APPEND:
+            appends.append(texts[text_index])
+
+        elif op == OP_ADD:
+            if start < 0 or start > line_count:
+                raise IndexError("Line number out of range for add operation")
+            inserts.setdefault(start, []).append(texts[text_index])
+
+        else:
+            if start <= 0 or start > line_count:
+                raise IndexError("Line number out of range for edit operation")
+            if start in replacements:
+                raise ValueError(f"Line {start} is edited more than once")
+            replacements[start] = texts[text_index]
+
+    deletes.sort()
+    delete_starts = [start for start, _ in deletes]
+    delete_ends = dict(deletes)
+    for (_, previous_end), (start, end) in zip(deletes, deletes[1:]):
+        if start <= previous_end:
+            raise ValueError(f"Delete range {start}-{end} overlaps another delete")
+
+    def deleted_range(line_number: int):
+        index = bisect_right(delete_starts, line_number) - 1
+        if index >= 0 and line_number <= deletes[index][1]:
+            return deletes[index]
+        return None
+
+    for line_number in replacements:
+        if deleted_range(line_number) is not None:
+            raise ValueError(f"Line {line_number} is both edited and deleted")
+    for line_number in inserts:
+        deleted = deleted_range(line_number)
+        # Adding below the last line of a deleted range is fine; anywhere else inside it is ambiguous
+        if deleted is not None and line_number != deleted[1]:
+            raise ValueError(f"Line added below line {line_number}, inside deleted range {deleted[0]}-{deleted[1]}")
+
+    touched = sorted(set(replacements) | set(inserts) | delete_ends.keys())
+    return EditPlan(touched, replacements, inserts, delete_ends, appends)
+
+def merge_document_edits(plan: EditPlan, source: Iterator[str]) -> Iterator[str]:
+    """Yield the edited document, pulling each original line from `source` exactly once."""
+    cursor = 0  # original lines copied or skipped so far
+    for line_number in plan.touched:
+        if cursor < line_number - 1:
+            yield from islice(source, line_number - 1 - cursor)
+            cursor = line_number - 1
+
+        if line_number in plan.delete_ends:
+            end = plan.delete_ends[line_number]
+            for _ in islice(source, end - cursor):
+                pass
+            cursor = end
+        elif cursor == line_number - 1:
+            line = next(source)
+            yield plan.replacements.get(line_number, line)
+            cursor = line_number
+        yield from plan.inserts.get(line_number, ())
+
+    yield from source
+    yield from plan.appends
+
+def apply_document_edits(lines: List[str], document_edit: Union[DocumentEdits, CompactEdits]) -> List[str]:
+    """
+    Apply every edit to `lines` in a single pass and return the new lines.
+    Edits are validated up front (see plan_document_edits), and adds below the same line keep the order they were given in.
+    """
+    plan = plan_document_edits(len(lines), document_edit)
+
+    # Same walk as merge_document_edits, but copying untouched runs with list slices, which is much faster
+    result: List[str] = []
+    cursor = 0
+    for line_number in plan.touched:
+        if cursor < line_number - 1:
+            result.extend(lines[cursor:line_number - 1])
+            cursor = line_number - 1
+
+        if line_number in plan.delete_ends:
+            cursor = plan.delete_ends[line_number]
+        elif cursor == line_number - 1:
+            result.append(plan.replacements.get(line_number, lines[cursor]))
+            cursor = line_number
+        result.extend(plan.inserts.get(line_number, ()))
+
+    result.extend(lines[cursor:])
+    result.extend(plan.appends)
+    return result
+
+def edit_document_batched(file_path: str, document_edit: Union[DocumentEdits, CompactEdits]):
+    """edit_document, using apply_document_edits: O(lines + edits) instead of an O(lines) list shift per edit."""
+    with open(file_path, 'r') as file:
+        lines = file.readlines()
+
+    lines = apply_document_edits(lines, document_edit)
+
+    with open(file_path, 'w') as file:
+        file.writelines(lines)
+
+
+def edit_document_streaming(file_path: str, document_edit: Union[DocumentEdits, CompactEdits]):
+    """
+    edit_document for documents too big to hold in memory.
+    The source is read twice, once to count lines and once to stream it through the edits into a
+    temp file next to it, which then replaces the original. Memory is bounded by the size of the
+    edits, and a crash part way leaves the original file untouched.
+    """
+    with open(file_path, 'r') as file:
+        line_count = sum(1 for _ in file)
+    plan = plan_document_edits(line_count, document_edit)
+
+    rewrite_document(file_path, lambda source: merge_document_edits(plan, source))
+
+def diff_document_edits(old: Union[str, List[str]], new: Union[str, List[str]], base_version: Optional[int] = None) -> DocumentEdits:
+    """
+    The DocumentEdits that turn `old` into `new` (text, or lists of lines), touching only the lines that differ.
+    Changed lines become edits, with the surplus on either side deleted or added below the last changed line.
+    Several adds below one line rely on the engines keeping adds in the order given, which they all do.
+    """
+    old_lines = old.splitlines() if isinstance(old, str) else [line.rstrip("\n") for line in old]
+    new_lines = new.splitlines() if isinstance(new, str) else [line.rstrip("\n") for line in new]
+    edits: List[LineEdit] = []
+    # Without autojunk, common lines (blank lines, repeated headers) still anchor the match
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        paired = min(old_end - old_start, new_end - new_start)
+        for offset in range(paired):
+            edits.append(DocumentLineEdit(line_number=old_start + offset + 1, new_line=new_lines[new_start + offset]))
+        if old_end - old_start > paired:
+            edits.append(DocumentLinesDelete(line_numbers=(old_start + paired + 1, old_end)))
+        for line in new_lines[new_start + paired:new_end]:
+            edits.append(DocumentLineAdd(line_number=old_end, new_line=line))
+    return DocumentEdits(edits=edits, base_version=base_version)
+
+def rewrite_document(file_path: str, transform: Callable[[Iterator[str]], Iterable[str]]):
+    """
+    Stream the file's lines through `transform` into a temp file next to it, then swap it in.
+    A crash part way leaves the original file untouched.
+    """
+    directory, name = os.path.split(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix=".tmp")
+    try:
+        with open(file_path, 'r') as source, os.fdopen(fd, 'w') as target:
+            target.writelines(transform(source))
+            target.flush()
+            os.fsync(target.fileno())
+        shutil.copymode(file_path, tmp_path)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def fetch_doc_with_line_numbers(doc_path: str, start_line: Optional[int] = None, end_line: Optional[int] = None, header: Optional[str] = None):
+    """
+    The document, or part of it, with each line prefixed by its line number.
+    Pass start_line/end_line (inclusive) or a header title to fetch only that slice;
+    slices are read through a cached line-offset index, so they cost the size of the slice.
+    """
+    if start_line is None and end_line is None and header is None:
+        with open(doc_path, 'r', encoding='utf-8') as fh:
+            return "".join(f"\n{count}: {line}" for count, line in enumerate(fh, start=1))
+
+    index = get_line_index(doc_path)
+    if header is not None:
+        section = index.find_section(header)
+        if section is None:
+            raise KeyError(f"No header named {header!r} in {doc_path}")
+        start_line, end_line = section
+    if start_line is None:
+        start_line = 1
+    if end_line is None:
+        end_line = index.line_count
+    lines = index.read_lines(start_line, end_line)
+    return "".join(f"\n{count}: {line}" for count, line in enumerate(lines, start=max(start_line, 1)))
@@ -0,0 +1,451 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from crews.document_edits import DocumentEdits, DocumentLineAdd, DocumentLineEdit, DocumentLinesDelete, EditPlan, fetch_doc_with_line_numbers, plan_document_edits
+
+class Hunk(NamedTuple):
+    """Replace `remove` lines starting at 0-based line `start` with `insert`."""
+    start: int
+    remove: int
+    insert: List[str]
+
+def plan_hunks(lines: List[str], plan: EditPlan) -> List[Hunk]:
+    """The planned edits as ascending, non-overlapping hunks against `lines`."""
+    hunks: List[Hunk] = []
+
+    def add(start: int, remove: int, insert: List[str]):
+        previous = hunks[-1] if hunks else None
+        if previous is not None and previous.start + previous.remove == start:
+            hunks[-1] = Hunk(previous.start, previous.remove + remove, previous.insert + insert)
+        else:
+            hunks.append(Hunk(start, remove, insert))
+
+    deleted_through = 0
+    for line_number in plan.touched:
+        if line_number in plan.delete_ends:
+            end = plan.delete_ends[line_number]
+            add(line_number - 1, end - line_number + 1, [])
+            deleted_through = end
+        elif line_number > deleted_through:
+            if line_number in plan.replacements:
+                add(line_number - 1, 1, [plan.replacements[line_number]])
+        if line_number in plan.inserts:
+            add(line_number, 0, list(plan.inserts[line_number]))
+    if plan.appends:
+        add(len(lines), 0, list(plan.appends))
+    return hunks
+
+def invert_hunks(lines: List[str], hunks: List[Hunk]) -> List[Hunk]:
+    """Hunks that turn the edited document back into `lines`."""
+    inverse = []
+    shift = 0
+    for hunk in hunks:
+        inverse.append(Hunk(hunk.start + shift, len(hunk.insert), lines[hunk.start:hunk.start + hunk.remove]))
+        shift += len(hunk.insert) - hunk.remove
+    return inverse
+
+def apply_hunks(source: Iterable[str], hunks: List[Hunk]) -> Iterator[str]:
+    source = iter(source)
+    cursor = 0
+    for hunk in hunks:
+        yield from islice(source, hunk.start - cursor)
+        for _ in islice(source, hunk.remove):
+            pass
+        yield from hunk.insert
+        cursor = hunk.start + hunk.remove
+    yield from source
+
+def rebase_line(index: int, hunks: List[Hunk]) -> Tuple[int, bool]:
+    """
+    Where 0-based line `index` ended up after `hunks`, and whether it survived them.
+    A line the hunks removed or rewrote maps to the position just after what replaced it.
+    """
+    shift = 0
+    for start, remove, insert in hunks:
+        if index < start:
+            break
+        if index < start + remove:
+            return start + shift + len(insert), False
+        shift += len(insert) - remove
+    return index + shift, True
+
+def rebase_range(first: int, last: int, hunks: List[Hunk]) -> List[Tuple[int, int]]:
+    """The surviving parts of 0-based lines first..last (inclusive) after `hunks`, as new inclusive ranges."""
+    ranges = []
+    shift = 0
+    cursor = first
+    for start, remove, insert in hunks:
+        if start > last:
+            break
+        end = start + remove
+        if end > cursor:
+            if start > cursor:
+                ranges.append((cursor + shift, start - 1 + shift))
+            cursor = end
+        shift += len(insert) - remove
+        if cursor > last:
+            break
+    if cursor <= last:
+        ranges.append((cursor + shift, last + shift))
+    return ranges
+
+def rebase_edits(document_edit: DocumentEdits, hunks: List[Hunk]) -> DocumentEdits:
+    """
+    Move edits written against one version onto the version `hunks` produced from it.
+    Lines the intervening hunks changed belong to that change: an edit of one becomes an add
+    just after it, and deletes skip them, so neither writer's text is lost.
+    """
+    rebased = []
+    for edit in document_edit.edits:
+        if isinstance(edit, DocumentLinesDelete):
+            start, end = edit.line_numbers
+            for first, last in rebase_range(start - 1, end - 1, hunks):
+                rebased.append(DocumentLinesDelete(line_numbers=(first + 1, last + 1)))
+
+        elif isinstance(edit, DocumentLineAdd):
+            line_number = edit.line_number
+            if line_number is not None and line_number > 0:
+                index, survived = rebase_line(line_number - 1, hunks)
+                line_number = index + 1 if survived else index
+            rebased.append(DocumentLineAdd(line_number=line_number, new_line=edit.new_line))
+
+        elif isinstance(edit, DocumentLineEdit):
+            index, survived = rebase_line(edit.line_number - 1, hunks)
+            if survived:
+                rebased.append(DocumentLineEdit(line_number=index + 1, new_line=edit.new_line))
+            else:
+                rebased.append(DocumentLineAdd(line_number=index, new_line=edit.new_line))
+    return DocumentEdits(edits=rebased, base_version=document_edit.base_version)
+
+def content_hash(lines: Iterable[str]) -> str:
+    return hashlib.sha256("".join(lines).encode('utf-8')).hexdigest()
+
+def chain_hash(base_hash: str, hunks: List[Hunk]) -> str:
+    """A version's hash from its base's and the hunks between them, so it costs the size of the change, not the document."""
+    return hashlib.sha256((base_hash + json.dumps(hunks)).encode('utf-8')).hexdigest()
+
+class LineOffsets:
+    """
+    The byte offset each line starts at, as a Fenwick tree over the lines' sizes: O(log lines) to look up,
+    and O(log lines) per line to update when a change keeps the number of lines. A change that adds or
+    removes lines renumbers everything after it, so the tree is only kept up to there, and rebuilt from
+    there (O(lines after it)) by the next lookup past it.
+    """
+
+    def __init__(self, sizes: List[int]):
+        self.sizes = sizes
+        self._tree = [0]
+        self._valid = 0  # tree nodes 1.._valid are up to date
+
+    def _rebuild(self, through: int):
+        tree, sizes = self._tree, self.sizes
+        del tree[self._valid + 1:]
+        for node in range(self._valid + 1, through + 1):
+            total = sizes[node - 1]
+            child = 1
+            while child < node & -node:
+                total += tree[node - child]
+                child <<= 1
+            tree.append(total)
+        self._valid = through
+
+    def offset(self, index: int) -> int:
+        """Bytes before 0-based line `index`."""
+        if index > self._valid:
+            self._rebuild(len(self.sizes))
+        total = 0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+    def replace(self, start: int, remove: int, sizes: List[int]):
+        """Replace `remove` sizes from 0-based line `start` with `sizes`."""
+        if remove != len(sizes):
+            self.sizes[start:start + remove] = sizes
+            self._valid = min(self._valid, start)
+            return
+        for index, size in enumerate(sizes, start):
+            delta = size - self.sizes[index]
+            if delta:
+                self.sizes[index] = size
+                node = index + 1
+                while node <= self._valid:
+                    self._tree[node] += delta
+                    node += node & -node
+
+class DocumentChanged(ValueError):
+    """The document no longer matches the version its journal last recorded: something wrote to it directly."""
+
+def journal_paths(doc_path: str) -> Tuple[Path, Path]:
+    """Where the journal for `doc_path` keeps its log and its snapshots."""
+    path = Path(doc_path)
+    return path.with_name(path.name + ".journal.jsonl"), path.with_name(path.name + ".snapshots")
+
+class EditJournal:
+    """
+    An append-only history of the edits made to one document, kept in <doc>.journal.jsonl.
+    Each edit records its DocumentEdits, the hash of the version it was applied to, and
+    forward and inverse hunks, so undo and redo only touch the lines the edit changed.
+    Full copies are saved every `checkpoint_every` versions in <doc>.snapshots/, and any
+    version can be rebuilt from the nearest one by replaying the log.
+
+    The current version is also kept in memory, so a change never re-reads the document, and is written
+    in place. One that keeps the document's size in bytes only writes the lines from its first hunk to its
+    last, so undoing or redoing a same-size edit costs the size of the edit. One that grows or shrinks the
+    document has to move everything after it, so it rewrites the file from its first hunk to the end, and
+    splices the lines in memory. Each version's hash chains its hunks onto its base's hash, so it costs the
+    size of the change too. Before each change the file is checked against the lines in memory (only
+    re-read if its mtime or size moved), and DocumentChanged is raised if anything else modified it.
+
+    Versions only ever go up: an undo or redo is recorded as a new version, so a version number
+    always names the same text. That lets several agents edit one document: fetch() hands out the
+    current version with the text, and edits made against an older version are rebased over
+    everything applied since. Use get_journal() so every writer in the process shares one journal.
+    """
+
+    def __init__(self, doc_path: str, checkpoint_every: int = 20):
+        self.doc_path = Path(doc_path)
+        self.journal_path, self.snapshot_dir = journal_paths(doc_path)
+        self.checkpoint_every = checkpoint_every
+        self.version = 0
+        self._records: Dict[int, dict] = {}
+        self._undo_stack: List[int] = []
+        self._redo_stack: List[int] = []
+        # The current version's lines, where each starts in bytes, and the file's (mtime, size) when they were written
+        self._lines: List[str] = []
+        self._offsets = LineOffsets([])
+        self._signature: Optional[Tuple[int, int]] = None
+        # Held while a change is planned, written and recorded; rebasing edits doesn't need it
+        self._lock = threading.RLock()
+
+        if self.journal_path.exists():
+            with open(self.journal_path, 'r', encoding='utf-8') as fh:
+                for line in fh:
+                    self._replay(json.loads(line))
+            self._set_lines(self.snapshot(self.version))
+            self._signature = None
+            self._check_document()
+        else:
+            # Version 0 is the document as it was when journaling started
+            self._set_lines(self._read())
+            self._write_snapshot(0, self._lines)
+            self._append({"type": "init", "version": 0, "hash": content_hash(self._lines), "timestamp": time.time()})
+
+    def _replay(self, record: dict):
+        # Recorded before the version moves, since apply() reads both without the lock
+        self._records[record["version"]] = record
+        self.version = record["version"]
+        if record["type"] == "edit":
+            self._undo_stack.append(record["version"])
+            self._redo_stack.clear()
+        elif record["type"] == "undo":
+            self._redo_stack.append(self._undo_stack.pop())
+        elif record["type"] == "redo":
+            self._redo_stack.pop()
+            self._undo_stack.append(record["version"])
+
+    def _append(self, record: dict):
+        with open(self.journal_path, 'a', encoding='utf-8') as fh:
+            fh.write(json.dumps(record) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+        self._replay(record)
+
+    def _read(self) -> List[str]:
+        # Line endings are kept as they are, so the lines' sizes are their sizes on disk
+        with open(self.doc_path, 'r', encoding='utf-8', newline='') as fh:
+            return fh.readlines()
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.doc_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _set_lines(self, lines: List[str]):
+        self._lines = lines
+        self._offsets = LineOffsets([len(line.encode('utf-8')) for line in lines])
+        self._signature = self._stat()
+
+    def _check_document(self):
+        """Make sure the file is still the version the journal last recorded, before changing it or handing it out."""
+        if self._signature is not None and self._stat() == self._signature:
+            return
+        lines = self._read() if self.doc_path.exists() else None
+        if lines != self._lines:
+            raise DocumentChanged(f"{self.doc_path} was changed outside its journal since version {self.version}")
+        # Only touched: same text
+        self._signature = self._stat()
+
+    def _apply_in_place(self, hunks: List[Hunk]):
+        """Apply hunks to the lines in memory, then write the lines they changed (and, if the size changed, the rest) to the file."""
+        if not hunks:
+            return
+        grown = 0
+        for start, remove, insert in reversed(hunks):
+            sizes = [len(line.encode('utf-8')) for line in insert]
+            grown += sum(sizes) - sum(self._offsets.sizes[start:start + remove])
+            self._lines[start:start + remove] = insert
+            self._offsets.replace(start, remove, sizes)
+        first = hunks[0][0]
+        if grown:
+            end = len(self._lines)
+        else:
+            # Same size: everything after the last hunk is already where it belongs
+            shift = sum(len(insert) - remove for _, remove, insert in hunks[:-1])
+            last = hunks[-1]
+            end = last[0] + shift + len(last[2])
+        with open(self.doc_path, 'r+b') as fh:
+            fh.seek(self._offsets.offset(first))
+            fh.write("".join(self._lines[first:end]).encode('utf-8'))
+            if grown:
+                fh.truncate()
+            fh.flush()
+            os.fsync(fh.fileno())
+        self._signature = self._stat()
+
+    def _snapshot_path(self, version: int) -> Path:
+        return self.snapshot_dir / f"v{version}.md"
+
+    def _write_snapshot(self, version: int, lines: List[str]):
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        with open(self._snapshot_path(version), 'w', encoding='utf-8', newline='') as fh:
+            fh.writelines(lines)
+
+    def _hunks(self, version: int) -> List[Hunk]:
+        return [Hunk(*hunk) for hunk in self._records[version]["hunks"]]
+
+    def fetch(self, start_line: Optional[int] = None, end_line: Optional[int] = None, header: Optional[str] = None) -> Tuple[int, str]:
+        """The current version and the line-numbered document (or a slice of it, see fetch_doc_with_line_numbers)."""
+        with self._lock:
+            self._check_document()
+            return self.version, fetch_doc_with_line_numbers(str(self.doc_path), start_line=start_line, end_line=end_line, header=header)
+
+    def apply(self, document_edit: DocumentEdits, base_version: Optional[int] = None) -> int:
+        """
+        Apply the edits to the document, record them, and return the new version.
+        base_version (default: document_edit.base_version) is the version the edits' line numbers
+        were read from, as fetch() gave it; edits against an older version are rebased first.
+        One of the two is required: without it there is no telling which lines the edits meant.
+        """
+        if base_version is None:
+            base_version = document_edit.base_version
+        if base_version is None:
+            raise ValueError("Edits need a base_version: the document version their line numbers were read from")
+        # Recorded versions never change, so the rebase over them runs without the lock
+        rebased_to = self.version
+        if base_version > rebased_to or base_version < 0:
+            raise ValueError(f"Edits are based on version {base_version}, but the document is at version {rebased_to}")
+        for version in range(base_version + 1, rebased_to + 1):
+            document_edit = rebase_edits(document_edit, self._hunks(version))
+
+        with self._lock:
+            # Only what other writers committed in the meantime is left
+            for version in range(rebased_to + 1, self.version + 1):
+                document_edit = rebase_edits(document_edit, self._hunks(version))
+            document_edit = document_edit.model_copy(update={"base_version": self.version})
+
+            self._check_document()
+            plan = plan_document_edits(len(self._lines), document_edit)
+            hunks = plan_hunks(self._lines, plan)
+            inverse = invert_hunks(self._lines, hunks)
+            base_hash = self._records[self.version]["hash"]
+            self._apply_in_place(hunks)
+            return self._commit({
+                "type": "edit",
+                "base_hash": base_hash,
+                "hash": chain_hash(base_hash, hunks),
+                "edits": document_edit.model_dump(mode="json"),
+                "hunks": hunks,
+                "inverse": inverse,
+            })
+
+    def undo(self) -> int:
+        """Revert the most recent edit that has not been undone yet, as a new version."""
+        with self._lock:
+            if not self._undo_stack:
+                raise IndexError("Nothing to undo")
+            undone = self._records[self._undo_stack[-1]]
+            self._check_document()
+            hunks = [Hunk(*hunk) for hunk in undone["inverse"]]
+            base_hash = self._records[self.version]["hash"]
+            self._apply_in_place(hunks)
+            return self._commit({
+                "type": "undo",
+                "undoes": undone["version"],
+                "base_hash": base_hash,
+                "hash": chain_hash(base_hash, hunks),
+                "hunks": undone["inverse"],
+                "inverse": undone["hunks"],
+            })
+
+    def redo(self) -> int:
+        """Re-apply the most recently undone edit, as a new version."""
+        with self._lock:
+            if not self._redo_stack:
+                raise IndexError("Nothing to redo")
+            redone = self._records[self._redo_stack[-1]]
+            self._check_document()
+            hunks = [Hunk(*hunk) for hunk in redone["hunks"]]
+            base_hash = self._records[self.version]["hash"]
+            self._apply_in_place(hunks)
+            return self._commit({
+                "type": "redo",
+                "redoes": redone["version"],
+                "base_hash": base_hash,
+                "hash": chain_hash(base_hash, hunks),
+                "hunks": redone["hunks"],
+                "inverse": redone["inverse"],
+            })
+
+    def _commit(self, record: dict) -> int:
+        """Record a change already made to the document as the next version."""
+        version = self.version + 1
+        self._append({"version": version, "timestamp": time.time(), **record})
+        if version % self.checkpoint_every == 0:
+            self._write_snapshot(version, self._lines)
+        return version
+
+    def snapshot(self, version: Optional[int] = None) -> List[str]:
+        """The document's lines at `version` (default: the current one), rebuilt from the nearest checkpoint."""
+        version = self.version if version is None else version
+        if version < 0 or version > self.version:
+            raise IndexError(f"No version {version}")
+        base = version - version % self.checkpoint_every
+        while base > 0 and not self._snapshot_path(base).exists():
+            base -= self.checkpoint_every
+        with open(self._snapshot_path(base), 'r', encoding='utf-8', newline='') as fh:
+            lines = fh.readlines()
+        for replay in range(base + 1, version + 1):
+            lines = list(apply_hunks(lines, self._hunks(replay)))
+        return lines
+
+_journals: Dict[str, EditJournal] = {}
+_journals_lock = threading.Lock()
+
+def get_journal(doc_path: str) -> EditJournal:
+    """The process-wide journal for `doc_path`."""
+    key = os.path.abspath(doc_path)
+    with _journals_lock:
+        if key not in _journals:
+            _journals[key] = EditJournal(key)
+        return _journals[key]
+
+def discard_journal(doc_path: str):
+    """Forget `doc_path`'s history (say, before replacing the file wholesale); its next journal starts from the file as it is then."""
+    key = os.path.abspath(doc_path)
+    with _journals_lock:
+        _journals.pop(key, None)
+        journal_path, snapshot_dir = journal_paths(key)
+        if journal_path.exists():
+            os.remove(journal_path)
+        if snapshot_dir.exists():
+            shutil.rmtree(snapshot_dir)
@@ -0,0 +1,70 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Set, Tuple, Union
+from crews.context import ContextBuilder
+from crews.design_doc import ContextWindow
+from crews.outline import OutlineTree, Section
+
+# fill_section(section, context) -> the written body for that section
+FillSection = Callable[[str, str], str]
+# on_filled(header line, body), called in outline order
+OnFilled = Callable[[str, str], None]
+# on_start(header line), called just before a section is sent to fill_section
+OnStart = Callable[[str], None]
+
+def fill_group(tree: OutlineTree, sections: List[Section], fill_section: FillSection, context_lines: int = 10, on_filled: Optional[OnFilled] = None, skip: int = 0, seed_context: str = "", on_start: Optional[OnStart] = None, context_builder: Optional[ContextBuilder] = None, scope: Optional[Set[str]] = None) -> List[Tuple[str, str]]:
+    """
+    Fill `sections` in order. Each call gets its context from context_builder, limited to the sections in `scope`,
+    or without one, the tail of what this group has written so far.
+    The first `skip` sections are already written; seed_context stands in for their text.
+    """
+    window = ContextWindow(context_lines)
+    window.push(seed_context)
+    filled: List[Tuple[str, str]] = []
+
+    for section in sections[skip:]:
+        print(f"\n\n Starting line: {section.line}")
+        if on_start is not None:
+            on_start(section.line)
+        context = context_builder.build(section.id, scope) if context_builder is not None else window.text()
+        result = fill_section(tree.header_path(section.id), context)
+        filled.append((section.line, result))
+        if context_builder is not None:
+            context_builder.add(section.id, result)
+        if on_filled is not None:
+            on_filled(section.line, result)
+        window.push(section.line + result + "\n")
+    return filled
+
+def fill_sections(outline: Union[OutlineTree, List[str]], fill_section: FillSection, concurrency: int = 1, on_filled: Optional[OnFilled] = None, done: int = 0, seed_context: str = "", on_start: Optional[OnStart] = None, context_builder: Optional[ContextBuilder] = None) -> List[Tuple[str, str]]:
+    """
+    Fill the outline (a parsed tree, or its lines), returning (header line, body) pairs in outline order.
+    With concurrency > 1 each subtree from OutlineTree.subtrees() is filled on its own worker, so context only carries within a subtree
+    (and, with a context_builder, from the sections already written before filling started).
+    on_filled still sees sections in outline order; a subtree is emitted once it and every subtree before it are done.
+    The first `done` sections are skipped (resuming a campaign), with seed_context as the text written before them.
+    on_start is only honoured when filling sequentially, where sections start in outline order.
+    """
+    tree = outline if isinstance(outline, OutlineTree) else OutlineTree.parse(outline)
+    if concurrency <= 1:
+        return fill_group(tree, tree.sections, fill_section, on_filled=on_filled, skip=done, seed_context=seed_context, on_start=on_start, context_builder=context_builder)
+
+    # Keeps each worker's prompts independent of how far the others have got
+    written_before = {section.id for section in tree.sections[:done]}
+    jobs = []
+    for group in tree.subtrees():
+        skip = min(max(done - group[0].index, 0), len(group))
+        if skip < len(group):
+            jobs.append((group, skip, seed_context if skip else ""))
+
+    filled: List[Tuple[str, str]] = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [
+            pool.submit(fill_group, tree, group, fill_section, skip=skip, seed_context=seed, context_builder=context_builder, scope=written_before | {section.id for section in group})
+            for group, skip, seed in jobs
+        ]
+        for future in futures:
+            for line, result in future.result():
+                filled.append((line, result))
+                if on_filled is not None:
+                    on_filled(line, result)
+    return filled
@@ -1,14 +1,38 @@
 import math
 import os
 from pathlib import Path
+import shutil
+import sys
+import threading
 import time
+from typing import TYPE_CHECKING, Optional
 from textwrap import dedent
-from crewai import Agent, Task, Crew, Process
-from crewai.tasks.task_output import TaskOutput
-from crewai_tools import BrowserbaseLoadTool, EXASearchTool, BaseTool
-from crews.document_edits import DocumentEdits, edit_document, fetch_doc_with_line_numbers, document_edits_example
-from langchain_community.tools import DuckDuckGoSearchRun
-from langchain_anthropic import ChatAnthropic
+from crews.checkpoint import PIPELINE_STAGES, CampaignCheckpoint, latest_campaign_dir
+from crews.context import ContextBuilder
+from crews.document_edits import DocumentEdits, edit_document, parse_document_edits, fetch_doc_with_line_numbers, document_edits_example
+from crews.design_doc import DesignDocument
+from crews.edit_journal import discard_journal, get_journal
+from crews.filling import fill_sections
+from crews.lazy import LazyImport, LazyMapping
+from crews.outline import OutlineTree
+from crews.pipeline import Pipeline, PipelineStopped, parse_timeouts
+from crews.vector_index import get_vector_index
+
+# These load langchain_core, so they're imported where a campaign starts running, not when this module is
+if TYPE_CHECKING:
+    from crews.llm_cache import PersistentLLMCache
+    from crews.prompts import StablePrefixes
+    from crews.rate_limit import RateLimitedChatModel
+    from crews.tracing import Tracer
+
+# crewAI and the langchain integrations take seconds to import, so they load on first use
+Agent = LazyImport("crewai", "Agent")
+Task = LazyImport("crewai", "Task")
+Crew = LazyImport("crewai", "Crew")
+Process = LazyImport("crewai", "Process")
+TaskOutput = LazyImport("crewai.tasks.task_output", "TaskOutput")
+DuckDuckGoSearchRun = LazyImport("langchain_community.tools", "DuckDuckGoSearchRun")
+ChatAnthropic = LazyImport("langchain_anthropic", "ChatAnthropic")
 
 from dotenv import load_dotenv
 load_dotenv
@@ -16,17 +40,57 @@ load_dotenv
 # import agentops
 # agentops.init()
 
-class DocumentFetchTool(BaseTool):
-    name: str = "Document Fetch Tool"
-    description: str = "Fetches the document that the crew is currently working on. The document has been augmented with line numbers to be used when editing."
-    doc_path: str
-
-    def _run(self) -> str:
-        return fetch_doc_with_line_numbers(self.doc_path)
-
-def edit_callback(file_path: str,output: TaskOutput):
-    print(DocumentEdits.model_validate(output.exported_output))
-    edit_document(file_path=file_path, document_edit=output.exported_output)
+def __getattr__(name: str):
+    # The tools subclass crewai_tools.BaseTool, so they live in crews.tools and are only imported when asked for
+    if name in ("DocumentFetchTool", "CampaignSearchTool"):
+        from crews import tools
+        return getattr(tools, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# What the outline and both its reviews produce
+OUTLINE_OUTPUT = dedent(
+    """
+    A markdown document containing only header lines (#, ##, and ###).
+    The headers outline all details needed to run a full campaign.
+
+    Example:
+
+    # Title
+    ## Key Locations
+    ### Key Location One
+    ### Key Location Two
+
+    ## Protaganists
+    ### Protaganist One
+    ### Protaganist Two
+    """
+)
+
+EDITS_REVIEW_OUTPUT = dedent(
+    """
+    Only the changes the document needs, as DocumentEdits; lines that are fine stay out of them.
+    Fetch the document with the Document Fetch Tool first: edit by its line numbers, and put the version it
+    gives in base_version. The document must still contain only header lines (#, ##, and ###) afterwards.
+    """
+) + document_edits_example
+
+def start_review(campaign_dir: Path, stage: str):
+    """Start <stage>.md as a copy of the previous stage's output, for a REVIEW_MODE=edits reviewer to edit."""
+    previous_stage = PIPELINE_STAGES[PIPELINE_STAGES.index(stage) - 1]
+    doc_path = campaign_dir / f"{stage}.md"
+    # Edits an interrupted attempt journaled were made to the copy being replaced
+    discard_journal(str(doc_path))
+    shutil.copyfile(campaign_dir / f"{previous_stage}.md", doc_path)
+
+def edit_callback(file_path: str,output: TaskOutput, fetched_version: Optional[int] = None):
+    document_edit = parse_document_edits(output.exported_output)
+    # An agent that left base_version out read its line numbers from its last fetch
+    if document_edit.base_version is None and fetched_version is not None:
+        document_edit = document_edit.model_copy(update={"base_version": fetched_version})
+    print(document_edit)
+    # Journaled, so a bad agent edit can be undone without rerunning the task,
+    # and rebased from document_edit.base_version if other agents edited first
+    get_journal(file_path).apply(document_edit)
 
         
 # class DocumentEditTool(BaseTool):
@@ -53,24 +117,10 @@ def edit_callback(file_path: str,output: TaskOutput):
 #         ret = "Document has been successfully edited. Here is the updated file:\n" + fetch_doc_with_line_numbers(self.doc_path)
 #         return ret
 
-def run():
-    search_tool = DuckDuckGoSearchRun()
-
-    campaign_dir = Path("./campaign_" + str(math.floor(time.time())))
-    os.makedirs(campaign_dir, exist_ok=True)
-
-
-    # docFetchTool = DocumentFetchTool(doc_path=doc_path)
-    # docEditTool = DocumentEditTool(doc_path=doc_path)
-    # editDocumentCallback = edit_callback_with_filepath(doc_path)
-
-    anthropic_llm = ChatAnthropic(
-        model=os.environ.get("CLAUDE_MODEL"),
-        api_key=os.environ.get("ANTHROPIC_API_KEY"),
-    )
-
+def build_agents(llm, search_tool, writer_llm=None, writer_tools=None) -> LazyMapping:
+    """The agents by key. Each is only built when first looked up, so a crew pays for the agents it uses."""
     # Creating personal trainer
-    personal_trainer = Agent(
+    personal_trainer = lambda: Agent(
         role='Personal Trainer',
         goal='Develop workout plans and goals to help your clients',
         verbose=True,
@@ -79,8 +129,8 @@ def run():
         backstory=(dedent(
             """\
             You are an experienced personal trainer specializing in Peloton bike workouts. 
-	        Your mission is to create dynamic, personalized training sessions that respond to the user's actions and choices within the game. 
-	
+            Your mission is to create dynamic, personalized training sessions that respond to the user's actions and choices within the game. 
+
             You have the ability to suggest new cadence ranges between 50 and 115:
             - 50-70: Slow cadence for resting or heavy climbs  
             - 70-90: Moderate cadence for standard riding
@@ -100,11 +150,11 @@ def run():
             With your expert guidance, users will stay engaged and motivated to reach their fitness goals.
             """
         )),
-        llm=anthropic_llm,
+        llm=llm,
     )
 
     # Creating a writer agent with custom tools and delegation capability
-    writer = Agent(
+    writer = lambda: Agent(
         role='Writer',
         goal='Craft immersive, interactive MMO-style or D&D-style campaigns about {theme}',
         verbose=True,
@@ -117,19 +167,19 @@ def run():
             """
         )),
         allow_delegation=False,
-        llm=anthropic_llm,
-        tools=[search_tool],
+        llm=writer_llm or llm,
+        tools=[search_tool, *(writer_tools or [])],
         max_iter=5
     )
 
     # Creating a Game Master agent
-    game_master = Agent(
+    game_master = lambda: Agent(
         role='Game Master',
         goal='Collaborate with the writer to create immersive game sessions, deliver engaging content, and integrate user choices with the Personal Trainer\'s workout suggestions',
         verbose=True,
         backstory=(dedent(
             """\
-        	As the Game Master, your role is to bring the game world to life, working closely with the writer to craft captivating stories, memorable characters, and interactive scenarios. 
+            As the Game Master, your role is to bring the game world to life, working closely with the writer to craft captivating stories, memorable characters, and interactive scenarios. 
             You will guide players through the narrative, presenting them with choices that shape the story and their character's journey.
             Your goal is to create a seamless experience where the player's decisions not only impact the story but also influence the physical challenges they face, as determined by the Personal Trainer.
             By collaborating with the writer and the Personal Trainer, you will ensure that each game session is engaging, cohesive, and tailored to the player's choices and fitness goals.
@@ -137,13 +187,13 @@ def run():
             """
         )),
         allow_delegation=True,
-        llm=anthropic_llm,
+        llm=llm,
         tools=[],
         max_iter=5
     )
 
     # Creating a Editor
-    editor = Agent(
+    editor = lambda: Agent(
         role='Editor',
         goal='Review and refine documents for grammatical accuracy, completeness, and coherence',
         verbose=True,
@@ -163,13 +213,13 @@ def run():
             """
         )),
         allow_delegation=True,
-        llm=anthropic_llm,
+        llm=llm,
         tools=[],
         max_iter=5
     )
 
     # Creating a narrator
-    narrator = Agent(
+    narrator = lambda: Agent(
         role='Narrator',
         goal='Deliver engaging and immersive narration to enhance the user\'s experience',
         verbose=True,
@@ -191,12 +241,12 @@ def run():
             """
         )),
         allow_delegation=True,
-        llm=anthropic_llm,
+        llm=llm,
         tools=[]
     )
 
     # Setting a specific manager agent
-    manager = Agent(
+    manager = lambda: Agent(
         role='Manager',
         goal='Ensure the smooth operation and coordination of the team',
         verbose=True,
@@ -204,143 +254,21 @@ def run():
             "As a seasoned project manager, you excel in organizing"
             "tasks, managing timelines, and ensuring the team stays on track."
         ),
-        llm=anthropic_llm,
+        llm=llm,
         tools=[search_tool]
     )
 
-    # Develop campaign outline
-    campaign_task_outline = Task(
-        description=(dedent(
-            """
-            Craft a new workout Choose-Your-Own-Adventure campaign outline, based on this theme: {theme}.
-            The world needs to be defined, with an initial cast of characters, locations, and existing storylines that the player will drop into.
-            Note: You avoid the word "Aetheria" at ALL COSTS.
-            The first task is to create the outline of this document. A good solid outline will allow us to fill in the sections in a well defined manner.
-            """
-        )),
-        expected_output=(dedent(
-            """
-            A markdown document containing only header lines (#, ##, and ###).
-            The headers outline all details needed to run a full campaign.
-                                
-            Example:
-            
-            # Title
-            ## Key Locations
-            ### Key Location One
-            ### Key Location Two
-            
-            ## Protaganists
-            ### Protaganist One
-            ### Protaganist Two
-            """
-        )),
-        tools=[search_tool],
-        output_file=str(campaign_dir / "01_outline_init.md"),
-        create_directory=True,
-        # callback=lambda e: edit_callback(doc_path, e),
-        # output_pydantic=DocumentEdits,
-        agent=writer,
-        # human_input=True
-    )
-
-    game_master_review = Task(
-        agent=game_master,
-        description=(dedent(
-            """
-            Given a document provided by a writer, you review it from the point of view of a Game Master. 
-            With the help of the writer, modify the document provided so that it is effective for you to use as the Game Master.
-            We are starting with just the outline.
-            """
-        )),
-        expected_output=(dedent(
-            """
-            A markdown document containing only header lines (#, ##, and ###).
-            The headers outline all details needed to run a full campaign.
-                                
-            Example:
-            
-            # Title
-            ## Key Locations
-            ### Key Location One
-            ### Key Location Two
-            
-            ## Protaganists
-            ### Protaganist One
-            ### Protaganist Two 
-            """
-        )),
-        output_file=str(campaign_dir / "02_game_master_review.md"),
-        create_directory=True,
-    )
-
-    editing_task = Task(
-        description=dedent(
-            """
-            Review and refine the given document.
-            Check for grammatical accuracy, completeness, coherence, and overall quality.
-            Ensure the content is engaging and aligns with the game's tone and style.
-            """
-        ),
-        expected_output=(dedent(
-            """
-            Edited and refined versions of given document.
-
-            A markdown document containing only header lines (#, ##, and ###).
-            The headers outline all details needed to run a full campaign.
-                                
-            Example:
-            
-            # Title
-            ## Key Locations
-            ### Key Location One
-            ### Key Location Two
-            
-            ## Protaganists
-            ### Protaganist One
-            ### Protaganist Two
-            """
-        )),
-        agent=editor,
-        output_file=str(campaign_dir / "03_editor_review.md")
-    )
-
-    # Write first session
-    first_session = Task(
-        description=(dedent(
-            """
-            Given the campaign the player is currently playing, write the first session. The Game Master should set the stage, the initial location and goal, and introduce the characters for the first session.
-            """
-        )),
-        expected_output=(
-            'A campaign overview document, listing all the details that a Game Master needs to run stories in the campaign. The document is formatted in markdown.'
-            'The narrator should take the details and write the first narration of the session.'
-            'The Personal Trainer should give the first workout'
-        ),
-        tools=[search_tool],
-        output_file='first_session.md',
-        agent=writer,
-        # human_input=True
-    )
-
-    # Forming the story-focused crew with some enhanced configurations
-    crew = Crew(
-        agents=[writer, game_master, narrator, editor],
-        tasks=[campaign_task_outline, game_master_review, editing_task],
-        process=Process.sequential,  # Optional: Sequential task execution is default
-        memory=True,
-        cache=True,
-        max_rpm=100,
-        manager_agent=manager,
-        output_log_file=str(campaign_dir / "logs.txt"),
-        verbose=True
-    )
-
-    theme = "Time-Travel Conundrum"
-    result = crew.kickoff(inputs={'theme': theme})
-
-    # Now pull the final markdown, split it, and create the task loop.
+    return LazyMapping({
+        'personal_trainer': personal_trainer,
+        'writer': writer,
+        'game_master': game_master,
+        'editor': editor,
+        'narrator': narrator,
+        'manager': manager,
+    })
 
+def build_filling_crew(agents, campaign_dir: Path, max_rpm: Optional[int] = None, tracer: Optional["Tracer"] = None):
+    writer = agents['writer']
 
     filling_out_task = Task(
         description=dedent(
@@ -371,46 +299,412 @@ def run():
         tools = [],
         agent=writer
     )
-    campaign_filling =Crew(
-        agents=[writer, game_master, narrator, editor],
+    return Crew(
+        agents=[writer, agents['game_master'], agents['narrator'], agents['editor']],
         tasks=[filling_out_task],
         process=Process.sequential,  # Optional: Sequential task execution is default
         memory=True,
         cache=True,
-        max_rpm=100,
-        manager_agent=manager,
+        max_rpm=max_rpm,
+        manager_agent=agents['manager'],
         output_log_file=str(campaign_dir / "logs.txt"),
+        step_callback=tracer.step_callback if tracer is not None else None,
         verbose=True
     )
 
-    lines = []
-    with open(campaign_dir / "03_editor_review.md", "r", encoding="utf-8") as er:
-        lines = er.readlines()
 
-    last_2header = ""
-    last_3header = ""
-    open(campaign_dir / "04_design_doc.md", "x")
-    for line in lines:
-        if line == "\n":
-            continue
-        print(f"\n\n Starting line: {line}")
+def run(theme: str = "Time-Travel Conundrum", fill_concurrency: Optional[int] = None, campaign_dir: Optional[str] = None):
+    campaign_dir = Path(campaign_dir or "./campaign_" + str(math.floor(time.time())))
+    os.makedirs(campaign_dir, exist_ok=True)
+
+    checkpoint = CampaignCheckpoint.create(campaign_dir, theme)
+    return run_campaign(checkpoint, fill_concurrency=fill_concurrency)
+
+def resume(campaign_dir: Optional[str] = None, fill_concurrency: Optional[int] = None):
+    """Pick a crashed run back up, skipping every stage and section its manifest records as done."""
+    if campaign_dir is None:
+        campaign_dir = sys.argv[1] if len(sys.argv) > 1 else latest_campaign_dir()
+    checkpoint = CampaignCheckpoint.load(campaign_dir)
+    return run_campaign(checkpoint, fill_concurrency=fill_concurrency)
+
+def build_llm_cache() -> Optional["PersistentLLMCache"]:
+    """The on-disk completion cache, configured from LLM_CACHE_PATH (empty to disable), LLM_CACHE_TTL and LLM_CACHE_MAX_ENTRIES."""
+    from crews.llm_cache import PersistentLLMCache
+
+    path = os.environ.get("LLM_CACHE_PATH", ".llm_cache.sqlite")
+    if not path:
+        return None
+    ttl = os.environ.get("LLM_CACHE_TTL")
+    max_entries = os.environ.get("LLM_CACHE_MAX_ENTRIES")
+    return PersistentLLMCache(
+        path,
+        ttl=float(ttl) if ttl else None,
+        max_entries=int(max_entries) if max_entries else None,
+    )
+
+def build_search_tool():
+    """
+    DuckDuckGo (or, with SEARCH_BACKEND=fake, an offline stand-in) behind the on-disk search cache, configured
+    from SEARCH_CACHE_PATH (empty to disable) and SEARCH_CACHE_TTL (default one week).
+    """
+    from crews.search_cache import CachingSearchTool, FakeSearch, get_search_cache
+
+    search = FakeSearch() if os.environ.get("SEARCH_BACKEND") == "fake" else DuckDuckGoSearchRun()
+    path = os.environ.get("SEARCH_CACHE_PATH", ".search_cache.sqlite")
+    if not path:
+        return search
+    ttl = os.environ.get("SEARCH_CACHE_TTL", "604800")
+    return CachingSearchTool(
+        name=getattr(search, "name", "duckduckgo_search"),
+        description=getattr(search, "description", "A search engine. Input should be a search query."),
+        search=search,
+        cache=get_search_cache(path, ttl=float(ttl) if ttl else None),
+    )
+
+def build_chat_model(cache: Optional["PersistentLLMCache"], callbacks: list, streaming: bool = False, prompt_prefixes: Optional["StablePrefixes"] = None) -> "RateLimitedChatModel":
+    """
+    ChatAnthropic behind the process-wide scheduler for CLAUDE_MODEL, limited by RATE_LIMIT_RPM (default 100)
+    and RATE_LIMIT_TPM (default unlimited; 0 turns either limit off), retrying rate-limit errors up to LLM_MAX_RETRIES (default 5) times.
+    prompt_prefixes marks the stable start of repeated prompts for Anthropic's prompt cache.
+    """
+    from crews.rate_limit import RateLimitedChatModel, get_scheduler, limits_from_env
+
+    model = os.environ.get("CLAUDE_MODEL")
+    rpm, tpm = limits_from_env()
+    scheduler = get_scheduler(model, rpm=rpm, tpm=tpm)
+    chat_model, options = ChatAnthropic, {}
+    if prompt_prefixes is not None:
+        # The pinned langchain-anthropic drops the cache_control flags and doesn't send the beta header
+        from crews.anthropic_cache import PROMPT_CACHING_BETA, CachingChatAnthropic
+        chat_model, options = CachingChatAnthropic, {"default_headers": {"anthropic-beta": PROMPT_CACHING_BETA}}
+    llm = chat_model(
+        model=model,
+        api_key=os.environ.get("ANTHROPIC_API_KEY"),
+        streaming=streaming,
+        max_retries=0,
+        **options,
+    )
+    return RateLimitedChatModel(
+        llm=llm,
+        scheduler=scheduler,
+        max_retries=int(os.environ.get("LLM_MAX_RETRIES", "5")),
+        prompt_prefixes=prompt_prefixes,
+        cache=cache,
+        callbacks=callbacks,
+    )
+
+def run_campaign(checkpoint: CampaignCheckpoint, fill_concurrency: Optional[int] = None) -> "Tracer":
+    """Run whatever the checkpoint has left to do. The returned tracer's metrics() sum up the run; trace.jsonl has every span."""
+    from crews.prompts import PromptProfiler, StablePrefixes, span_label
+    from crews.rate_limit import request_lane
+    from crews.search_cache import CachingSearchTool
+    from crews.streaming import FinalAnswerStreamer
+    from crews.tracing import Tracer
 
-        context = ""
-        with open(campaign_dir / "04_design_doc.md", "r", encoding="utf-8") as c:
-            c_lines = c.readlines()
-            context = "\n".join(c_lines[-10:])
+    # Shared by every agent and crew in the run, so repeated queries hit the cache or wait on the one in flight
+    search_tool = build_search_tool()
 
-        result = campaign_filling.kickoff(inputs={'section': last_2header + last_3header + line, 'theme': theme, 'context': context})
+    campaign_dir = Path(checkpoint.campaign_dir)
+    theme = checkpoint.theme
+
+    # docFetchTool = DocumentFetchTool(doc_path=doc_path)
+    # docEditTool = DocumentEditTool(doc_path=doc_path)
+    # editDocumentCallback = edit_callback_with_filepath(doc_path)
+
+    # One JSON line per kickoff and task, appended across resumes
+    tracer = Tracer(campaign_dir / "trace.jsonl")
+    llm_cache = build_llm_cache()
+    if llm_cache is not None:
+        llm_cache.on_lookup = tracer.cache_lookup
+    callbacks = [tracer.handler]
+    # PROMPT_PROFILE=1 breaks every task's prompts into static and dynamic tokens, saved to prompt_profile.json
+    profiler = None
+    if os.environ.get("PROMPT_PROFILE") == "1":
+        profiler = PromptProfiler(label=lambda: span_label(tracer.current_span()))
+        callbacks.append(profiler)
+    # Section fills resend the same role, backstory and task framing every time; from the second call on that prefix is
+    # marked for Anthropic's prompt cache (PROMPT_CACHE=0 turns this off, PROMPT_CACHE_MIN_TOKENS is the smallest prefix marked)
+    prompt_prefixes = None
+    if os.environ.get("PROMPT_CACHE", "1") == "1":
+        prompt_prefixes = StablePrefixes(min_tokens=int(os.environ.get("PROMPT_CACHE_MIN_TOKENS", "1024")))
+    anthropic_llm = build_chat_model(llm_cache, callbacks=callbacks, prompt_prefixes=prompt_prefixes)
+
+    # Only built if an outline stage is left to run
+    agents = build_agents(anthropic_llm, search_tool)
+
+    remaining = checkpoint.remaining_stages()
+    inputs = {'theme': theme}
+    handoff = {}
+    # REVIEW_MODE=edits has the game master and editor fetch the line-numbered outline and answer with
+    # DocumentEdits, applied to their stage's copy of it, instead of writing the whole outline out again
+    edits_review = os.environ.get("REVIEW_MODE") == "edits"
+    if remaining and remaining[0] != PIPELINE_STAGES[0]:
+        if edits_review:
+            start_review(campaign_dir, remaining[0])
+        else:
+            # Resuming: the finished stage's output is on disk, not in the crew, so hand it over explicitly
+            previous_stage = PIPELINE_STAGES[PIPELINE_STAGES.index(remaining[0]) - 1]
+            with open(campaign_dir / f"{previous_stage}.md", "r", encoding="utf-8") as fh:
+                inputs['document'] = fh.read()
+            handoff[remaining[0]] = "\nHere is the document to work from:\n\n{document}\n"
+
+    # Stage boundaries are marked as the outline crew's task callbacks fire, so later stages can start mid-crew
+    pipeline = Pipeline(done=checkpoint.stages_done)
+
+    def stage_done(stage: str):
+        tracer.task_done()
+        checkpoint.complete_stage(stage)
+        pipeline.mark_done(stage)
+        # Between tasks is as far as a kickoff can be stopped once another stage has failed
+        if pipeline.stopping.is_set():
+            raise PipelineStopped(f"Outline stopped after {stage}")
+        following = PIPELINE_STAGES.index(stage) + 1
+        if edits_review and following < len(PIPELINE_STAGES):
+            start_review(campaign_dir, PIPELINE_STAGES[following])
+
+    def review(stage: str, options: dict) -> dict:
+        """A review task's options, switched over to answering with edits in REVIEW_MODE=edits."""
+        if not edits_review:
+            return options
+        from crews.tools import DocumentFetchTool
+        doc_path = str(campaign_dir / f"{stage}.md")
+        fetch_tool = DocumentFetchTool(doc_path=doc_path)
+
+        def apply_edits(output):
+            edit_callback(doc_path, output, fetched_version=fetch_tool.last_version)
+            stage_done(stage)
+
+        return {
+            **options,
+            "expected_output": EDITS_REVIEW_OUTPUT,
+            "tools": [fetch_tool],
+            "output_file": None,
+            "output_pydantic": DocumentEdits,
+            "callback": apply_edits,
+        }
+
+    # Develop campaign outline
+    campaign_task_outline = lambda: Task(
+        description=(dedent(
+            """
+            Craft a new workout Choose-Your-Own-Adventure campaign outline, based on this theme: {theme}.
+            The world needs to be defined, with an initial cast of characters, locations, and existing storylines that the player will drop into.
+            Note: You avoid the word "Aetheria" at ALL COSTS.
+            The first task is to create the outline of this document. A good solid outline will allow us to fill in the sections in a well defined manner.
+            """
+        )),
+        expected_output=OUTLINE_OUTPUT,
+        tools=[search_tool],
+        output_file=str(campaign_dir / "01_outline_init.md"),
+        create_directory=True,
+        callback=lambda output: stage_done("01_outline_init"),
+        # callback=lambda e: edit_callback(doc_path, e),
+        # output_pydantic=DocumentEdits,
+        agent=agents['writer'],
+        # human_input=True
+    )
 
-        with open(campaign_dir / "04_design_doc.md", "a", encoding="utf-8") as dd:
-            dd.writelines([line, result + "\n"])
+    game_master_review = lambda: Task(**review("02_game_master_review", dict(
+        agent=agents['game_master'],
+        description=(dedent(
+            """
+            Given a document provided by a writer, you review it from the point of view of a Game Master. 
+            With the help of the writer, modify the document provided so that it is effective for you to use as the Game Master.
+            We are starting with just the outline.
+            """
+        )) + handoff.get("02_game_master_review", ""),
+        expected_output=OUTLINE_OUTPUT,
+        output_file=str(campaign_dir / "02_game_master_review.md"),
+        create_directory=True,
+        callback=lambda output: stage_done("02_game_master_review"),
+    )))
 
-        if line.startswith("## "):
-            last_2header = line
-            last_3header = ""
-        if line.startswith("### "):
-            last_3header = line
+    editing_task = lambda: Task(**review("03_editor_review", dict(
+        description=dedent(
+            """
+            Review and refine the given document.
+            Check for grammatical accuracy, completeness, coherence, and overall quality.
+            Ensure the content is engaging and aligns with the game's tone and style.
+            """
+        ) + handoff.get("03_editor_review", ""),
+        expected_output="\nEdited and refined versions of given document.\n" + OUTLINE_OUTPUT,
+        agent=agents['editor'],
+        output_file=str(campaign_dir / "03_editor_review.md"),
+        callback=lambda output: stage_done("03_editor_review"),
+    )))
+
+    # Written from the game master's outline, on agents of its own, while the editor reviews that outline
+    first_session = lambda session_agents: Task(
+        description=(dedent(
+            """
+            Given the campaign the player is currently playing, write the first session. The Game Master should set the stage, the initial location and goal, and introduce the characters for the first session.
 
+            Here is the campaign outline:
 
-    
+            {document}
+            """
+        )),
+        expected_output=(
+            'A campaign overview document, listing all the details that a Game Master needs to run stories in the campaign. The document is formatted in markdown.'
+            'The narrator should take the details and write the first narration of the session.'
+            'The Personal Trainer should give the first workout'
+        ),
+        tools=[search_tool],
+        output_file=str(campaign_dir / "first_session.md"),
+        agent=session_agents['writer'],
+        # human_input=True
+    )
 
+    stage_tasks = LazyMapping({
+        "01_outline_init": campaign_task_outline,
+        "02_game_master_review": game_master_review,
+        "03_editor_review": editing_task,
+    })
+
+    def outline_stage():
+        if pipeline.stopping.is_set():
+            raise PipelineStopped("Outline stopped")
+        # Forming the story-focused crew with some enhanced configurations
+        crew = Crew(
+            agents=[agents['writer'], agents['game_master'], agents['narrator'], agents['editor']],
+            tasks=[stage_tasks[stage] for stage in remaining],
+            process=Process.sequential,  # Optional: Sequential task execution is default
+            memory=True,
+            cache=True,
+            manager_agent=agents['manager'],
+            output_log_file=str(campaign_dir / "logs.txt"),
+            step_callback=tracer.step_callback,
+            verbose=True
+        )
+
+        # Rate limits are shared with the filling crews through the model's scheduler, where the outline goes first
+        with request_lane("outline"), tracer.kickoff("outline", tasks=[(stage, stage_tasks[stage].agent.role) for stage in remaining]):
+            result = crew.kickoff(inputs=inputs)
+        # Normally already marked by the task callbacks; this way nothing waits forever on one that didn't fire
+        for stage in remaining:
+            pipeline.mark_done(stage)
+        return result
+
+    def first_session_stage():
+        # Drafted from the game master's outline as written to disk. In REVIEW_MODE=edits the game master's
+        # task output is a DocumentEdits object, not the outline, and the file holds the edits once applied.
+        with open(campaign_dir / "02_game_master_review.md", "r", encoding="utf-8") as fh:
+            document = fh.read()
+        session_agents = build_agents(anthropic_llm, search_tool)
+        crew = Crew(
+            agents=[session_agents['writer'], session_agents['game_master'], session_agents['narrator']],
+            tasks=[first_session(session_agents)],
+            process=Process.sequential,
+            memory=True,
+            cache=True,
+            # Its own log, since the outline crew is still writing logs.txt
+            output_log_file=str(campaign_dir / "first_session_logs.txt"),
+            step_callback=tracer.step_callback,
+            verbose=True
+        )
+        if pipeline.stopping.is_set():
+            raise PipelineStopped("First session stopped")
+        with request_lane("outline"), tracer.kickoff("first_session", tasks=[("first_session", "Writer")]):
+            result = crew.kickoff(inputs={'theme': theme, 'document': document})
+        checkpoint.complete_stage("first_session")
+        return result
+
+    def fill_stage():
+        # Now pull the final markdown and parse it into the section tree the filling stage works through.
+        outline = OutlineTree.load(campaign_dir / "03_editor_review.md")
+
+        # Everything written so far, searchable by the writer; sections are added as they are filled
+        vector_index = get_vector_index(campaign_dir / "vectors.jsonl")
+        for stage in PIPELINE_STAGES:
+            vector_index.add_document(stage, campaign_dir / f"{stage}.md")
+        from crews.tools import CampaignSearchTool
+        writer_tools = [CampaignSearchTool(index_path=str(vector_index.path))]
+
+        # Each worker thread gets its own crew (agents keep per-run executor state);
+        # they all draw on the model's one request budget, in the bulk lane.
+        concurrency = fill_concurrency or int(os.environ.get("FILL_CONCURRENCY", "1"))
+        worker = threading.local()
+
+        # STREAM_SECTIONS=1 writes each section into the design doc as the writer's tokens arrive
+        # (STREAM_STDOUT=1 echoes them too). Only sequential filling streams, since the doc is written in outline order.
+        writer_llm = None
+        if os.environ.get("STREAM_SECTIONS") == "1" and concurrency == 1:
+            echo = os.environ.get("STREAM_STDOUT") == "1"
+
+            def stream_token(token: str):
+                design_doc.write_token(token)
+                if echo:
+                    print(token, end="", flush=True)
+
+            writer_llm = build_chat_model(llm_cache, callbacks=[FinalAnswerStreamer(stream_token), *callbacks], streaming=True, prompt_prefixes=prompt_prefixes)
+
+        def fill_section(section: str, context: str) -> str:
+            # A kickoff can't be interrupted, but a failed or cancelled pipeline starts no more of them
+            if pipeline.stopping.is_set():
+                raise PipelineStopped("Section filling stopped")
+            if not hasattr(worker, "crew"):
+                worker.crew = build_filling_crew(build_agents(anthropic_llm, search_tool, writer_llm=writer_llm, writer_tools=writer_tools), campaign_dir, tracer=tracer)
+            with request_lane("bulk"), tracer.kickoff("fill_section", tasks=[("fill_section", "Writer")], section=section.splitlines()[-1]):
+                return worker.crew.kickoff(inputs={'section': section, 'theme': theme, 'context': context})
+
+        design_doc_path = campaign_dir / "04_design_doc.md"
+        done = len(checkpoint.sections_done)
+        if done:
+            # Drop anything written after the last checkpoint; those sections get filled again
+            with open(design_doc_path, "r+", encoding="utf-8") as fh:
+                fh.truncate(checkpoint.design_doc_bytes)
+            design_doc = DesignDocument.load(design_doc_path, on_flush=checkpoint.complete_sections)
+        else:
+            open(design_doc_path, "w").close()
+            design_doc = DesignDocument(design_doc_path, on_flush=checkpoint.complete_sections)
+
+        # CONTEXT_TOKENS (default 800) is the budget for what each section sees of the ones written before it;
+        # 0 falls back to the last 10 lines of the subtree
+        context_tokens = int(os.environ.get("CONTEXT_TOKENS", "800"))
+        context_builder = ContextBuilder(outline, budget=context_tokens) if context_tokens else None
+        if context_builder is not None and done:
+            context_builder.add_document(design_doc.lines, done)
+
+        # on_filled sees sections in outline order, starting after the ones already done
+        pending = iter(outline.sections[done:])
+
+        def section_filled(line: str, body: str):
+            design_doc.append_section(line, body)
+            section = next(pending)
+            vector_index.add("04_design_doc", section.title, body, key=section.id)
+
+        with design_doc:
+            return fill_sections(
+                outline,
+                fill_section,
+                concurrency=concurrency,
+                on_filled=section_filled,
+                done=done,
+                seed_context=design_doc.context(),
+                on_start=design_doc.start_section if writer_llm is not None else None,
+                context_builder=context_builder,
+            )
+
+    # The stages run as soon as what they need is written: filling waits for the editor's outline,
+    # and with FIRST_SESSION=1 the first session is drafted from the game master's outline alongside the editor.
+    # STAGE_TIMEOUTS ("outline=600,first_session=300,fill=3600") bounds each one, in seconds.
+    timeouts = parse_timeouts(os.environ.get("STAGE_TIMEOUTS"))
+    if remaining:
+        pipeline.add("outline", outline_stage, timeout=timeouts.get("outline"))
+    if os.environ.get("FIRST_SESSION") == "1" and not checkpoint.is_stage_done("first_session"):
+        pipeline.add("first_session", first_session_stage, after=["02_game_master_review"], timeout=timeouts.get("first_session"))
+    pipeline.add("fill", fill_stage, after=["03_editor_review"], timeout=timeouts.get("fill"))
+    pipeline.run_sync()
+
+    if llm_cache is not None:
+        print(f"LLM cache: {llm_cache.stats()}")
+    if isinstance(search_tool, CachingSearchTool):
+        print(f"Search cache: {search_tool.cache.stats()}")
+    if prompt_prefixes is not None:
+        print(f"Prompt cache: {prompt_prefixes.marked} requests sent with a cacheable prefix")
+    if profiler is not None:
+        profiler.save(campaign_dir / "prompt_profile.json")
+        print(profiler.format_report())
+    for agent, totals in tracer.metrics()["agents"].items():
+        print(f"{agent}: {totals}")
+    return tracer
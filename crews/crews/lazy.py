@@ -0,0 +1,57 @@
+import importlib
+import threading
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterator, List
+
+class LazyImport:
+    """
+    Stands in for `from module import name` until first used, so importing a module that needs
+    crewAI or langchain doesn't load them before any work starts. Calls and attribute lookups go
+    to the real object; isinstance checks and subclassing need the real thing.
+    """
+
+    def __init__(self, module: str, name: str):
+        self._module = module
+        self._name = name
+        self._target = None
+        self._lock = threading.Lock()
+
+    def resolve(self) -> Any:
+        if self._target is None:
+            with self._lock:
+                if self._target is None:
+                    self._target = getattr(importlib.import_module(self._module), self._name)
+        return self._target
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        return self.resolve()(*args, **kwargs)
+
+    def __getattr__(self, attr: str) -> Any:
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return getattr(self.resolve(), attr)
+
+    def __repr__(self) -> str:
+        return f"<lazy {self._module}.{self._name}>"
+
+class LazyMapping(Mapping):
+    """A read-only mapping whose values are built by their zero-argument builder the first time they're looked up."""
+
+    def __init__(self, builders: Dict[str, Callable[[], Any]]):
+        self._builders = builders
+        self._built: Dict[str, Any] = {}
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._built:
+            self._built[key] = self._builders[key]()
+        return self._built[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._builders)
+
+    def __len__(self) -> int:
+        return len(self._builders)
+
+    def built(self) -> List[str]:
+        """The keys whose values have been built so far."""
+        return list(self._built)
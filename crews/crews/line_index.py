@@ -0,0 +1,94 @@
+import io
+import os
+import threading
+from array import array
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from crews.outline import HeaderScanner
+
+MARKUP_STARTS = (b"#", b"`", b"~")
+
+class Header(NamedTuple):
+    line_number: int
+    level: int
+    title: str
+
+class LineIndex:
+    """
+    Byte offsets of every line start in a document, plus its markdown headers,
+    so any range of lines can be read with one seek instead of scanning the file.
+    Lines are split on \\n, which matches readlines() for \\n and \\r\\n files.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        stat = os.stat(path)
+        self.signature = (stat.st_mtime_ns, stat.st_size)
+        # offsets[i] is where line i + 1 starts; the last entry is the file size
+        self.offsets = array('q', [0])
+        self.headers: List[Header] = []
+
+        offset = 0
+        scanner = HeaderScanner()
+        with open(path, 'rb') as fh:
+            for line_number, line in enumerate(fh, start=1):
+                offset += len(line)
+                self.offsets.append(offset)
+                # Only lines that could open a header or a fence are decoded
+                if line.lstrip(b" ")[:1] in MARKUP_STARTS:
+                    match = scanner.feed(line.decode('utf-8', errors='replace'))
+                    if match:
+                        self.headers.append(Header(line_number, len(match.group(1)), (match.group(2) or "").strip()))
+
+    @property
+    def line_count(self) -> int:
+        return len(self.offsets) - 1
+
+    def is_current(self) -> bool:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        return (stat.st_mtime_ns, stat.st_size) == self.signature
+
+    def read_lines(self, start_line: int, end_line: int) -> List[str]:
+        """Lines start_line..end_line inclusive (1-based), clamped to the document."""
+        start_line = max(start_line, 1)
+        end_line = min(end_line, self.line_count)
+        if start_line > end_line:
+            return []
+        start, end = self.offsets[start_line - 1], self.offsets[end_line]
+        with open(self.path, 'rb') as fh:
+            fh.seek(start)
+            data = fh.read(end - start)
+        return io.StringIO(data.decode('utf-8'), newline=None).readlines()
+
+    def find_section(self, header: str) -> Optional[Tuple[int, int]]:
+        """
+        The (start, end) lines of the section under `header`, through its subsections.
+        Matches the header title case-insensitively, with or without the leading #s.
+        """
+        wanted = header.strip().lstrip("#").strip().lower()
+        for index, found in enumerate(self.headers):
+            if found.title.lower() != wanted:
+                continue
+            end = self.line_count
+            for following in self.headers[index + 1:]:
+                if following.level <= found.level:
+                    end = following.line_number - 1
+                    break
+            return found.line_number, end
+        return None
+
+_indexes: Dict[str, LineIndex] = {}
+_indexes_lock = threading.Lock()
+
+def get_line_index(path: str) -> LineIndex:
+    """The cached index for `path`, rebuilt when the file's mtime or size changes."""
+    key = os.path.abspath(path)
+    with _indexes_lock:
+        index = _indexes.get(key)
+    if index is None or not index.is_current():
+        index = LineIndex(key)
+        with _indexes_lock:
+            _indexes[key] = index
+    return index
@@ -0,0 +1,142 @@
+import re
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Union
+
+# ATX headers: up to three spaces of indent, 1-6 #s, then a space or the end of the line; closing #s are dropped
+HEADER = re.compile(r"^ {0,3}(#{1,6})(?:[ \t]+(.*?))?(?:[ \t]+#+)?[ \t]*$")
+FENCE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+
+class HeaderScanner:
+    """Feed it a document's lines in order; it tells which are headers, skipping those inside code fences."""
+
+    def __init__(self):
+        self.fence: Optional[str] = None
+
+    def feed(self, line: str) -> Optional[re.Match]:
+        """The HEADER match for `line`, or None if it isn't a header."""
+        fence_match = FENCE.match(line)
+        if self.fence is not None:
+            if fence_match and fence_match.group(1)[0] == self.fence[0] and len(fence_match.group(1)) >= len(self.fence):
+                self.fence = None
+            return None
+        if fence_match:
+            self.fence = fence_match.group(1)
+            return None
+        return HEADER.match(line.rstrip("\r\n"))
+
+class Section(NamedTuple):
+    id: str
+    index: int  # position in outline order
+    level: int
+    title: str
+    line: str  # the header line as written, ending in \n
+    line_number: int
+    parent: Optional[str]
+    children: List[str]
+    depends_on: List[str]
+
+def slugify(title: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", title.lower()).strip("-") or "section"
+
+class OutlineTree:
+    """
+    The headers of a markdown outline as a tree. Section IDs are built from the titles along the
+    parent chain (`title/key-locations/key-location-one`), so they stay the same across reruns of the same outline.
+    Lines inside code fences and lines that aren't headers are skipped.
+
+    A section depends on the section before it in its `## ` subtree, which it is written after
+    (for a first child, that is its parent); sections in different subtrees are independent.
+    """
+
+    def __init__(self, sections: List[Section]):
+        self.sections = sections
+        self.by_id: Dict[str, Section] = {section.id: section for section in sections}
+
+    @classmethod
+    def parse(cls, lines: List[str]) -> "OutlineTree":
+        sections: List[Section] = []
+        stack: List[Section] = []
+        ids = set()
+        scanner = HeaderScanner()
+        previous_in_subtree: Optional[Section] = None
+
+        for line_number, line in enumerate(lines, start=1):
+            match = scanner.feed(line)
+            if not match:
+                continue
+
+            level = len(match.group(1))
+            title = (match.group(2) or "").strip()
+            while stack and stack[-1].level >= level:
+                stack.pop()
+            parent = stack[-1] if stack else None
+
+            base = (parent.id + "/" if parent else "") + slugify(title)
+            section_id = base
+            suffix = 2
+            while section_id in ids:
+                section_id = f"{base}-{suffix}"
+                suffix += 1
+            ids.add(section_id)
+
+            if level <= 2:
+                previous_in_subtree = None
+            depends_on = [previous_in_subtree.id] if previous_in_subtree is not None else []
+
+            section = Section(
+                id=section_id,
+                index=len(sections),
+                level=level,
+                title=title,
+                line=line if line.endswith("\n") else line + "\n",
+                line_number=line_number,
+                parent=parent.id if parent else None,
+                children=[],
+                depends_on=depends_on,
+            )
+            if parent is not None:
+                parent.children.append(section_id)
+            sections.append(section)
+            stack.append(section)
+            previous_in_subtree = section
+        return cls(sections)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "OutlineTree":
+        with open(path, 'r', encoding='utf-8') as fh:
+            return cls.parse(fh.readlines())
+
+    def __len__(self) -> int:
+        return len(self.sections)
+
+    def __iter__(self) -> Iterator[Section]:
+        return iter(self.sections)
+
+    def __getitem__(self, section_id: str) -> Section:
+        return self.by_id[section_id]
+
+    def ancestors(self, section_id: str) -> List[Section]:
+        """The parent chain of a section, outermost first."""
+        chain = []
+        parent = self.by_id[section_id].parent
+        while parent is not None:
+            chain.append(self.by_id[parent])
+            parent = chain[-1].parent
+        return chain[::-1]
+
+    def header_path(self, section_id: str) -> str:
+        """The header lines leading to a section and its own, as the writer is given them. The `# ` title is left out."""
+        chain = [section for section in self.ancestors(section_id) if section.level > 1]
+        return "".join(section.line for section in chain) + self.by_id[section_id].line
+
+    def subtrees(self) -> List[List[Section]]:
+        """
+        Sections grouped so each group can be filled on its own: one group per `## ` (or `# `) subtree,
+        in outline order. Every section's dependencies are earlier in its own group.
+        """
+        groups: List[List[Section]] = []
+        for section in self.sections:
+            if not groups or section.level <= 2:
+                groups.append([])
+            groups[-1].append(section)
+        return groups
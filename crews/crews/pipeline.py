@@ -0,0 +1,111 @@
+import asyncio
+import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional
+
+class StageTimeout(TimeoutError):
+    def __init__(self, stage: str, timeout: float):
+        super().__init__(f"Stage {stage!r} did not finish within {timeout:g}s")
+        self.stage = stage
+        self.timeout = timeout
+
+class PipelineStopped(Exception):
+    """Raised by blocking work that gave up because another stage failed or the pipeline was cancelled."""
+
+class Stage(NamedTuple):
+    name: str
+    work: Callable[[], Any]  # a blocking function, run on a worker thread, or a coroutine function
+    after: List[str]
+    timeout: Optional[float]
+
+def parse_timeouts(text: Optional[str]) -> Dict[str, float]:
+    """Per-stage timeouts from "outline=600,fill=3600"."""
+    timeouts = {}
+    for item in (text or "").split(","):
+        if item.strip():
+            stage, _, seconds = item.partition("=")
+            timeouts[stage.strip()] = float(seconds)
+    return timeouts
+
+class Pipeline:
+    """
+    Runs stages concurrently on an event loop, each starting once the stages it comes `after` are done.
+    Blocking stages (crew kickoffs) run on worker threads, so the loop is free to start whatever else is ready
+    while they wait on the LLM. A stage can also be marked done from inside other work, with mark_done(),
+    as a crew's task callback does for a task partway through the crew.
+
+    If a stage fails or times out, the rest are cancelled and the first error is raised. A thread can't be
+    interrupted, so blocking work should check `stopping` between steps and raise PipelineStopped.
+    The threads belong to the pipeline rather than the loop's default executor, so the error is raised
+    straight away instead of once every thread has returned; any still running finish in the background.
+    """
+
+    def __init__(self, done: Iterable[str] = ()):
+        self.stages: List[Stage] = []
+        self.stopping = threading.Event()
+        self._done = set(done)
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def add(self, name: str, work: Callable[[], Any], after: Iterable[str] = (), timeout: Optional[float] = None):
+        self.stages.append(Stage(name, work, list(after), timeout))
+
+    def is_done(self, stage: str) -> bool:
+        with self._lock:
+            return stage in self._done
+
+    def mark_done(self, stage: str):
+        """Release whatever waits on `stage`. Safe to call from any thread."""
+        with self._lock:
+            self._done.add(stage)
+            waiters = self._waiters.pop(stage, [])
+        for waiter in waiters:
+            waiter.get_loop().call_soon_threadsafe(_resolve, waiter)
+
+    async def wait_for(self, stage: str):
+        with self._lock:
+            if stage in self._done:
+                return
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.setdefault(stage, []).append(waiter)
+        await waiter
+
+    async def _run_stage(self, stage: Stage) -> Any:
+        for dependency in stage.after:
+            await self.wait_for(dependency)
+        if inspect.iscoroutinefunction(stage.work):
+            running = stage.work()
+        else:
+            running = asyncio.get_running_loop().run_in_executor(self._executor, stage.work)
+        try:
+            result = await asyncio.wait_for(running, stage.timeout)
+        except asyncio.TimeoutError:
+            raise StageTimeout(stage.name, stage.timeout) from None
+        self.mark_done(stage.name)
+        return result
+
+    async def run(self) -> Dict[str, Any]:
+        """Run every stage and return their results by name."""
+        self._executor = ThreadPoolExecutor(max_workers=max(len(self.stages), 1), thread_name_prefix="pipeline")
+        tasks = [asyncio.create_task(self._run_stage(stage), name=stage.name) for stage in self.stages]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            self.stopping.set()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Don't wait on a thread that timed out or hasn't seen `stopping` yet
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        self._executor.shutdown()
+        return {stage.name: result for stage, result in zip(self.stages, results)}
+
+    def run_sync(self) -> Dict[str, Any]:
+        return asyncio.run(self.run())
+
+def _resolve(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
@@ -0,0 +1,174 @@
+import json
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from crews.context import count_tokens
+
+def common_prefix_length(first: str, second: str) -> int:
+    limit = min(len(first), len(second))
+    # A binary search over slice comparisons, so prompts of thousands of characters aren't walked one at a time
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if first[low:middle] == second[low:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def common_suffix_length(first: str, second: str, limit: Optional[int] = None) -> int:
+    """Like common_prefix_length from the end, counting at most `limit` characters."""
+    limit = min(len(first), len(second)) if limit is None else limit
+    return common_prefix_length(first[::-1][:limit], second[::-1][:limit])
+
+def prompt_text(messages: List[BaseMessage]) -> str:
+    return "\n".join(message.content if isinstance(message.content, str) else json.dumps(message.content) for message in messages)
+
+class PromptShape:
+    """What the prompts of one task/agent share: the text every one so far started and ended with."""
+
+    def __init__(self, text: str):
+        self.calls = 1
+        self.tokens = count_tokens(text)
+        self.prefix = text
+        self.suffix = text
+
+    def add(self, text: str):
+        self.calls += 1
+        self.tokens += count_tokens(text)
+        prefix = common_prefix_length(self.prefix, text)
+        suffix = common_suffix_length(self.suffix, text, limit=min(len(self.suffix), len(text) - prefix))
+        self.prefix = self.prefix[:prefix]
+        self.suffix = self.suffix[len(self.suffix) - suffix:] if suffix else ""
+
+def span_label(span: Any) -> str:
+    """A PromptProfiler label for a Tracer span: the task and its agent, or the kickoff."""
+    if span is None:
+        return "outside any kickoff"
+    return f"{span.name} ({span.agent})" if span.agent else span.name
+
+class PromptProfiler(BaseCallbackHandler):
+    """
+    Sorts every prompt sent into static and dynamic tokens, per task and agent (or per `label()`).
+    Static is the prefix and suffix every prompt of a task has had so far: the role, backstory, tools and
+    expected output crewAI wraps around the task; dynamic is whatever changed between calls. Only the static
+    prefix can be served from Anthropic's prompt cache. With a single call, all of it counts as static.
+    """
+
+    def __init__(self, label: Optional[Callable[[], str]] = None):
+        self.label = label or (lambda: "prompt")
+        self.shapes: Dict[str, PromptShape] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized: Any, messages: List[List[BaseMessage]], **kwargs: Any) -> None:
+        label = self.label()
+        for prompt in messages:
+            text = prompt_text(prompt)
+            with self._lock:
+                if label in self.shapes:
+                    self.shapes[label].add(text)
+                else:
+                    self.shapes[label] = PromptShape(text)
+
+    def report(self) -> List[dict]:
+        rows = []
+        with self._lock:
+            for label, shape in self.shapes.items():
+                average = shape.tokens / shape.calls
+                prefix = count_tokens(shape.prefix) if shape.prefix else 0
+                suffix = count_tokens(shape.suffix) if shape.suffix and shape.calls > 1 else 0
+                rows.append({
+                    "prompt": label,
+                    "calls": shape.calls,
+                    "average_tokens": round(average),
+                    "static_prefix_tokens": prefix,
+                    "static_suffix_tokens": suffix,
+                    "dynamic_tokens": max(0, round(average) - prefix - suffix),
+                    "static_share": round(min(1.0, (prefix + suffix) / average), 3) if average else 0.0,
+                })
+        return sorted(rows, key=lambda row: row["calls"] * row["average_tokens"], reverse=True)
+
+    def format_report(self) -> str:
+        lines = [f"{'Prompt':<40} {'Calls':>6} {'Avg tokens':>11} {'Static prefix':>14} {'Static suffix':>14} {'Dynamic':>8} {'Static':>7}"]
+        for row in self.report():
+            lines.append(
+                f"{row['prompt'][:40]:<40} {row['calls']:>6} {row['average_tokens']:>11} {row['static_prefix_tokens']:>14} "
+                f"{row['static_suffix_tokens']:>14} {row['dynamic_tokens']:>8} {row['static_share']:>7.0%}"
+            )
+        return "\n".join(lines)
+
+    def save(self, path: Union[str, Path]):
+        with open(path, 'w', encoding='utf-8') as fh:
+            json.dump(self.report(), fh, indent=2)
+
+class StablePrefixes:
+    """
+    Learns the prefix that repeated prompts start with, per prompt family (the opening of the first message),
+    so it can be marked for Anthropic's prompt cache. A family's first prompt is never marked: only from the
+    second on is it known which part stays the same. Prefixes under `min_tokens` aren't cached by the API, so
+    they're left alone.
+    """
+
+    def __init__(self, min_tokens: int = 1024, family_chars: int = 200):
+        self.min_tokens = min_tokens
+        self.family_chars = family_chars
+        self.marked = 0
+        self._prefixes: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def learn(self, text: str) -> str:
+        """The learned prefix `text` starts with, or "" if there isn't one worth caching yet."""
+        family = text[:self.family_chars]
+        with self._lock:
+            known = self._prefixes.get(family)
+            if known is None:
+                self._prefixes[family] = text
+                return ""
+            if not text.startswith(known):
+                # Cut at a line break, so the breakpoint lands in the same place on the next call,
+                # or where the prompts part if they share no line break
+                shared = common_prefix_length(known, text)
+                known = known[:known.rfind("\n", 0, shared) + 1 or shared]
+                self._prefixes[family] = known
+            if count_tokens(known) < self.min_tokens or len(known) == len(text):
+                return ""
+            self.marked += 1
+            return known
+
+    def mark(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+        """
+        `messages` with the first one split after its stable prefix, which is flagged with cache_control.
+        A system message is left alone, since langchain-anthropic only takes one as a string.
+        """
+        if not messages or messages[0].type == "system" or not isinstance(messages[0].content, str):
+            return messages
+        content = messages[0].content
+        prefix = self.learn(content)
+        if not prefix:
+            return messages
+        blocks = [
+            {"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": content[len(prefix):]},
+        ]
+        return [messages[0].copy(update={"content": blocks}), *messages[1:]]
+
+def restore_cache_control(messages: List[BaseMessage], request_messages: List[dict]) -> List[dict]:
+    """
+    Put the cache_control flags StablePrefixes.mark set on `messages` back on the text blocks of the
+    request formatted from them, for formatters that rebuild text blocks from their text alone.
+    """
+    flags = {
+        block["text"]: block["cache_control"]
+        for message in messages if isinstance(message.content, list)
+        for block in message.content if isinstance(block, dict) and "cache_control" in block and "text" in block
+    }
+    for message in request_messages:
+        if not flags:
+            break
+        if isinstance(message["content"], list):
+            for block in message["content"]:
+                if block.get("type") == "text" and block.get("text") in flags:
+                    block["cache_control"] = flags.pop(block["text"])
+    return request_messages
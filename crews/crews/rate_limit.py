@@ -0,0 +1,254 @@
+import contextvars
+import math
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing.managers import BaseManager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from tenacity import RetryCallState
+from crews.context import count_tokens
+
+# Highest priority first: a request only goes out when no request in an earlier lane is waiting
+LANES = ("interactive", "outline", "bulk")
+
+_lane = contextvars.ContextVar("rate_limit_lane", default="interactive")
+
+@contextmanager
+def request_lane(lane: str):
+    """Send the LLM requests made inside this block (on this thread) through `lane`."""
+    if lane not in LANES:
+        raise ValueError(f"Unknown lane {lane!r}, expected one of {LANES}")
+    token = _lane.set(lane)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+def current_lane() -> str:
+    return _lane.get()
+
+class TokenBucket:
+    """Holds up to one minute's worth of `per_minute`, refilled continuously. Taking more than is left runs it into debt."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now: float, scale: float = 1.0):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60 * scale)
+        self.updated = now
+
+    def wait_time(self, amount: float, scale: float = 1.0) -> float:
+        """Seconds until `amount` (capped at the capacity) is available, as of the last refill."""
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing * 60 / (self.capacity * scale))
+
+class RateScheduler:
+    """
+    Request and token budgets for one model, shared by every crew and thread in the process.
+    Requests wait for both buckets, and for every higher-priority lane to drain. A rate-limit error
+    pauses all lanes for a jittered, exponentially growing delay (or the server's retry-after) and
+    halves the refill rate; it recovers a little with every success. A call much slower than usual
+    counts as congestion too and trims the rate.
+    """
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.scale = 1.0
+        self.paused_until = 0.0
+        self.acquired = 0
+        self.rate_limited = 0
+        self._consecutive = 0
+        self._latency: Optional[float] = None
+        self._waiting = dict.fromkeys(LANES, 0)
+        self._cond = threading.Condition()
+
+    def _wait_time(self, lane: str, tokens: float, now: float) -> float:
+        for earlier in LANES[:LANES.index(lane)]:
+            if self._waiting[earlier]:
+                return math.inf
+        wait = self.paused_until - now
+        for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+            if bucket is not None:
+                bucket.refill(now, self.scale)
+                wait = max(wait, bucket.wait_time(amount, self.scale))
+        return wait
+
+    def acquire(self, lane: Optional[str] = None, tokens: float = 0):
+        """Block until one request of about `tokens` tokens may go out in `lane` (default: the current lane)."""
+        lane = lane or current_lane()
+        with self._cond:
+            self._waiting[lane] += 1
+            try:
+                while True:
+                    wait = self._wait_time(lane, tokens, time.monotonic())
+                    if wait <= 0:
+                        break
+                    self._cond.wait(None if wait == math.inf else wait)
+                self.acquired += 1
+                if self.requests is not None:
+                    self.requests.level -= 1
+                if self.tokens is not None:
+                    self.tokens.level -= tokens
+            finally:
+                self._waiting[lane] -= 1
+                self._cond.notify_all()
+
+    def settle(self, estimated: float, actual: float):
+        """Correct the token bucket once a request's real usage is known."""
+        if self.tokens is not None:
+            with self._cond:
+                self.tokens.level -= actual - estimated
+                self._cond.notify_all()
+
+    def success(self, latency: float):
+        with self._cond:
+            self._consecutive = 0
+            if self._latency is not None and latency > 3 * self._latency:
+                self.scale = max(0.1, self.scale * 0.8)
+            else:
+                self.scale = min(1.0, self.scale + 0.05)
+            self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+
+    def backoff(self, retry_after: Optional[float] = None) -> float:
+        """Pause every lane after a rate-limit error. Returns the delay."""
+        with self._cond:
+            self.rate_limited += 1
+            self._consecutive += 1
+            self.scale = max(0.1, self.scale * 0.5)
+            ceiling = min(self.max_delay, self.base_delay * 2 ** (self._consecutive - 1))
+            delay = max(retry_after or 0.0, random.uniform(ceiling / 2, ceiling))
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            self._cond.notify_all()
+        return delay
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"acquired": self.acquired, "rate_limited": self.rate_limited, "scale": self.scale}
+
+class SchedulerManager(BaseManager):
+    """Serves RateSchedulers from a separate process, so a pool of campaign processes can share one budget."""
+
+SchedulerManager.register("RateScheduler", RateScheduler)
+
+def limits_from_env() -> Tuple[Optional[float], Optional[float]]:
+    """(rpm, tpm) from RATE_LIMIT_RPM (default 100) and RATE_LIMIT_TPM (default unlimited); 0 turns either off."""
+    tpm = os.environ.get("RATE_LIMIT_TPM")
+    return float(os.environ.get("RATE_LIMIT_RPM", "100")), float(tpm) if tpm else None
+
+_schedulers: Dict[Optional[str], Any] = {}
+_schedulers_lock = threading.Lock()
+
+def get_scheduler(model: Optional[str], rpm: Optional[float] = None, tpm: Optional[float] = None) -> RateScheduler:
+    """The process-wide scheduler for `model`. Its limits are set by the first call."""
+    with _schedulers_lock:
+        if model not in _schedulers:
+            _schedulers[model] = RateScheduler(rpm=rpm, tpm=tpm)
+        return _schedulers[model]
+
+def set_scheduler(model: Optional[str], scheduler: Any):
+    """Make `scheduler` (say, a SchedulerManager proxy shared with other processes) the one get_scheduler returns for `model`."""
+    with _schedulers_lock:
+        _schedulers[model] = scheduler
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+def retry_after(error: BaseException) -> Optional[float]:
+    response = getattr(error, "response", None)
+    value = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+def retry_state(error: BaseException, attempt: int) -> RetryCallState:
+    """The failed `attempt` (1-based) as the tenacity state callbacks' on_retry expects."""
+    state = RetryCallState(retry_object=None, fn=None, args=(), kwargs={})
+    state.attempt_number = attempt
+    state.set_exception((type(error), error, error.__traceback__))
+    return state
+
+def estimate_tokens(messages: List[BaseMessage]) -> int:
+    return count_tokens("".join(str(message.content) for message in messages))
+
+def result_tokens(result: ChatResult) -> Optional[int]:
+    usage = (result.llm_output or {}).get("usage") or {}
+    if usage:
+        return usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+    metadata = getattr(result.generations[0].message, "usage_metadata", None) if result.generations else None
+    if metadata:
+        return metadata.get("input_tokens", 0) + metadata.get("output_tokens", 0)
+    return None
+
+class RateLimitedChatModel(BaseChatModel):
+    """
+    Sends another chat model's requests through a RateScheduler, retrying rate-limit errors itself.
+    Give the inner model max_retries=0 so its client doesn't retry behind the scheduler's back.
+    Cache and callbacks belong on this wrapper; cache hits never touch the scheduler.
+    With `prompt_prefixes` (a StablePrefixes), the stable start of repeated prompts is marked for the provider's prompt cache.
+    """
+
+    llm: BaseChatModel
+    scheduler: Any
+    max_retries: int = 5
+    prompt_prefixes: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        # The inner model's, so cache keys match the unwrapped model's
+        return self.llm._llm_type
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return self.llm._identifying_params
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        estimate = estimate_tokens(messages)
+        if self.prompt_prefixes is not None:
+            messages = self.prompt_prefixes.mark(messages)
+        for attempt in range(self.max_retries + 1):
+            # The lane is passed explicitly, since the scheduler may live in another process
+            self.scheduler.acquire(lane=current_lane(), tokens=estimate)
+            started = time.monotonic()
+            try:
+                result = self.llm._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception as error:
+                if not is_rate_limit_error(error) or attempt == self.max_retries:
+                    raise
+                self.scheduler.backoff(retry_after(error))
+                if run_manager is not None:
+                    run_manager.on_retry(retry_state(error, attempt + 1))
+                continue
+            self.scheduler.success(time.monotonic() - started)
+            self.scheduler.settle(estimate, result_tokens(result) or estimate)
+            return result
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        # Not retried: chunks may already have reached the caller when a stream fails
+        estimate = estimate_tokens(messages)
+        self.scheduler.acquire(lane=current_lane(), tokens=estimate)
+        if self.prompt_prefixes is not None:
+            messages = self.prompt_prefixes.mark(messages)
+        started = time.monotonic()
+        used = 0
+        completion: List[str] = []
+        for chunk in self.llm._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            metadata = getattr(chunk.message, "usage_metadata", None)
+            if metadata:
+                used += metadata.get("input_tokens", 0) + metadata.get("output_tokens", 0)
+            completion.append(str(chunk.message.content))
+            yield chunk
+        self.scheduler.success(time.monotonic() - started)
+        # Without usage in the chunks, count the streamed text like the prompt was counted
+        self.scheduler.settle(estimate, used or estimate + count_tokens("".join(completion)))
@@ -0,0 +1,155 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Union
+from langchain_core.tools import BaseTool
+
+# Words in any script, keeping the symbols that change a term's meaning (C++, C#) and joining parts like "node.js" or "sci-fi"
+WORD = re.compile(r"[\w+#]+(?:['’.\-][\w+#]+)*")
+FILLER = frozenset("a an and the of in on for to is are what who how about with".split())
+
+def normalize_query(query: str) -> str:
+    """
+    The form queries are cached under: casefolded, with punctuation and filler words dropped, the rest
+    in their original order, so "The Sunken Kingdom?" and "sunken kingdom" share one entry but
+    "dog bites man" and "man bites dog" don't. A query with no words left is kept as typed, only stripped and casefolded.
+    """
+    words = WORD.findall(query.casefold())
+    kept = [word for word in words if word not in FILLER]
+    return " ".join(kept or words) or query.strip().casefold()
+
+class SearchCache:
+    """
+    Web search results kept in SQLite by normalized query, so agents asking the same thing in different
+    tasks, crews and runs make one network call between them. Concurrent lookups of a query that isn't
+    cached yet wait for the first one's search instead of starting their own.
+    """
+
+    def __init__(self, path: Union[str, Path] = ".search_cache.sqlite", ttl: Optional[float] = None):
+        """ttl: seconds a result stays valid, None to keep results forever"""
+        self.path = Path(path)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY, query TEXT NOT NULL, value TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def key(query: str) -> str:
+        return hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+
+    def get(self, query: str) -> Optional[str]:
+        key = self.key(query)
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl is not None and time.time() - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+        return row[0] if row is not None else None
+
+    def put(self, query: str, value: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, query, value, created) VALUES (?, ?, ?, ?)",
+                (self.key(query), query, value, time.time()),
+            )
+            self._conn.commit()
+
+    def search(self, query: str, backend: Callable[[str], str]) -> str:
+        """The cached result for `query`, or `backend(query)`, run once however many threads ask at the same time."""
+        cached = self.get(query)
+        if cached is not None:
+            with self._lock:
+                self.hits += 1
+            return cached
+
+        key = self.key(query)
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            value = backend(query)
+            # Failures aren't cached, and neither are empty results
+            if value:
+                self.put(query, value)
+            future.set_result(value)
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM results")
+            self._conn.commit()
+            self.hits = self.misses = self.coalesced = 0
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced, "entries": self.count()}
+
+_caches: Dict[str, SearchCache] = {}
+_caches_lock = threading.Lock()
+
+def get_search_cache(path: Union[str, Path], ttl: Optional[float] = None) -> SearchCache:
+    """The process-wide cache stored at `path`. Its ttl is set by the first call."""
+    key = os.path.abspath(path)
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = SearchCache(key, ttl=ttl)
+        return _caches[key]
+
+class CachingSearchTool(BaseTool):
+    """Runs another search tool's queries through a SearchCache. Give it the inner tool's name and description."""
+
+    search: Any
+    cache: Any
+
+    def _run(self, query: str, **kwargs: Any) -> str:
+        return self.cache.search(query, self.search.run)
+
+class FakeSearch:
+    """An offline search backend: canned results keyed by query words, or a made-up result for anything else."""
+
+    def __init__(self, results: Optional[Dict[str, str]] = None, latency: float = 0.0):
+        self.results = results or {}
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def run(self, query: str) -> str:
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        for words, result in self.results.items():
+            if normalize_query(words) == normalize_query(query):
+                return result
+        return f"Results for {query}: nothing in particular is known about {query}."
@@ -0,0 +1,45 @@
+from typing import Any, Callable
+from langchain_core.callbacks import BaseCallbackHandler
+
+class FinalAnswerStreamer(BaseCallbackHandler):
+    """
+    Forwards the tokens of an agent's final answer to `sink` as the model emits them.
+    crewAI agents answer in the `Thought: ... Final Answer: ...` format, so everything before
+    the marker (thoughts, tool calls) is held back and dropped.
+    """
+
+    marker = "Final Answer:"
+
+    def __init__(self, sink: Callable[[str], None]):
+        self.sink = sink
+        self._reset()
+
+    def _reset(self):
+        self._buffer = ""
+        self._streaming = False
+        self._leading = True
+
+    def on_llm_start(self, serialized: Any, prompts: Any, **kwargs: Any) -> None:
+        self._reset()
+
+    def on_chat_model_start(self, serialized: Any, messages: Any, **kwargs: Any) -> None:
+        self._reset()
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        if not self._streaming:
+            # Only the new token and a marker's length before it can complete the marker
+            start = max(0, len(self._buffer) - len(self.marker))
+            self._buffer += token
+            index = self._buffer.find(self.marker, start)
+            if index == -1:
+                return
+            self._streaming = True
+            token = self._buffer[index + len(self.marker):]
+            self._buffer = ""
+
+        if self._leading:
+            token = token.lstrip()
+            if not token:
+                return
+            self._leading = False
+        self.sink(token)
@@ -0,0 +1,35 @@
+from typing import Optional
+from crewai_tools import BaseTool
+from crews.edit_journal import get_journal
+from crews.vector_index import get_vector_index
+
+class DocumentFetchTool(BaseTool):
+    name: str = "Document Fetch Tool"
+    description: str = (
+        "Fetches the document that the crew is currently working on. The document has been augmented with line numbers to be used when editing. "
+        "To fetch only part of it, give start_line and end_line (inclusive), or the title of a header to get that section. "
+        "The first line gives the document version; put it in base_version when editing, so edits made while another agent "
+        "changed the document land on the lines you meant."
+    )
+    doc_path: str
+    # The version this tool last handed out, for edits that come back without one
+    last_version: Optional[int] = None
+
+    def _run(self, start_line: Optional[int] = None, end_line: Optional[int] = None, header: Optional[str] = None) -> str:
+        version, text = get_journal(self.doc_path).fetch(start_line=start_line, end_line=end_line, header=header)
+        self.last_version = version
+        return f"Document version: {version}\n{text}"
+
+class CampaignSearchTool(BaseTool):
+    name: str = "Campaign Search Tool"
+    description: str = (
+        "Looks up what has already been written for this campaign (the outlines and the design document) "
+        "and returns the k most relevant passages for a query, such as a character, place or plot point."
+    )
+    index_path: str
+
+    def _run(self, query: str, k: int = 5) -> str:
+        results = get_vector_index(self.index_path).search(query, k=k)
+        if not results:
+            return "Nothing written so far matches that query."
+        return "\n\n".join(f"[{chunk.source}] {chunk.title}\n{chunk.text}" for _, chunk in results)
@@ -0,0 +1,218 @@
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+from langchain_core.callbacks import BaseCallbackHandler
+
+COUNTERS = ("llm_calls", "llm_seconds", "prompt_tokens", "completion_tokens", "tool_calls", "retries", "cache_hits", "errors")
+
+class Span:
+    """One kickoff or task being timed, with the counters the callbacks add to while it runs."""
+
+    def __init__(self, kind: str, name: str, agent: Optional[str] = None, parent: Optional[str] = None, **attrs: Any):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.name = name
+        self.agent = agent
+        self.parent = parent
+        self.attrs = attrs
+        self.start = time.time()
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def record(self, end: float) -> dict:
+        record = {
+            "type": self.kind,
+            "id": self.id,
+            "parent": self.parent,
+            "name": self.name,
+            "agent": self.agent,
+            "start": self.start,
+            "end": end,
+            "seconds": end - self.start,
+            **self.counters,
+        }
+        record.update(self.attrs)
+        return record
+
+class _Kickoff:
+    def __init__(self, span: Span, tasks: List[Tuple[str, str]]):
+        self.span = span
+        self.tasks = tasks
+        self.next_task = 0
+        self.task: Optional[Span] = None
+
+class Tracer:
+    """
+    Times every crew kickoff and the tasks in it, writing one JSON line per finished span to `path`
+    and keeping running totals per kickoff name, task name and agent for metrics().
+
+    Counters come from three hooks: `handler` (a langchain callback for the LLMs: calls, latency, tokens,
+    retries, errors), step_callback (a crewAI step callback: tool calls) and cache_lookup (PersistentLLMCache.on_lookup).
+    Each is credited to whatever span is open on the calling thread, so concurrent fill workers don't mix.
+    Tasks are assumed to run in order, as in a sequential crew: task_done() closes one and opens the next.
+    """
+
+    def __init__(self, path: Optional[Union[str, Path]] = None):
+        self.path = Path(path) if path is not None else None
+        self.records: List[dict] = []
+        self.handler = TraceCallbackHandler(self)
+        self._totals: Dict[str, Dict[str, dict]] = {"kickoffs": {}, "tasks": {}, "agents": {}}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _current(self) -> Optional[Span]:
+        kickoff = getattr(self._local, "kickoff", None)
+        if kickoff is None:
+            return None
+        return kickoff.task or kickoff.span
+
+    def _open_next_task(self, kickoff: _Kickoff):
+        if kickoff.next_task < len(kickoff.tasks):
+            name, agent = kickoff.tasks[kickoff.next_task]
+            kickoff.next_task += 1
+            kickoff.task = Span("task", name, agent=agent, parent=kickoff.span.id)
+        else:
+            kickoff.task = None
+
+    @contextmanager
+    def kickoff(self, name: str, tasks: Optional[List[Tuple[str, str]]] = None, **attrs: Any) -> Iterator[Span]:
+        """
+        Time one crew.kickoff() on this thread. `tasks` are the (task name, agent role) pairs it runs, in order;
+        extra keyword arguments (the section being filled, say) are written into its records.
+        """
+        kickoff = _Kickoff(Span("kickoff", name, **attrs), list(tasks or []))
+        previous = getattr(self._local, "kickoff", None)
+        self._local.kickoff = kickoff
+        self._open_next_task(kickoff)
+        try:
+            yield kickoff.span
+        except BaseException:
+            kickoff.span.counters["errors"] += 1
+            raise
+        finally:
+            while kickoff.task is not None:
+                self._close_task(kickoff)
+            self._finish(kickoff.span)
+            self._local.kickoff = previous
+
+    def task_done(self, output: Any = None):
+        """Close the running task and start timing the next one. Usable directly as a Task callback."""
+        kickoff = getattr(self._local, "kickoff", None)
+        if kickoff is not None and kickoff.task is not None:
+            self._close_task(kickoff)
+
+    def _close_task(self, kickoff: _Kickoff):
+        task = kickoff.task
+        for counter, value in task.counters.items():
+            kickoff.span.counters[counter] += value
+        self._finish(task)
+        self._open_next_task(kickoff)
+
+    def _finish(self, span: Span):
+        record = span.record(time.time())
+        with self._lock:
+            self.records.append(record)
+            groups = [("kickoffs", span.name)] if span.kind == "kickoff" else [("tasks", span.name), ("agents", span.agent)]
+            for group, key in groups:
+                if key is None:
+                    continue
+                totals = self._totals[group].setdefault(key, dict.fromkeys(("count", "seconds") + COUNTERS, 0))
+                totals["count"] += 1
+                totals["seconds"] += record["seconds"]
+                for counter in COUNTERS:
+                    totals[counter] += record[counter]
+            if self.path is not None:
+                with open(self.path, 'a', encoding='utf-8') as fh:
+                    fh.write(json.dumps(record, default=str) + "\n")
+
+    def current_span(self) -> Optional[Span]:
+        """The task (or, between tasks, the kickoff) open on this thread."""
+        return self._current()
+
+    def add(self, counter: str, amount: Union[int, float] = 1):
+        """Add to a counter of the span open on this thread, if any."""
+        span = self._current()
+        if span is not None:
+            span.counters[counter] += amount
+
+    def step_callback(self, step: Any):
+        """A crewAI step callback: agent steps that used a tool arrive as (AgentAction, observation) pairs."""
+        steps = step if isinstance(step, list) else [step]
+        self.add("tool_calls", sum(1 for item in steps if isinstance(item, tuple)))
+
+    def cache_lookup(self, hit: bool):
+        """For PersistentLLMCache.on_lookup: a hit is counted, and its replayed token usage is not."""
+        self._local.cache_hit = hit
+        if hit:
+            self.add("cache_hits")
+
+    def metrics(self) -> Dict[str, Dict[str, dict]]:
+        """Totals so far per kickoff name, task name and agent role: count, seconds and every counter."""
+        with self._lock:
+            return {group: {key: dict(totals) for key, totals in by_key.items()} for group, by_key in self._totals.items()}
+
+    def slowest(self, count: int = 5, kind: str = "kickoff", key: str = "seconds") -> List[dict]:
+        """The `count` finished spans of `kind` with the most `key` (seconds, prompt_tokens, ...)."""
+        with self._lock:
+            records = [record for record in self.records if record["type"] == kind]
+        return sorted(records, key=lambda record: record[key], reverse=True)[:count]
+
+class TraceCallbackHandler(BaseCallbackHandler):
+    """Feeds LLM calls, token usage, retries and errors into a Tracer."""
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+        self._started: Dict[Any, float] = {}
+
+    def _start(self, run_id: Any):
+        self.tracer._local.cache_hit = False
+        self._started[run_id] = time.perf_counter()
+        self.tracer.add("llm_calls")
+
+    def on_llm_start(self, serialized: Any, prompts: Any, *, run_id: Any = None, **kwargs: Any) -> None:
+        self._start(run_id)
+
+    def on_chat_model_start(self, serialized: Any, messages: Any, *, run_id: Any = None, **kwargs: Any) -> None:
+        self._start(run_id)
+
+    def on_llm_end(self, response: Any, *, run_id: Any = None, **kwargs: Any) -> None:
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            self.tracer.add("llm_seconds", time.perf_counter() - started)
+        if getattr(self.tracer._local, "cache_hit", False):
+            return
+        prompt_tokens, completion_tokens = usage(response)
+        self.tracer.add("prompt_tokens", prompt_tokens)
+        self.tracer.add("completion_tokens", completion_tokens)
+
+    def on_llm_error(self, error: BaseException, *, run_id: Any = None, **kwargs: Any) -> None:
+        self._started.pop(run_id, None)
+        self.tracer.add("errors")
+
+    def on_retry(self, retry_state: Any, **kwargs: Any) -> None:
+        self.tracer.add("retries")
+
+    def on_tool_error(self, error: BaseException, **kwargs: Any) -> None:
+        self.tracer.add("errors")
+
+def usage(response: Any) -> Tuple[int, int]:
+    """(prompt, completion) tokens of an LLMResult, from the messages' usage_metadata or the provider's llm_output."""
+    prompt_tokens = completion_tokens = 0
+    found = False
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if metadata:
+                found = True
+                prompt_tokens += metadata.get("input_tokens", 0)
+                completion_tokens += metadata.get("output_tokens", 0)
+    if not found:
+        # Anthropic reports input_tokens/output_tokens, OpenAI-style models prompt_tokens/completion_tokens
+        llm_output = response.llm_output or {}
+        reported = llm_output.get("usage") or llm_output.get("token_usage") or {}
+        prompt_tokens = reported.get("input_tokens", reported.get("prompt_tokens", 0))
+        completion_tokens = reported.get("output_tokens", reported.get("completion_tokens", 0))
+    return prompt_tokens, completion_tokens
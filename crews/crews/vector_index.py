@@ -0,0 +1,216 @@
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import zlib
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+from crews.outline import HEADER
+
+TOKEN = re.compile(r"[a-z0-9][a-z0-9'-]*")
+DIMENSIONS = 2 ** 20
+
+def hash_features(text: str, dimensions: int = DIMENSIONS) -> Dict[int, float]:
+    """
+    A unit-length sparse vector for `text`: words and word pairs hashed into `dimensions` buckets
+    with a hash-derived sign, weighted by 1 + log(count). crc32 keeps it stable across processes.
+    """
+    words = TOKEN.findall(text.lower())
+    counts = Counter(words)
+    counts.update(f"{first} {second}" for first, second in zip(words, words[1:]))
+    vector: Dict[int, float] = defaultdict(float)
+    for token, count in counts.items():
+        hashed = zlib.crc32(token.encode('utf-8'))
+        sign = 1.0 if hashed & 0x80000000 else -1.0
+        vector[hashed % dimensions] += sign * (1 + math.log(count))
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    return {feature: weight / norm for feature, weight in vector.items() if weight} if norm else {}
+
+class Chunk(NamedTuple):
+    id: str
+    source: str
+    title: str
+    text: str
+
+class VectorIndex:
+    """
+    A retrieval index over campaign text, kept on disk as JSON lines (one chunk per line, appended as
+    sections are written) and in memory as an inverted index from hashed feature to chunks.
+    A lookup only visits the chunks that share a feature with the query, so it stays fast without numpy
+    or an embedding model. Adding a chunk with an existing id replaces it: its old postings are dropped,
+    and the file is rewritten with only the live chunks once replaced and deleted records outnumber them.
+    """
+
+    def __init__(self, path: Union[str, Path], chunk_chars: int = 1200):
+        self.path = Path(path)
+        self.chunk_chars = chunk_chars
+        # Chunks by position; a deleted chunk's position is reused by the next new one
+        self._chunks: List[Optional[Chunk]] = []
+        self._digests: List[str] = []
+        self._features: List[List[int]] = []
+        self._free: List[int] = []
+        self._by_id: Dict[str, int] = {}
+        # (source, key) -> how many chunks the section was last split into
+        self._section_chunks: Dict[Tuple[str, str], int] = {}
+        self._postings: Dict[int, Dict[int, float]] = defaultdict(dict)
+        # Lines in the file, live or not
+        self._records = 0
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as fh:
+                for line in fh:
+                    record = json.loads(line)
+                    self._records += 1
+                    if record.get("deleted"):
+                        self._delete(record["id"])
+                    else:
+                        self._insert(Chunk(record["id"], record["source"], record["title"], record["text"]))
+            self._compact_if_needed()
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "chunks": len(self._by_id),
+                "slots": len(self._chunks),
+                "postings": sum(len(postings) for postings in self._postings.values()),
+                "records": self._records,
+            }
+
+    def _unpost(self, position: int):
+        for feature in self._features[position]:
+            postings = self._postings[feature]
+            del postings[position]
+            if not postings:
+                del self._postings[feature]
+
+    def _insert(self, chunk: Chunk) -> bool:
+        digest = hashlib.sha256(f"{chunk.source}\0{chunk.title}\0{chunk.text}".encode('utf-8')).hexdigest()
+        position = self._by_id.get(chunk.id)
+        if position is not None:
+            if self._digests[position] == digest:
+                return False
+            self._unpost(position)
+        elif self._free:
+            position = self._free.pop()
+        else:
+            position = len(self._chunks)
+            self._chunks.append(None)
+            self._digests.append("")
+            self._features.append([])
+        features = hash_features(chunk.title + "\n" + chunk.text)
+        self._chunks[position] = chunk
+        self._digests[position] = digest
+        self._features[position] = list(features)
+        self._by_id[chunk.id] = position
+        prefix, number = chunk.id.rsplit("#", 1)
+        section = (chunk.source, prefix[len(chunk.source) + 1:])
+        self._section_chunks[section] = max(self._section_chunks.get(section, 0), int(number) + 1)
+        for feature, weight in features.items():
+            self._postings[feature][position] = weight
+        return True
+
+    def _delete(self, chunk_id: str):
+        position = self._by_id.pop(chunk_id, None)
+        if position is not None:
+            self._unpost(position)
+            self._chunks[position] = None
+            self._digests[position] = ""
+            self._features[position] = []
+            self._free.append(position)
+
+    def _compact_if_needed(self):
+        """Rewrite the file with only the live chunks once most of its records are replaced or deleted ones."""
+        if self._records <= 2 * len(self._by_id) + 16:
+            return
+        live = [self._chunks[position] for position in sorted(self._by_id.values())]
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            for chunk in live:
+                fh.write(json.dumps(chunk._asdict()) + "\n")
+        os.replace(tmp_path, self.path)
+        self._records = len(live)
+
+    def _split(self, text: str) -> List[str]:
+        """Paragraph-aligned pieces of about chunk_chars each."""
+        pieces: List[str] = []
+        for paragraph in re.split(r"\n\s*\n", text.strip()):
+            if pieces and len(pieces[-1]) + len(paragraph) < self.chunk_chars:
+                pieces[-1] += "\n\n" + paragraph
+            else:
+                pieces.append(paragraph)
+        return pieces or [""]
+
+    def add(self, source: str, title: str, text: str, key: Optional[str] = None) -> int:
+        """
+        Index one section's text under `title`, replacing what was indexed before under the same `key`
+        (default: the title; pass an outline section ID when titles repeat). Returns how many chunks were new or changed.
+        """
+        key = key or title
+        chunks = [Chunk(f"{source}#{key}#{number}", source, title, piece) for number, piece in enumerate(self._split(text))]
+        with self._lock:
+            added = [chunk for chunk in chunks if self._insert(chunk)]
+            # A rewritten section that came out shorter leaves chunks to drop
+            stale = [f"{source}#{key}#{number}" for number in range(len(chunks), self._section_chunks.get((source, key), 0))]
+            self._section_chunks[(source, key)] = len(chunks)
+            for chunk_id in stale:
+                self._delete(chunk_id)
+            if added or stale:
+                os.makedirs(self.path.parent, exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as fh:
+                    for chunk in added:
+                        fh.write(json.dumps(chunk._asdict()) + "\n")
+                    for chunk_id in stale:
+                        fh.write(json.dumps({"id": chunk_id, "deleted": True}) + "\n")
+                self._records += len(added) + len(stale)
+                self._compact_if_needed()
+        return len(added)
+
+    def add_document(self, source: str, path: Union[str, Path]) -> int:
+        """Index a markdown file section by section, each under its header's title (an outline indexes its headers)."""
+        sections: List[Tuple[str, List[str]]] = [("", [])]
+        with open(path, 'r', encoding='utf-8') as fh:
+            for line in fh:
+                match = HEADER.match(line.rstrip("\r\n"))
+                if match:
+                    sections.append(((match.group(2) or "").strip(), [line]))
+                else:
+                    sections[-1][1].append(line)
+        added = 0
+        seen: Counter = Counter()
+        for title, lines in sections:
+            seen[title] += 1
+            if "".join(lines).strip():
+                added += self.add(source, title, "".join(lines), key=title if seen[title] == 1 else f"{title}#{seen[title]}")
+        return added
+
+    def search(self, query: str, k: int = 5, source: Optional[str] = None) -> List[Tuple[float, Chunk]]:
+        """The `k` chunks most similar to `query` (cosine), best first, optionally from one source only."""
+        scores: Dict[int, float] = defaultdict(float)
+        with self._lock:
+            for feature, weight in hash_features(query).items():
+                for position, chunk_weight in self._postings.get(feature, {}).items():
+                    scores[position] += weight * chunk_weight
+            results = []
+            for position, score in scores.items():
+                chunk = self._chunks[position]
+                if score > 0 and (source is None or chunk.source == source):
+                    results.append((score, chunk))
+        results.sort(key=lambda result: result[0], reverse=True)
+        return results[:k]
+
+_indexes: Dict[str, VectorIndex] = {}
+_indexes_lock = threading.Lock()
+
+def get_vector_index(path: Union[str, Path]) -> VectorIndex:
+    """The process-wide index stored at `path`."""
+    key = os.path.abspath(path)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = VectorIndex(key)
+        return _indexes[key]
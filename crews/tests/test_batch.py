@@ -0,0 +1,52 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from crews.batch import CampaignResult, read_themes, run_batch
+from crews.rate_limit import get_scheduler
+
+def fake_runner(theme, campaign_dir, fill_concurrency=None):
+    if theme == "Broken":
+        raise RuntimeError("worker crashed")
+    os.makedirs(campaign_dir)
+    scheduler = get_scheduler(os.environ.get("CLAUDE_MODEL"))
+    for _ in range(3):
+        scheduler.acquire(lane="bulk", tokens=10)
+    return CampaignResult(theme=theme, campaign_dir=campaign_dir, status="done", sections=fill_concurrency or 0, llm_calls=3)
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_read_themes(self):
+        path = os.path.join(self.tmp_dir.name, "themes.txt")
+        with open(path, 'w', encoding='utf-8') as fh:
+            fh.write("Sunken Kingdom\n\n# skipped\n  Clockwork City  \n")
+        self.assertEqual(read_themes(path), ["Sunken Kingdom", "Clockwork City"])
+
+    def test_run_batch(self):
+        output = os.path.join(self.tmp_dir.name, "batch")
+        with mock.patch.dict(os.environ, {"RATE_LIMIT_RPM": "6000"}):
+            results = run_batch(["Sunken Kingdom", "Broken", "Clockwork City"], output, workers=2, fill_concurrency=4, runner=fake_runner)
+
+        self.assertEqual([result.status for result in results], ["done", "failed", "done"])
+        self.assertEqual(results[0].campaign_dir, os.path.join(output, "001_sunken-kingdom"))
+        self.assertTrue(os.path.isdir(os.path.join(output, "003_clockwork-city")))
+        self.assertIn("worker crashed", results[1].error)
+        self.assertEqual(results[2].sections, 4)
+
+        with open(os.path.join(output, "summary.json"), 'r', encoding='utf-8') as fh:
+            summary = json.load(fh)
+        # Both worker processes drew on the one shared scheduler
+        self.assertEqual(summary["rate_limit"]["acquired"], 6)
+        self.assertEqual(len(summary["campaigns"]), 3)
+        with open(os.path.join(output, "summary.md"), 'r', encoding='utf-8') as fh:
+            self.assertIn("2 of 3 campaigns done", fh.read())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+from crews.checkpoint import CampaignCheckpoint, latest_campaign_dir
+from crews.design_doc import DesignDocument
+
+class TestCampaignCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.campaign_dir = self.tmp_dir.name
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_round_trip(self):
+        checkpoint = CampaignCheckpoint.create(self.campaign_dir, "Time-Travel Conundrum")
+        checkpoint.complete_stage("01_outline_init")
+        checkpoint.complete_sections(["# Title\n"], 42)
+
+        loaded = CampaignCheckpoint.load(self.campaign_dir)
+        self.assertEqual(loaded.theme, "Time-Travel Conundrum")
+        self.assertEqual(loaded.stages_done, ["01_outline_init"])
+        self.assertEqual(loaded.sections_done, ["# Title\n"])
+        self.assertEqual(loaded.design_doc_bytes, 42)
+
+    def test_remaining_stages(self):
+        checkpoint = CampaignCheckpoint.create(self.campaign_dir, "theme")
+        self.assertEqual(checkpoint.remaining_stages(), ["01_outline_init", "02_game_master_review", "03_editor_review"])
+        checkpoint.complete_stage("01_outline_init")
+        checkpoint.complete_stage("02_game_master_review")
+        checkpoint.complete_stage("02_game_master_review")
+        self.assertEqual(checkpoint.remaining_stages(), ["03_editor_review"])
+        self.assertEqual(checkpoint.stages_done, ["01_outline_init", "02_game_master_review"])
+
+    def test_design_doc_flush_checkpoints_sections(self):
+        checkpoint = CampaignCheckpoint.create(self.campaign_dir, "theme")
+        path = os.path.join(self.campaign_dir, "04_design_doc.md")
+        doc = DesignDocument(path, flush_every=2, on_flush=checkpoint.complete_sections)
+        doc.append_section("## One\n", "First")
+        self.assertEqual(CampaignCheckpoint.load(self.campaign_dir).sections_done, [])
+        doc.append_section("## Two\n", "Second")
+        doc.append_section("## Three\n", "Third")
+
+        loaded = CampaignCheckpoint.load(self.campaign_dir)
+        self.assertEqual(loaded.sections_done, ["## One\n", "## Two\n"])
+        self.assertEqual(loaded.design_doc_bytes, os.path.getsize(path))
+
+    def test_latest_campaign_dir(self):
+        for name in ("campaign_100", "campaign_20", "campaign_notes", "campaign_1_old"):
+            os.makedirs(os.path.join(self.campaign_dir, name))
+        with open(os.path.join(self.campaign_dir, "campaign_300"), 'w') as fh:
+            fh.write("not a directory")
+        self.assertEqual(latest_campaign_dir(self.campaign_dir).name, "campaign_100")
+
+    def test_no_campaign_dir(self):
+        os.makedirs(os.path.join(self.campaign_dir, "campaign_notes"))
+        with self.assertRaises(FileNotFoundError):
+            latest_campaign_dir(self.campaign_dir)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+from crews.checkpoint import CampaignCheckpoint
+from crews.cli import ImportTime, apply_edits, campaign_status, format_import_report, main, parse_importtime
+from crews.lazy import LazyImport, LazyMapping
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class TestCli(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.campaign_dir = os.path.join(self.tmp_dir.name, "campaign_100")
+        os.makedirs(self.campaign_dir)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_parse_importtime(self):
+        imports, other = parse_importtime([
+            "import time: self [us] | cumulative | imported package",
+            "import time:       120 |        120 |   encodings.aliases",
+            "import time:       300 |        420 | encodings",
+            "Campaign: campaign_100",
+            "import time:        50 |         50 | crews",
+        ])
+        self.assertEqual(imports, [
+            ImportTime("encodings.aliases", 1, 120, 120),
+            ImportTime("encodings", 0, 300, 420),
+            ImportTime("crews", 0, 50, 50),
+        ])
+        self.assertEqual(other, ["Campaign: campaign_100"])
+
+        report = format_import_report(imports)
+        self.assertIn("encodings", report.splitlines()[2])
+
+    def test_campaign_status(self):
+        checkpoint = CampaignCheckpoint.create(self.campaign_dir, "Sunken Kingdom")
+        self.assertEqual(campaign_status(self.campaign_dir)["next"], "01_outline_init")
+
+        for stage in ("01_outline_init", "02_game_master_review", "03_editor_review"):
+            checkpoint.complete_stage(stage)
+        checkpoint.complete_sections(["# Title\n"], 8)
+        with open(os.path.join(self.campaign_dir, "03_editor_review.md"), 'w', encoding='utf-8') as fh:
+            fh.write("# Title\n## Places\n### Harbor\n")
+        with open(os.path.join(self.campaign_dir, "trace.jsonl"), 'w', encoding='utf-8') as fh:
+            fh.write(json.dumps({"type": "kickoff", "llm_calls": 2, "prompt_tokens": 40, "completion_tokens": 10}) + "\n")
+            fh.write(json.dumps({"type": "task", "llm_calls": 2, "prompt_tokens": 40, "completion_tokens": 10}) + "\n")
+
+        status = campaign_status(self.campaign_dir)
+        self.assertEqual(status["sections_done"], 1)
+        self.assertEqual(status["sections"], 3)
+        self.assertEqual(status["next"], "## Places")
+        self.assertEqual(status["llm_calls"], 2)
+        self.assertEqual(status["prompt_tokens"], 40)
+
+    def test_apply_edits(self):
+        doc = os.path.join(self.tmp_dir.name, "doc.md")
+        edits = os.path.join(self.tmp_dir.name, "edits.json")
+        with open(doc, 'w', encoding='utf-8') as fh:
+            fh.write("one\ntwo\n")
+        with open(edits, 'w', encoding='utf-8') as fh:
+            json.dump({"edits": [{"edit_type": "edit", "line_number": 1, "new_line": "ONE"}]}, fh)
+
+        with self.assertRaises(ValueError):
+            apply_edits(doc, edits)
+        self.assertEqual(apply_edits(doc, edits, base_version=0), 1)
+        with open(doc, 'r', encoding='utf-8') as fh:
+            self.assertEqual(fh.read(), "ONE\ntwo\n")
+
+    def test_status_does_not_load_crewai(self):
+        CampaignCheckpoint.create(self.campaign_dir, "Sunken Kingdom")
+        script = (
+            "import sys; from crews.cli import main; main(['status', sys.argv[1]]); "
+            "print(sorted(m for m in ('crewai', 'crewai_tools', 'langchain_core', 'langchain_anthropic') if m in sys.modules))"
+        )
+        result = subprocess.run([sys.executable, "-c", script, self.campaign_dir], capture_output=True, text=True, cwd=PACKAGE_DIR)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("Theme:    Sunken Kingdom", result.stdout)
+        self.assertEqual(result.stdout.splitlines()[-1], "[]")
+
+    def test_profile_startup_only_before_the_command(self):
+        with mock.patch("crews.cli.profile_startup", return_value=0) as profile:
+            with self.assertRaises(SystemExit):
+                main(["--profile-startup", "status", self.campaign_dir])
+            profile.assert_called_once_with(["status", self.campaign_dir])
+        with mock.patch("crews.batch.main") as batch_main:
+            main(["batch", "--profile-startup", "Sunken Kingdom"])
+            batch_main.assert_called_once_with(["--profile-startup", "Sunken Kingdom"])
+
+    @unittest.skipUnless(importlib.util.find_spec("dotenv"), "crews.index needs python-dotenv")
+    def test_index_does_not_load_langchain(self):
+        script = "import sys, crews.index; print('langchain_core' in sys.modules, 'crewai' in sys.modules)"
+        result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, cwd=PACKAGE_DIR)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.split(), ["False", "False"])
+
+class TestLazy(unittest.TestCase):
+
+    def test_lazy_import(self):
+        dumps = LazyImport("json", "dumps")
+        self.assertEqual(dumps([1]), "[1]")
+        self.assertIs(LazyImport("json", "JSONDecoder").resolve(), json.JSONDecoder)
+
+    def test_lazy_mapping(self):
+        built = []
+        agents = LazyMapping({"writer": lambda: built.append("writer") or "w", "editor": lambda: built.append("editor") or "e"})
+        self.assertEqual(list(agents), ["writer", "editor"])
+        self.assertEqual(built, [])
+        self.assertEqual(agents["writer"], "w")
+        self.assertEqual(agents["writer"], "w")
+        self.assertEqual(built, ["writer"])
+        self.assertEqual(agents.built(), ["writer"])
+
+if __name__ == '__main__':
+    unittest.main()
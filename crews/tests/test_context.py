@@ -0,0 +1,102 @@
+import unittest
+from crews.context import ContextBuilder, count_tokens, summarize
+from crews.filling import fill_sections
+from crews.outline import OutlineTree
+
+OUTLINE = [
+    "# Title\n",
+    "## Characters\n",
+    "### Doctor Vex\n",
+    "### Captain Mira\n",
+    "## Locations\n",
+    "### The Clock Tower\n",
+    "### The Harbor\n",
+    "## Plot\n",
+    "### Vex Returns to the Clock Tower\n",
+]
+
+BODIES = {
+    "title/characters": "The people of the campaign.",
+    "title/characters/doctor-vex": "Doctor Vex is a rogue chronomancer. She hides in the clock tower and bends time to her will. Nobody trusts her.",
+    "title/characters/captain-mira": "Captain Mira sails the harbor. She is loyal to the crown.",
+    "title/locations": "Places the player will visit.",
+    "title/locations/the-clock-tower": "The clock tower looms over the city. Its gears never stop.",
+    "title/locations/the-harbor": "The harbor is busy with ships from every era.",
+    "title/plot": "What happens.",
+}
+
+class TestContextBuilder(unittest.TestCase):
+
+    def setUp(self):
+        self.tree = OutlineTree.parse(OUTLINE)
+        self.builder = ContextBuilder(self.tree, budget=200)
+        for section_id, body in BODIES.items():
+            self.builder.add(section_id, body)
+
+    def test_summarize(self):
+        text = "First sentence here. Second sentence is a bit longer. Third."
+        self.assertEqual(summarize(text, count_tokens("First sentence here.")), "First sentence here.")
+        self.assertEqual(summarize("word " * 100, 5), "word word word word")
+
+    def test_relevant_sections_are_chosen(self):
+        context = self.builder.build("title/plot/vex-returns-to-the-clock-tower")
+        self.assertIn("### Doctor Vex\n", context)
+        self.assertIn("### The Clock Tower\n", context)
+        self.assertIn("## Plot\nWhat happens.", context)
+        self.assertNotIn("Captain Mira", context)
+        # Outline order, whatever the ranking
+        self.assertLess(context.index("Doctor Vex"), context.index("The Clock Tower"))
+
+    def test_close_sections_in_full_others_summarized(self):
+        context = ContextBuilder(self.tree, budget=200, summary_tokens=12)
+        for section_id, body in BODIES.items():
+            context.add(section_id, body)
+        text = context.build("title/characters/captain-mira")
+        self.assertIn(BODIES["title/characters/doctor-vex"], text)
+        text = context.build("title/plot/vex-returns-to-the-clock-tower")
+        self.assertIn("Doctor Vex is a rogue chronomancer.", text)
+        self.assertNotIn("Nobody trusts her.", text)
+
+    def test_budget_is_respected(self):
+        builder = ContextBuilder(self.tree, budget=30)
+        for section_id, body in BODIES.items():
+            builder.add(section_id, body)
+        context = builder.build("title/plot/vex-returns-to-the-clock-tower")
+        self.assertLessEqual(count_tokens(context), 32)
+        self.assertTrue(context)
+
+    def test_scope(self):
+        context = self.builder.build("title/plot/vex-returns-to-the-clock-tower", scope={"title/plot"})
+        self.assertEqual(context, "## Plot\nWhat happens.\n")
+
+    def test_add_document(self):
+        builder = ContextBuilder(self.tree)
+        lines = ["# Title\n", "Intro\n", "## Characters\n", "The people.\n", "### Header the writer added\n", "More.\n", "### Doctor Vex\n", "Vex.\n"]
+        builder.add_document(lines, 3)
+        self.assertEqual(len(builder), 3)
+        # The header the writer added stays part of the section's body
+        self.assertEqual(
+            builder.build("title/characters/doctor-vex", scope={"title/characters"}),
+            "## Characters\nThe people.\n### Header the writer added\nMore.\n",
+        )
+
+    def test_fill_sections_uses_builder(self):
+        lines = {section.line: section.id for section in self.tree}
+        contexts = {}
+        def fill(section, context):
+            contexts[section.splitlines()[-1]] = context
+            return BODIES.get(lines[section.splitlines(True)[-1]], "Body.")
+        fill_sections(self.tree, fill, context_builder=ContextBuilder(self.tree))
+        self.assertIn("Doctor Vex is a rogue chronomancer", contexts["### Vex Returns to the Clock Tower"])
+
+    def test_concurrent_fill_only_sees_own_subtree(self):
+        contexts = {}
+        def fill(section, context):
+            contexts[section.splitlines()[-1]] = context
+            return "Vex and the clock tower."
+        fill_sections(self.tree, fill, concurrency=3, context_builder=ContextBuilder(self.tree))
+        self.assertNotIn("## Characters", contexts["### Vex Returns to the Clock Tower"])
+        self.assertIn("## Plot", contexts["### Vex Returns to the Clock Tower"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+from crews.design_doc import ContextWindow, DesignDocument
+
+class TestDesignDocument(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "04_design_doc.md")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def read(self):
+        with open(self.path, 'r', encoding='utf-8') as file:
+            return file.read()
+
+    def test_flushes_in_batches(self):
+        doc = DesignDocument(self.path, flush_every=2)
+        doc.append_section("## One\n", "First body")
+        self.assertFalse(os.path.exists(self.path))
+        doc.append_section("## Two\n", "Second body")
+        self.assertEqual(self.read(), "## One\nFirst body\n## Two\nSecond body\n")
+
+    def test_flushes_on_exit(self):
+        with DesignDocument(self.path, flush_every=100) as doc:
+            doc.append_section("## One\n", "First body\nmore")
+        self.assertEqual(self.read(), "## One\nFirst body\nmore\n")
+        self.assertEqual(doc.lines, ["## One\n", "First body\n", "more\n"])
+
+    def test_context_matches_tail_of_file(self):
+        doc = DesignDocument(self.path, context_lines=3, flush_every=1)
+        for i in range(5):
+            doc.append_section(f"## Header {i}\n", f"Body {i}")
+        with open(self.path, 'r', encoding='utf-8') as file:
+            expected = "\n".join(file.readlines()[-3:])
+        self.assertEqual(doc.context(), expected)
+
+    def test_streamed_section_is_replaced_by_final_body(self):
+        doc = DesignDocument(self.path, flush_every=100)
+        doc.append_section("## One\n", "First body")
+        doc.start_section("## Two\n")
+        self.assertEqual(self.read(), "## One\nFirst body\n## Two\n")
+        doc.write_token("Second")
+        doc.write_token(" bo")
+        self.assertEqual(self.read(), "## One\nFirst body\n## Two\nSecond bo")
+        doc.append_section("## Two\n", "Second body")
+        self.assertEqual(self.read(), "## One\nFirst body\n## Two\nSecond body\n")
+
+    def test_unfinished_stream_is_dropped_on_exit(self):
+        with DesignDocument(self.path, flush_every=1) as doc:
+            doc.append_section("## One\n", "First body")
+            doc.start_section("## Two\n")
+            doc.write_token("partial")
+        self.assertEqual(self.read(), "## One\nFirst body\n")
+
+    def test_context_window_is_bounded(self):
+        window = ContextWindow(2)
+        window.push("a\nb\nc\n")
+        self.assertEqual(window.text(), "b\n\nc\n")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,10 @@
+import random
 import unittest
 import tempfile
 import os
+import tracemalloc
 from typing import List, Optional, Tuple
-from crews.document_edits import DocumentEdits, DocumentLineEdit, DocumentLinesAdd, DocumentLinesDelete, edit_document
+from crews.document_edits import OP_ADD, OP_APPEND, OP_DELETE, OP_EDIT, DocumentEdits, DocumentLineEdit, DocumentLinesAdd, DocumentLinesDelete, apply_document_edits, compact_edits, diff_document_edits, edit_document, edit_document_batched, edit_document_streaming, parse_compact_edits, parse_document_edits, parse_edit_batch, sort_document_edits
 from pydantic import BaseModel, Field
 
 # Assuming the classes and edit_document function are in a module named document_editor
@@ -80,5 +82,244 @@ class TestEditDocument(unittest.TestCase):
         with self.assertRaises(IndexError):
             edit_document(self.test_file.name, edits)
 
+class TestApplyDocumentEdits(unittest.TestCase):
+
+    lines = ["Line 1\n", "Line 2\n", "Line 3\n", "Line 4\n", "Line 5\n"]
+
+    def test_matches_edit_document(self):
+        edits = DocumentEdits(edits=[
+            DocumentLineEdit(line_number=5, new_line="Edited Line 5"),
+            DocumentLinesDelete(line_numbers=(1, 2)),
+            DocumentLinesAdd(line_number=None, new_line="New Line at End"),
+            DocumentLinesAdd(line_number=3, new_line="Inserted Line"),
+        ])
+        with tempfile.NamedTemporaryFile("w", delete=False) as file:
+            file.writelines(self.lines)
+        try:
+            edit_document(file.name, edits)
+            with open(file.name, 'r') as file:
+                expected = file.readlines()
+        finally:
+            os.remove(file.name)
+        self.assertEqual(apply_document_edits(self.lines, edits), expected)
+
+    def test_adds_below_same_line_keep_order(self):
+        edits = DocumentEdits(edits=[
+            DocumentLinesAdd(line_number=2, new_line="First"),
+            DocumentLinesAdd(line_number=2, new_line="Second"),
+        ])
+        self.assertEqual(apply_document_edits(self.lines, edits), ["Line 1\n", "Line 2\n", "First\n", "Second\n", "Line 3\n", "Line 4\n", "Line 5\n"])
+
+    def test_add_below_last_deleted_line(self):
+        edits = DocumentEdits(edits=[
+            DocumentLinesAdd(line_number=3, new_line="Replacement"),
+            DocumentLinesDelete(line_numbers=(2, 3)),
+        ])
+        self.assertEqual(apply_document_edits(self.lines, edits), ["Line 1\n", "Replacement\n", "Line 4\n", "Line 5\n"])
+
+    def test_overlapping_deletes(self):
+        edits = DocumentEdits(edits=[DocumentLinesDelete(line_numbers=(1, 3)), DocumentLinesDelete(line_numbers=(3, 4))])
+        with self.assertRaises(ValueError):
+            apply_document_edits(self.lines, edits)
+
+    def test_edit_inside_delete(self):
+        edits = DocumentEdits(edits=[DocumentLinesDelete(line_numbers=(1, 3)), DocumentLineEdit(line_number=2, new_line="Edited")])
+        with self.assertRaises(ValueError):
+            apply_document_edits(self.lines, edits)
+
+    def test_add_inside_delete(self):
+        edits = DocumentEdits(edits=[DocumentLinesDelete(line_numbers=(1, 3)), DocumentLinesAdd(line_number=2, new_line="Added")])
+        with self.assertRaises(ValueError):
+            apply_document_edits(self.lines, edits)
+
+    def test_duplicate_edit(self):
+        edits = DocumentEdits(edits=[DocumentLineEdit(line_number=2, new_line="A"), DocumentLineEdit(line_number=2, new_line="B")])
+        with self.assertRaises(ValueError):
+            apply_document_edits(self.lines, edits)
+
+    def test_out_of_range(self):
+        with self.assertRaises(IndexError):
+            apply_document_edits(self.lines, DocumentEdits(edits=[DocumentLinesDelete(line_numbers=(4, 6))]))
+        with self.assertRaises(IndexError):
+            apply_document_edits(self.lines, DocumentEdits(edits=[DocumentLineEdit(line_number=0, new_line="Zero")]))
+
+    def test_edit_document_batched(self):
+        with tempfile.NamedTemporaryFile("w", delete=False) as file:
+            file.writelines(self.lines)
+        try:
+            edit_document_batched(file.name, DocumentEdits(edits=[DocumentLinesDelete(line_numbers=(2, 5))]))
+            with open(file.name, 'r') as file:
+                self.assertEqual(file.readlines(), ["Line 1\n"])
+        finally:
+            os.remove(file.name)
+
+class TestEditDocumentStreaming(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "doc.md")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write(self, lines):
+        with open(self.path, 'w') as file:
+            file.writelines(lines)
+
+    def read(self):
+        with open(self.path, 'r') as file:
+            return file.readlines()
+
+    def test_matches_apply_document_edits(self):
+        lines = [f"Line {i}\n" for i in range(1, 21)]
+        edits = DocumentEdits(edits=[
+            DocumentLinesDelete(line_numbers=(3, 6)),
+            DocumentLineEdit(line_number=10, new_line="Edited 10"),
+            DocumentLinesAdd(line_number=6, new_line="After deleted 6"),
+            DocumentLinesAdd(line_number=20, new_line="After 20"),
+            DocumentLinesAdd(line_number=None, new_line="At the end"),
+            DocumentLinesDelete(line_numbers=(1, 1)),
+        ])
+        self.write(lines)
+        edit_document_streaming(self.path, edits)
+        self.assertEqual(self.read(), apply_document_edits(lines, edits))
+        self.assertEqual(os.listdir(self.tmp_dir.name), ["doc.md"])
+
+    def test_invalid_edit_leaves_file_untouched(self):
+        lines = ["Line 1\n", "Line 2\n"]
+        self.write(lines)
+        with self.assertRaises(IndexError):
+            edit_document_streaming(self.path, DocumentEdits(edits=[DocumentLineEdit(line_number=3, new_line="Nope")]))
+        self.assertEqual(self.read(), lines)
+        self.assertEqual(os.listdir(self.tmp_dir.name), ["doc.md"])
+
+    def test_memory_does_not_scale_with_document(self):
+        line = "A line of campaign text that goes on for a while, like the writer does.\n"
+        self.write([line] * 50_000)
+        size = os.path.getsize(self.path)
+        edits = DocumentEdits(edits=[DocumentLineEdit(line_number=25_000, new_line="Middle"), DocumentLinesDelete(line_numbers=(1, 10))])
+
+        tracemalloc.start()
+        try:
+            edit_document_streaming(self.path, edits)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak, size / 10)
+        self.assertEqual(os.path.getsize(self.path), size - 11 * len(line) + len("Middle\n"))
+
+class TestCompactEdits(unittest.TestCase):
+
+    def setUp(self):
+        self.edits = DocumentEdits(edits=[
+            DocumentLinesDelete(line_numbers=(4, 5)),
+            DocumentLinesAdd(line_number=None, new_line="End"),
+            DocumentLineEdit(line_number=2, new_line="Two"),
+            DocumentLinesAdd(line_number=1, new_line="After one"),
+        ], base_version=3)
+
+    def test_rows(self):
+        compact = compact_edits(self.edits)
+        self.assertEqual(list(compact), [(OP_DELETE, 4, 5, -1), (OP_APPEND, 0, 0, 0), (OP_EDIT, 2, 2, 1), (OP_ADD, 1, 1, 2)])
+        self.assertEqual(compact.texts, ["End\n", "Two\n", "After one\n"])
+        self.assertEqual(compact.base_version, 3)
+        self.assertEqual(compact.sort_keys(), [4, float('inf'), 2, 1])
+        self.assertEqual([sort_document_edits(edit) for edit in self.edits.edits], [4, float('inf'), 2, 1])
+
+    def test_apply_order(self):
+        compact = compact_edits(DocumentEdits(edits=[
+            DocumentLinesAdd(line_number=None, new_line="First end"),
+            DocumentLinesAdd(line_number=2, new_line="X"),
+            DocumentLinesAdd(line_number=2, new_line="Y"),
+            DocumentLinesAdd(line_number=None, new_line="Second end"),
+            DocumentLineEdit(line_number=3, new_line="Three"),
+        ]))
+        self.assertEqual(compact.apply_order(), [0, 3, 4, 2, 1])
+
+    def test_apply_compact(self):
+        lines = ["Line 1\n", "Line 2\n", "Line 3\n", "Line 4\n", "Line 5\n"]
+        expected = ["Line 1\n", "After one\n", "Two\n", "Line 3\n", "End\n"]
+        self.assertEqual(apply_document_edits(lines, compact_edits(self.edits)), expected)
+        self.assertEqual(apply_document_edits(lines, self.edits), expected)
+
+    def test_parse_compact_matches_the_models(self):
+        self.assertEqual(parse_compact_edits(self.edits.model_dump_json()), compact_edits(self.edits))
+
+class TestParseDocumentEdits(unittest.TestCase):
+
+    def test_negative_add_is_out_of_range(self):
+        with self.assertRaises(IndexError):
+            apply_document_edits(["Line 1\n"], DocumentEdits(edits=[DocumentLinesAdd(line_number=-1, new_line="x")]))
+
+    def test_parse(self):
+        payload = '{"edits": [{"edit_type": "edit", "line_number": 2, "new_line": "Two"}], "base_version": 3}'
+        document_edit = parse_document_edits(payload)
+        self.assertEqual(document_edit.base_version, 3)
+        self.assertIs(parse_document_edits(document_edit), document_edit)
+        self.assertEqual(parse_document_edits(document_edit.model_dump()), document_edit)
+
+        batch = parse_edit_batch(f"[{payload}, {{\"edits\": [{{\"edit_type\": \"delete\", \"line_numbers\": [1, 2]}}]}}]")
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(batch[0], compact_edits(document_edit))
+        self.assertEqual(list(batch[1]), [(OP_DELETE, 1, 2, -1)])
+        self.assertIsNone(batch[1].base_version)
+
+    def test_invalid_payloads_are_rejected(self):
+        for payload in ('{"edits": [{"edit_type": "move", "line_number": 2}]}', '{"edits": [{"edit_type": "edit", "new_line": "Two"}]}'):
+            with self.subTest(payload=payload), self.assertRaises(ValueError):
+                parse_compact_edits(payload)
+
+class TestDiffDocumentEdits(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "doc.md")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_only_changed_lines(self):
+        old = "# Title\n## Places\n### Harbor\n### Lighthouse\n## People\n### Keeper\n"
+        new = "# Title\n## Places\n### Old Harbor\n### Lighthouse\n### Reef\n## People\n"
+        document_edit = diff_document_edits(old, new, base_version=4)
+        self.assertEqual(document_edit.base_version, 4)
+        self.assertEqual(len(document_edit.edits), 3)
+        self.assertEqual(apply_document_edits(old.splitlines(True), document_edit), new.splitlines(True))
+
+    def test_identical(self):
+        self.assertEqual(diff_document_edits(["a\n", "b\n"], "a\nb").edits, [])
+
+    def test_random_round_trip(self):
+        rng = random.Random(7)
+        for _ in range(200):
+            old = [f"line {rng.randrange(8)}" for _ in range(rng.randrange(12))]
+            new = list(old)
+            for _ in range(rng.randrange(5)):
+                position = rng.randrange(len(new) + 1)
+                choice = rng.random()
+                if choice < 0.4:
+                    new.insert(position, f"new {rng.randrange(8)}")
+                elif new and choice < 0.7:
+                    del new[min(position, len(new) - 1)]
+                elif new:
+                    new[min(position, len(new) - 1)] = f"changed {rng.randrange(8)}"
+            document_edit = diff_document_edits(old, new)
+            result = apply_document_edits([line + "\n" for line in old], document_edit)
+            self.assertEqual(result, [line + "\n" for line in new], (old, new))
+            with open(self.path, 'w') as file:
+                file.writelines(line + "\n" for line in old)
+            edit_document(self.path, document_edit)
+            with open(self.path, 'r') as file:
+                self.assertEqual(file.read().splitlines(), new, (old, new))
+
+    def test_several_adds_through_edit_document(self):
+        document_edit = diff_document_edits("a\nb\nc\n", "a\nX\nY\nZ\nc\n")
+        self.assertEqual([edit.edit_type for edit in document_edit.edits], ["edit", "add", "add"])
+        with open(self.path, 'w') as file:
+            file.write("a\nb\nc\n")
+        edit_document(self.path, document_edit)
+        with open(self.path, 'r') as file:
+            self.assertEqual(file.read(), "a\nX\nY\nZ\nc\n")
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,221 @@
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import unittest
+from collections import defaultdict
+from typing import Callable, Dict, List
+from crews.document_edits import DocumentEdits, DocumentLineEdit, DocumentLinesAdd, DocumentLinesDelete, LineEdit, apply_document_edits, edit_document, edit_document_batched, edit_document_streaming, parse_compact_edits, parse_document_edits
+
+# The scale test's document and edit set; set DOCUMENT_EDIT_TIMINGS to a path to save its timings as JSON
+SCALE_LINES = int(os.environ.get("DOCUMENT_EDIT_SCALE_LINES", "100000"))
+SCALE_EDITS = int(os.environ.get("DOCUMENT_EDIT_SCALE_EDITS", "5000"))
+
+def reference_edit(lines: List[str], document_edit: DocumentEdits) -> List[str]:
+    """
+    What a set of edits means, written as plainly as possible: every original line is dropped, replaced
+    or kept, followed by whatever was added below it, in the order given. Assumes the edits are valid.
+    """
+    deleted = set()
+    replaced: Dict[int, str] = {}
+    below: Dict[int, List[str]] = defaultdict(list)
+    appends: List[str] = []
+    for edit in document_edit.edits:
+        if isinstance(edit, DocumentLinesDelete):
+            start, end = edit.line_numbers
+            deleted.update(range(start, end + 1))
+        elif isinstance(edit, DocumentLineEdit):
+            replaced[edit.line_number] = edit.new_line + "\n"
+        elif edit.line_number is None:
+            appends.append(edit.new_line + "\n")
+        else:
+            below[edit.line_number].append(edit.new_line + "\n")
+
+    result = list(below[0])
+    for line_number, line in enumerate(lines, start=1):
+        if line_number not in deleted:
+            result.append(replaced.get(line_number, line))
+        result.extend(below[line_number])
+    return result + appends
+
+def random_document(rng: random.Random, line_count: int) -> List[str]:
+    words = ["harbor", "keeper", "##", "the", "", "reef", "*", "lantern", "-", "tide"]
+    lines = [" ".join(rng.choice(words) for _ in range(rng.randrange(6))) + "\n" for _ in range(line_count)]
+    if lines and lines[-1] != "\n" and rng.random() < 0.2:
+        lines[-1] = lines[-1].rstrip("\n")  # no newline at the end of the file
+    return lines
+
+def random_edits(rng: random.Random, line_count: int, edit_count: int, shared_lines: bool = False, same_line_adds: bool = False) -> DocumentEdits:
+    """
+    Valid add/edit/delete edits touching random lines, plus an add at the top and appends now and then.
+    edit_document applies edits one at a time, so an add below a line that's also edited or deleted
+    depends on the order it gets to them. Those only come up with `shared_lines`, for the engines that
+    apply edits against the original document; `same_line_adds` (implied by `shared_lines`) adds a second add below some lines.
+    """
+    edits: List[LineEdit] = []
+    touched = sorted(rng.sample(range(1, line_count + 1), min(edit_count, line_count)))
+    for index, line_number in enumerate(touched):
+        choice = rng.random()
+        if choice < 0.35:
+            edits.append(DocumentLinesAdd(line_number=line_number, new_line=f"Added below {line_number}"))
+            if (shared_lines or same_line_adds) and rng.random() < 0.3:
+                edits.append(DocumentLinesAdd(line_number=line_number, new_line=f"Also added below {line_number}"))
+        elif choice < 0.7:
+            edits.append(DocumentLineEdit(line_number=line_number, new_line=f"Edited {line_number}"))
+            if shared_lines and rng.random() < 0.3:
+                edits.append(DocumentLinesAdd(line_number=line_number, new_line=f"Added below edited {line_number}"))
+        else:
+            # Ranges stop short of the next touched line
+            limit = touched[index + 1] - 1 if index + 1 < len(touched) else line_count
+            end = min(line_number + rng.randrange(4), limit)
+            edits.append(DocumentLinesDelete(line_numbers=(line_number, end)))
+            if shared_lines and rng.random() < 0.3:
+                edits.append(DocumentLinesAdd(line_number=end, new_line=f"Added below deleted {end}"))
+    if rng.random() < 0.3:
+        edits.append(DocumentLinesAdd(line_number=0, new_line="Added at the top"))
+    for number in range(rng.randrange(3)):
+        edits.append(DocumentLinesAdd(line_number=None, new_line=f"Appended {number}"))
+    rng.shuffle(edits)
+    return DocumentEdits(edits=edits)
+
+class TempDocument:
+    def __init__(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "doc.md")
+
+    def write(self, lines: List[str]):
+        with open(self.path, 'w') as file:
+            file.writelines(lines)
+
+    def read(self) -> List[str]:
+        with open(self.path, 'r') as file:
+            return file.readlines()
+
+    def apply(self, engine: Callable, lines: List[str], document_edit) -> str:
+        """The document's text after running `engine` on it."""
+        self.write(lines)
+        engine(self.path, document_edit)
+        return "".join(self.read())
+
+    def cleanup(self):
+        self.tmp_dir.cleanup()
+
+class TestEditDocumentProperties(unittest.TestCase):
+
+    def setUp(self):
+        self.doc = TempDocument()
+
+    def tearDown(self):
+        self.doc.cleanup()
+
+    def test_edit_document_matches_reference(self):
+        rng = random.Random(11)
+        for case in range(300):
+            lines = random_document(rng, rng.randrange(1, 60))
+            document_edit = random_edits(rng, len(lines), rng.randrange(len(lines) + 1), same_line_adds=True)
+            expected = "".join(reference_edit(lines, document_edit))
+            with self.subTest(case=case):
+                self.assertEqual(self.doc.apply(edit_document, lines, document_edit), expected)
+                self.assertEqual(self.doc.apply(edit_document, lines, parse_compact_edits(document_edit.model_dump_json())), expected)
+
+    def test_single_pass_engines_match_reference(self):
+        rng = random.Random(12)
+        for case in range(300):
+            lines = random_document(rng, rng.randrange(1, 60))
+            document_edit = random_edits(rng, len(lines), rng.randrange(len(lines) + 1), shared_lines=True)
+            expected = "".join(reference_edit(lines, document_edit))
+            with self.subTest(case=case):
+                self.assertEqual("".join(apply_document_edits(lines, document_edit)), expected)
+                self.assertEqual(self.doc.apply(edit_document_batched, lines, document_edit), expected)
+                self.assertEqual(self.doc.apply(edit_document_streaming, lines, document_edit), expected)
+
+    def test_json_round_trip_applies_the_same(self):
+        rng = random.Random(13)
+        for case in range(50):
+            lines = random_document(rng, rng.randrange(1, 40))
+            document_edit = random_edits(rng, len(lines), rng.randrange(len(lines) + 1), shared_lines=True)
+            parsed = parse_document_edits(document_edit.model_dump_json())
+            with self.subTest(case=case):
+                self.assertEqual(parsed, document_edit)
+                self.assertEqual(apply_document_edits(lines, parsed), apply_document_edits(lines, document_edit))
+                self.assertEqual(apply_document_edits(lines, parse_compact_edits(document_edit.model_dump_json())), apply_document_edits(lines, document_edit))
+
+    def test_out_of_range_edits_raise_and_leave_the_file(self):
+        rng = random.Random(14)
+        for case in range(100):
+            lines = random_document(rng, rng.randrange(1, 30))
+            document_edit = random_edits(rng, len(lines), rng.randrange(len(lines) + 1))
+            beyond = len(lines) + 1 + rng.randrange(3)
+            bad = rng.choice([
+                DocumentLineEdit(line_number=beyond, new_line="Nope"),
+                DocumentLineEdit(line_number=0, new_line="Nope"),
+                DocumentLinesAdd(line_number=beyond, new_line="Nope"),
+                DocumentLinesDelete(line_numbers=(len(lines), beyond)),
+                DocumentLinesDelete(line_numbers=(0, 1)),
+            ])
+            document_edit.edits.insert(rng.randrange(len(document_edit.edits) + 1), bad)
+            for engine in (edit_document, edit_document_batched, edit_document_streaming):
+                with self.subTest(case=case, engine=engine.__name__):
+                    self.doc.write(lines)
+                    with self.assertRaises(IndexError):
+                        engine(self.doc.path, document_edit)
+                    self.assertEqual(self.doc.read(), lines)
+
+class TestEditDocumentScale(unittest.TestCase):
+    """Thousands of edits on a large document: every engine must agree with the reference, and their cost is recorded."""
+
+    timings: Dict[str, dict] = {}
+
+    @classmethod
+    def setUpClass(cls):
+        rng = random.Random(15)
+        cls.lines = random_document(rng, SCALE_LINES)
+        cls.edits = random_edits(rng, SCALE_LINES, SCALE_EDITS)
+        cls.shared_edits = random_edits(rng, SCALE_LINES, SCALE_EDITS, shared_lines=True)
+        cls.doc = TempDocument()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.doc.cleanup()
+        path = os.environ.get("DOCUMENT_EDIT_TIMINGS")
+        if path:
+            with open(path, 'w', encoding='utf-8') as fh:
+                json.dump({"lines": SCALE_LINES, "edits": SCALE_EDITS, "engines": cls.timings}, fh, indent=2)
+
+    def measure(self, name: str, engine: Callable, document_edit: DocumentEdits) -> str:
+        """Apply once for the wall time and once more under tracemalloc for peak memory, returning the result."""
+        self.doc.write(self.lines)
+        start = time.perf_counter()
+        engine(self.doc.path, document_edit)
+        seconds = time.perf_counter() - start
+        result = "".join(self.doc.read())
+
+        self.doc.write(self.lines)
+        tracemalloc.start()
+        try:
+            engine(self.doc.path, document_edit)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.timings[name] = {"seconds": seconds, "peak_bytes": peak}
+        return result
+
+    def test_edit_document(self):
+        expected = "".join(reference_edit(self.lines, self.edits))
+        self.assertEqual(self.measure("edit_document", edit_document, self.edits), expected)
+
+    def test_edit_document_batched(self):
+        expected = "".join(reference_edit(self.lines, self.shared_edits))
+        self.assertEqual(self.measure("edit_document_batched", edit_document_batched, self.shared_edits), expected)
+
+    def test_edit_document_streaming(self):
+        expected = "".join(reference_edit(self.lines, self.shared_edits))
+        self.assertEqual(self.measure("edit_document_streaming", edit_document_streaming, self.shared_edits), expected)
+        # Streaming holds the edits, not the document
+        self.assertLess(self.timings["edit_document_streaming"]["peak_bytes"], sum(sys.getsizeof(line) for line in self.lines))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,334 @@
+import json
+import os
+import random
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from crews.document_edits import DocumentEdits, DocumentLineEdit, DocumentLinesAdd, DocumentLinesDelete, apply_document_edits, document_edits_example, parse_document_edits
+from crews.edit_journal import DocumentChanged, EditJournal, Hunk, LineOffsets, discard_journal, get_journal, rebase_edits, rebase_line, rebase_range
+
+class TestEditJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "doc.md")
+        self.lines = [f"Line {i}\n" for i in range(1, 8)]
+        with open(self.path, 'w') as file:
+            file.writelines(self.lines)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def read(self):
+        with open(self.path, 'r') as file:
+            return file.readlines()
+
+    def test_apply_matches_apply_document_edits(self):
+        edits = DocumentEdits(edits=[
+            DocumentLinesDelete(line_numbers=(1, 2)),
+            DocumentLinesAdd(line_number=2, new_line="After deleted 2"),
+            DocumentLineEdit(line_number=4, new_line="Edited 4"),
+            DocumentLinesAdd(line_number=4, new_line="After 4"),
+            DocumentLinesAdd(line_number=0, new_line="At the top"),
+            DocumentLinesAdd(line_number=None, new_line="At the end"),
+        ])
+        journal = EditJournal(self.path)
+        self.assertEqual(journal.apply(edits, base_version=0), 1)
+        self.assertEqual(self.read(), apply_document_edits(self.lines, edits))
+
+    def test_undo_redo(self):
+        journal = EditJournal(self.path)
+        journal.apply(DocumentEdits(edits=[DocumentLinesDelete(line_numbers=(1, 3)), DocumentLinesAdd(line_number=None, new_line="End")]), base_version=journal.version)
+        after_first = self.read()
+        journal.apply(DocumentEdits(edits=[DocumentLineEdit(line_number=1, new_line="Edited")]), base_version=journal.version)
+        after_second = self.read()
+
+        self.assertEqual(journal.undo(), 3)
+        self.assertEqual(self.read(), after_first)
+        self.assertEqual(journal.undo(), 4)
+        self.assertEqual(self.read(), self.lines)
+        with self.assertRaises(IndexError):
+            journal.undo()
+
+        self.assertEqual(journal.redo(), 5)
+        self.assertEqual(journal.redo(), 6)
+        self.assertEqual(self.read(), after_second)
+        with self.assertRaises(IndexError):
+            journal.redo()
+        self.assertEqual(journal.undo(), 7)
+        self.assertEqual(self.read(), after_first)
+
+    def test_new_edit_after_undo_drops_redo(self):
+        journal = EditJournal(self.path)
+        journal.apply(DocumentEdits(edits=[DocumentLineEdit(line_number=1, new_line="First")]), base_version=journal.version)
+        journal.undo()
+        journal.apply(DocumentEdits(edits=[DocumentLineEdit(line_number=2, new_line="Second")]), base_version=journal.version)
+        with self.assertRaises(IndexError):
+            journal.redo()
+        self.assertEqual(self.read()[:2], ["Line 1\n", "Second\n"])
+
+    def test_reload_and_snapshots(self):
+        journal = EditJournal(self.path, checkpoint_every=2)
+        versions = [list(self.lines)]
+        for i in range(4):
+            journal.apply(DocumentEdits(edits=[DocumentLinesAdd(line_number=1, new_line=f"Added {i}")]), base_version=journal.version)
+            versions.append(self.read())
+        journal.undo()
+        versions.append(self.read())
+
+        reloaded = EditJournal(self.path, checkpoint_every=2)
+        self.assertEqual(reloaded.version, 5)
+        for version, lines in enumerate(versions):
+            self.assertEqual(reloaded.snapshot(version), lines)
+        self.assertEqual(sorted(os.listdir(journal.snapshot_dir)), ["v0.md", "v2.md", "v4.md"])
+        reloaded.redo()
+        self.assertEqual(self.read(), versions[4])
+
+    def test_journal_records(self):
+        journal = EditJournal(self.path)
+        journal.apply(DocumentEdits(edits=[DocumentLineEdit(line_number=3, new_line="Edited")]), base_version=journal.version)
+        with open(journal.journal_path, 'r', encoding='utf-8') as file:
+            records = [json.loads(line) for line in file]
+        self.assertEqual([record["type"] for record in records], ["init", "edit"])
+        self.assertEqual(records[1]["base_hash"], records[0]["hash"])
+        self.assertEqual(records[1]["edits"], {"edits": [{"edit_type": "edit", "line_number": 3, "new_line": "Edited"}], "base_version": 0})
+        self.assertEqual(records[1]["hunks"], [[2, 1, ["Edited\n"]]])
+        self.assertEqual(records[1]["inverse"], [[2, 1, ["Line 3\n"]]])
+
+    def test_discard_journal(self):
+        journal = get_journal(self.path)
+        journal.apply(DocumentEdits(edits=[DocumentLineEdit(line_number=3, new_line="Edited")]), base_version=journal.version)
+        self.assertTrue(os.path.isdir(journal.snapshot_dir))
+
+        discard_journal(self.path)
+        self.assertFalse(os.path.exists(journal.journal_path))
+        self.assertFalse(os.path.exists(journal.snapshot_dir))
+        fresh = get_journal(self.path)
+        self.assertIsNot(fresh, journal)
+        self.assertEqual(fresh.version, 0)
+        self.assertEqual(fresh.snapshot(0), self.read())
+        discard_journal(self.path)
+
+    def test_changes_do_not_reread_the_document(self):
+        journal = EditJournal(self.path)
+        with mock.patch.object(journal, "_read", side_effect=AssertionError("read the document")):
+            journal.apply(DocumentEdits(edits=[DocumentLineEdit(line_number=7, new_line="Edited 7")]), base_version=journal.version)
+            journal.undo()
+            journal.redo()
+        self.assertEqual(self.read(), self.lines[:6] + ["Edited 7\n"])
+
+    def test_same_size_changes_only_write_the_edit(self):
+        self.lines = [f"Line {i}\n" for i in range(1, 2001)]
+        with open(self.path, 'w') as file:
+            file.writelines(self.lines)
+        journal = EditJournal(self.path)
+        writes = []
+
+        class RecordingFile:
+            def __init__(self, fh):
+                self.fh = fh
+
+            def __getattr__(self, name):
+                return getattr(self.fh, name)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                self.fh.close()
+
+            def write(self, data):
+                writes.append(len(data))
+                return self.fh.write(data)
+
+        def recording_open(path, mode='r', *args, **kwargs):
+            fh = open(path, mode, *args, **kwargs)
+            return RecordingFile(fh) if mode == 'r+b' else fh
+
+        with mock.patch("crews.edit_journal.open", recording_open, create=True):
+            journal.apply(DocumentEdits(edits=[DocumentLineEdit(line_number=3, new_line="Line X")], base_version=journal.version))
+            journal.undo()
+            journal.redo()
+        self.assertEqual(writes, [len("Line X\n")] * 3)
+        self.assertEqual(self.read(), self.lines[:2] + ["Line X\n"] + self.lines[3:])
+
+    def test_in_place_rewrite_keeps_bytes(self):
+        with open(self.path, 'wb') as file:
+            file.write("Tïtle\r\nÜber\r\nLast\r\n".encode('utf-8'))
+        journal = EditJournal(self.path)
+        journal.apply(DocumentEdits(edits=[DocumentLineEdit(line_number=2, new_line="Ünder")]), base_version=journal.version)
+        with open(self.path, 'rb') as file:
+            self.assertEqual(file.read(), "Tïtle\r\nÜnder\nLast\r\n".encode('utf-8'))
+        journal.undo()
+        with open(self.path, 'rb') as file:
+            self.assertEqual(file.read(), "Tïtle\r\nÜber\r\nLast\r\n".encode('utf-8'))
+        self.assertEqual(EditJournal(self.path).version, 2)
+
+    def test_outside_change_is_detected(self):
+        journal = EditJournal(self.path)
+        journal.apply(DocumentEdits(edits=[DocumentLineEdit(line_number=1, new_line="Edited")]), base_version=journal.version)
+        with open(self.path, 'a') as file:
+            file.write("Appended directly\n")
+        for change in (journal.undo, journal.fetch, lambda: journal.apply(DocumentEdits(edits=[DocumentLinesDelete(line_numbers=(2, 2))], base_version=1))):
+            with self.assertRaises(DocumentChanged):
+                change()
+        with self.assertRaises(DocumentChanged):
+            EditJournal(self.path)
+        self.assertEqual(self.read()[-1], "Appended directly\n")
+        self.assertEqual(journal.version, 1)
+
+    def test_touched_document_is_accepted(self):
+        journal = EditJournal(self.path)
+        journal.apply(DocumentEdits(edits=[DocumentLineEdit(line_number=1, new_line="Edited")]), base_version=journal.version)
+        content = self.read()
+        with open(self.path, 'w') as file:
+            file.writelines(content)
+        self.assertEqual(journal.undo(), 2)
+        self.assertEqual(self.read(), self.lines)
+
+class TestLineOffsets(unittest.TestCase):
+
+    def test_matches_prefix_sums(self):
+        rng = random.Random(3)
+        sizes = [rng.randrange(1, 40) for _ in range(200)]
+        offsets = LineOffsets(list(sizes))
+        for _ in range(300):
+            start = rng.randrange(len(sizes) + 1)
+            remove = min(rng.randrange(4), len(sizes) - start)
+            insert = [rng.randrange(1, 40) for _ in range(rng.choice([remove, rng.randrange(4)]))]
+            sizes[start:start + remove] = insert
+            offsets.replace(start, remove, insert)
+            index = rng.randrange(len(sizes) + 1)
+            self.assertEqual(offsets.offset(index), sum(sizes[:index]))
+
+class TestRebase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "doc.md")
+        with open(self.path, 'w') as file:
+            file.writelines([f"Line {i}\n" for i in range(1, 8)])
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def read(self):
+        with open(self.path, 'r') as file:
+            return file.readlines()
+
+    def test_rebase_line(self):
+        # Line index 1 replaced by two lines, index 4 deleted
+        hunks = [Hunk(1, 1, ["a\n", "b\n"]), Hunk(4, 1, [])]
+        self.assertEqual(rebase_line(0, hunks), (0, True))
+        self.assertEqual(rebase_line(1, hunks), (3, False))
+        self.assertEqual(rebase_line(3, hunks), (4, True))
+        self.assertEqual(rebase_line(4, hunks), (5, False))
+        self.assertEqual(rebase_line(6, hunks), (6, True))
+
+    def test_rebase_range_skips_changed_lines(self):
+        hunks = [Hunk(2, 0, ["inserted\n"]), Hunk(4, 1, [])]
+        self.assertEqual(rebase_range(0, 6, hunks), [(0, 1), (3, 4), (5, 6)])
+        self.assertEqual(rebase_range(4, 4, hunks), [])
+
+    def test_rebase_edits(self):
+        hunks = [Hunk(0, 0, ["Top\n"]), Hunk(2, 1, ["Replaced 3\n"])]
+        rebased = rebase_edits(DocumentEdits(edits=[
+            DocumentLineEdit(line_number=2, new_line="Edited 2"),
+            DocumentLineEdit(line_number=3, new_line="Edited 3"),
+            DocumentLinesAdd(line_number=5, new_line="After 5"),
+            DocumentLinesDelete(line_numbers=(3, 4)),
+        ]), hunks)
+        self.assertEqual(rebased.edits, [
+            DocumentLineEdit(line_number=3, new_line="Edited 2"),
+            DocumentLinesAdd(line_number=4, new_line="Edited 3"),
+            DocumentLinesAdd(line_number=6, new_line="After 5"),
+            DocumentLinesDelete(line_numbers=(5, 5)),
+        ])
+
+    def test_stale_edit_is_rebased(self):
+        journal = EditJournal(self.path)
+        version, _ = journal.fetch()
+        journal.apply(DocumentEdits(edits=[DocumentLinesDelete(line_numbers=(1, 2)), DocumentLinesAdd(line_number=0, new_line="Title")], base_version=version))
+        # Written against the original line numbers
+        journal.apply(DocumentEdits(edits=[DocumentLineEdit(line_number=5, new_line="Edited 5"), DocumentLinesDelete(line_numbers=(7, 7))], base_version=version))
+        self.assertEqual(self.read(), ["Title\n", "Line 3\n", "Line 4\n", "Edited 5\n", "Line 6\n"])
+
+    def test_missing_version_is_rejected(self):
+        journal = EditJournal(self.path)
+        version, _ = journal.fetch()
+        journal.apply(DocumentEdits(edits=[DocumentLinesDelete(line_numbers=(1, 2))], base_version=version))
+        # Read before that delete, but sent without the version
+        with self.assertRaises(ValueError):
+            journal.apply(DocumentEdits(edits=[DocumentLineEdit(line_number=3, new_line="Edited 3")]))
+        self.assertEqual(journal.version, 1)
+        self.assertEqual(self.read(), [f"Line {i}\n" for i in range(3, 8)])
+        # With the version it read, the same edit lands on the line it meant
+        journal.apply(DocumentEdits(edits=[DocumentLineEdit(line_number=3, new_line="Edited 3")]), base_version=version)
+        self.assertEqual(self.read()[0], "Edited 3\n")
+
+    def test_prompt_example_applies(self):
+        # What an agent copying the example in the review prompt sends, once the task fills the prompt in
+        example = document_edits_example.replace("{{", "{").replace("}}", "}")
+        document_edit = parse_document_edits(example[example.index("{"):])
+        self.assertEqual(document_edit.base_version, 3)
+
+        with open(self.path, 'w') as file:
+            file.writelines([f"Line {i}\n" for i in range(1, 11)])
+        journal = get_journal(self.path)
+        self.addCleanup(discard_journal, self.path)
+        for number in range(3):
+            journal.apply(DocumentEdits(edits=[DocumentLineEdit(line_number=1, new_line=f"Title {number}")], base_version=journal.version))
+        self.assertEqual(journal.apply(document_edit), 4)
+        self.assertEqual(self.read(), [
+            "Title 2\n", "Line 2\n", "Line 3\n", "Line 4\n", "This line takes the place of lines 5 to 7!\n",
+            "Line 8\n", "This is the new line_number. I have replaced it!\n", "Line 10\n", "This line will go at the end of the file!\n",
+        ])
+
+    def test_future_version_is_rejected(self):
+        journal = EditJournal(self.path)
+        with self.assertRaises(ValueError):
+            journal.apply(DocumentEdits(edits=[DocumentLineEdit(line_number=1, new_line="x")], base_version=3))
+
+    def test_rebase_does_not_wait_for_the_lock(self):
+        journal = EditJournal(self.path)
+        version, _ = journal.fetch()
+        journal.apply(DocumentEdits(edits=[DocumentLinesAdd(line_number=0, new_line="Title")], base_version=version))
+        rebased = threading.Event()
+
+        def rebase(document_edit, hunks):
+            rebased.set()
+            return rebase_edits(document_edit, hunks)
+
+        with mock.patch("crews.edit_journal.rebase_edits", rebase):
+            with journal._lock:
+                writer = threading.Thread(target=journal.apply, args=(DocumentEdits(edits=[DocumentLineEdit(line_number=2, new_line="Edited 2")], base_version=version),))
+                writer.start()
+                # Another writer holds the lock, and the stale edit is rebased all the same
+                self.assertTrue(rebased.wait(5))
+            writer.join()
+        self.assertEqual(self.read()[:3], ["Title\n", "Line 1\n", "Edited 2\n"])
+
+    def test_concurrent_writers(self):
+        journal = EditJournal(self.path)
+        version, _ = journal.fetch()
+
+        def write(line_number):
+            journal.apply(DocumentEdits(edits=[
+                DocumentLineEdit(line_number=line_number, new_line=f"Edited {line_number}"),
+                DocumentLinesAdd(line_number=line_number, new_line=f"Added below {line_number}"),
+            ], base_version=version))
+
+        threads = [threading.Thread(target=write, args=(line_number,)) for line_number in range(1, 8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        expected = []
+        for line_number in range(1, 8):
+            expected += [f"Edited {line_number}\n", f"Added below {line_number}\n"]
+        self.assertEqual(self.read(), expected)
+        self.assertEqual(journal.version, 7)
+
+if __name__ == '__main__':
+    unittest.main()
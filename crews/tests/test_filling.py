@@ -0,0 +1,96 @@
+import threading
+import time
+import unittest
+from crews.filling import fill_sections
+from crews.outline import OutlineTree
+
+OUTLINE = [
+    "# Title\n",
+    "\n",
+    "## Key Locations\n",
+    "### Key Location One\n",
+    "### Key Location Two\n",
+    "\n",
+    "## Protaganists\n",
+    "### Protaganist One\n",
+    "## Villains\n",
+]
+
+class TestFilling(unittest.TestCase):
+
+    def test_sequential_section_headers(self):
+        sections = []
+        def fill(section, context):
+            sections.append(section)
+            return "body"
+        fill_sections(OUTLINE, fill)
+        self.assertEqual(sections[3], "## Key Locations\n### Key Location Two\n")
+        self.assertEqual(sections[5], "## Protaganists\n### Protaganist One\n")
+        self.assertEqual(sections[6], "## Villains\n")
+
+    def test_sequential_context_is_tail_of_written(self):
+        contexts = []
+        def fill(section, context):
+            contexts.append(context)
+            return "body of " + section.splitlines()[-1]
+        fill_sections(OUTLINE, fill)
+        self.assertEqual(contexts[0], "")
+        self.assertEqual(contexts[1], "# Title\n\nbody of # Title\n")
+
+    def test_concurrent_keeps_outline_order(self):
+        active = 0
+        peak = 0
+        lock = threading.Lock()
+        def fill(section, context):
+            nonlocal active, peak
+            with lock:
+                active += 1
+                peak = max(peak, active)
+            time.sleep(0.02)
+            with lock:
+                active -= 1
+            return section.splitlines()[-1].upper()
+
+        emitted = []
+        filled = fill_sections(OUTLINE, fill, concurrency=4, on_filled=lambda line, result: emitted.append(line))
+        headers = [line for line in OUTLINE if line != "\n"]
+        self.assertEqual([line for line, _ in filled], headers)
+        self.assertEqual(emitted, headers)
+        self.assertEqual(filled[2], ("### Key Location One\n", "### KEY LOCATION ONE"))
+        self.assertGreater(peak, 1)
+
+    def test_concurrent_context_stays_within_subtree(self):
+        contexts = {}
+        def fill(section, context):
+            contexts[section.splitlines()[-1]] = context
+            return "written"
+        fill_sections(OUTLINE, fill, concurrency=4)
+        self.assertEqual(contexts["## Protaganists"], "")
+        self.assertIn("## Protaganists", contexts["### Protaganist One"])
+    def test_resume_skips_done_sections(self):
+        sections = []
+        def fill(section, context):
+            sections.append((section, context))
+            return "body"
+        filled = fill_sections(OUTLINE, fill, done=3, seed_context="already written\n")
+        self.assertEqual([line for line, _ in filled], ["### Key Location Two\n", "## Protaganists\n", "### Protaganist One\n", "## Villains\n"])
+        self.assertEqual(sections[0], ("## Key Locations\n### Key Location Two\n", "already written\n"))
+
+    def test_concurrent_resume_skips_done_sections(self):
+        sections = []
+        def fill(section, context):
+            sections.append(section)
+            return "body"
+        filled = fill_sections(OUTLINE, fill, concurrency=4, done=3)
+        self.assertEqual([line for line, _ in filled], ["### Key Location Two\n", "## Protaganists\n", "### Protaganist One\n", "## Villains\n"])
+        self.assertIn("## Key Locations\n### Key Location Two\n", sections)
+
+    def test_deeper_headers_and_fences(self):
+        outline = OUTLINE[:5] + ["#### Hidden Door\n", "```\n", "## Not a header\n", "```\n"] + OUTLINE[5:]
+        sections = []
+        fill_sections(OutlineTree.parse(outline), lambda section, context: sections.append(section) or "body")
+        self.assertEqual(sections[4], "## Key Locations\n### Key Location Two\n#### Hidden Door\n")
+        self.assertEqual(len(sections), 8)
+
+if __name__ == '__main__':
+    unittest.main()
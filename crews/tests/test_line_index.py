@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+from crews.document_edits import fetch_doc_with_line_numbers
+from crews.line_index import get_line_index
+from crews.outline import OutlineTree
+
+DOC = (
+    "# Title\n"
+    "Intro\n"
+    "## Key Locations\n"
+    "### Clock Tower\n"
+    "Gears everywhere.\n"
+    "## Protaganists\n"
+    "Heroes.\n"
+)
+
+class TestLineIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "doc.md")
+        with open(self.path, 'w', encoding='utf-8') as file:
+            file.write(DOC)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_full_fetch_format(self):
+        self.assertEqual(fetch_doc_with_line_numbers(self.path), "".join(f"\n{i}: {line}" for i, line in enumerate(DOC.splitlines(keepends=True), start=1)))
+
+    def test_line_range(self):
+        self.assertEqual(fetch_doc_with_line_numbers(self.path, start_line=4, end_line=5), "\n4: ### Clock Tower\n\n5: Gears everywhere.\n")
+        self.assertEqual(fetch_doc_with_line_numbers(self.path, start_line=7, end_line=100), "\n7: Heroes.\n")
+        self.assertEqual(fetch_doc_with_line_numbers(self.path, end_line=1), "\n1: # Title\n")
+
+    def test_header_section(self):
+        self.assertEqual(
+            fetch_doc_with_line_numbers(self.path, header="## Key Locations"),
+            "\n3: ## Key Locations\n\n4: ### Clock Tower\n\n5: Gears everywhere.\n",
+        )
+        self.assertEqual(fetch_doc_with_line_numbers(self.path, header="protaganists"), "\n6: ## Protaganists\n\n7: Heroes.\n")
+        with self.assertRaises(KeyError):
+            fetch_doc_with_line_numbers(self.path, header="Villains")
+
+    def test_empty_range(self):
+        self.assertEqual(fetch_doc_with_line_numbers(self.path, end_line=0), "")
+        self.assertEqual(fetch_doc_with_line_numbers(self.path, start_line=0, end_line=1), "\n1: # Title\n")
+
+    def test_headers_match_outline(self):
+        with open(self.path, 'w', encoding='utf-8') as file:
+            file.write("# Title\n#tag not a header\n## Spells\n```\n# a comment in code\n```\n### Fireball ###\n## Items\n")
+        index = get_line_index(self.path)
+        self.assertEqual([(header.line_number, header.level, header.title) for header in index.headers], [(1, 1, "Title"), (3, 2, "Spells"), (7, 3, "Fireball"), (8, 2, "Items")])
+        self.assertEqual([(header.line_number, header.level, header.title) for header in index.headers], [(section.line_number, section.level, section.title) for section in OutlineTree.load(self.path)])
+        self.assertEqual(index.find_section("Spells"), (3, 7))
+
+    def test_index_is_cached_until_file_changes(self):
+        index = get_line_index(self.path)
+        self.assertIs(get_line_index(self.path), index)
+        with open(self.path, 'a', encoding='utf-8') as file:
+            file.write("More heroes.\n")
+        rebuilt = get_line_index(self.path)
+        self.assertIsNot(rebuilt, index)
+        self.assertEqual(rebuilt.line_count, 8)
+        self.assertEqual(rebuilt.read_lines(8, 8), ["More heroes.\n"])
+
+    def test_crlf_and_unicode(self):
+        with open(self.path, 'wb') as file:
+            file.write("# Tïtle\r\nÜber line\r\nlast".encode('utf-8'))
+        index = get_line_index(self.path)
+        self.assertEqual(index.read_lines(1, 3), ["# Tïtle\n", "Über line\n", "last"])
+        with open(self.path, 'r', encoding='utf-8') as file:
+            self.assertEqual(index.read_lines(1, 3), file.readlines())
+
+if __name__ == '__main__':
+    unittest.main()
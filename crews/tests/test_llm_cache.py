@@ -0,0 +1,60 @@
+import os
+import tempfile
+import time
+import unittest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.outputs import Generation
+from crews.llm_cache import PersistentLLMCache
+
+class TestPersistentLLMCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "cache.sqlite")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_hit_and_miss_counters(self):
+        cache = PersistentLLMCache(self.path)
+        self.assertIsNone(cache.lookup("prompt", "llm"))
+        cache.update("prompt", "llm", [Generation(text="completion")])
+        self.assertEqual(cache.lookup("prompt", "llm"), [Generation(text="completion")])
+        self.assertIsNone(cache.lookup("prompt", "other llm"))
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 2, "entries": 1})
+
+    def test_persists_across_instances(self):
+        PersistentLLMCache(self.path).update("prompt", "llm", [Generation(text="completion")])
+        self.assertEqual(PersistentLLMCache(self.path).lookup("prompt", "llm"), [Generation(text="completion")])
+
+    def test_ttl_expiry(self):
+        cache = PersistentLLMCache(self.path, ttl=0.05)
+        cache.update("prompt", "llm", [Generation(text="completion")])
+        time.sleep(0.1)
+        self.assertIsNone(cache.lookup("prompt", "llm"))
+        self.assertEqual(cache.count(), 0)
+
+    def test_lru_eviction(self):
+        cache = PersistentLLMCache(self.path, max_entries=2)
+        cache.update("one", "llm", [Generation(text="1")])
+        cache.update("two", "llm", [Generation(text="2")])
+        time.sleep(0.01)
+        cache.lookup("one", "llm")
+        cache.update("three", "llm", [Generation(text="3")])
+        self.assertEqual(cache.count(), 2)
+        self.assertIsNone(cache.lookup("two", "llm"))
+        self.assertIsNotNone(cache.lookup("one", "llm"))
+
+    def test_chat_model_replays_from_cache(self):
+        cache = PersistentLLMCache(self.path)
+        first = FakeListChatModel(responses=["first answer"], cache=cache)
+        self.assertEqual(first.invoke("Outline a campaign").content, "first answer")
+
+        replay = FakeListChatModel(responses=["first answer"], cache=PersistentLLMCache(self.path))
+        self.assertEqual(replay.invoke("Outline a campaign").content, "first answer")
+        self.assertEqual(replay.cache.hits, 1)
+        # The fake model steps through its responses on every real call
+        self.assertEqual(replay.i, 0)
+
+if __name__ == '__main__':
+    unittest.main()
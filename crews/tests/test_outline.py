@@ -0,0 +1,70 @@
+import unittest
+from crews.outline import OutlineTree
+
+OUTLINE = [
+    "# Title\n",
+    "\n",
+    "## Key Locations\n",
+    "### Key Location One\n",
+    "#### Hidden Door ##\n",
+    "### Key Location Two\n",
+    "```markdown\n",
+    "## Inside a fence\n",
+    "```\n",
+    "Some notes that are not a header\n",
+    "## Protaganists\n",
+    "###Not a header either\n",
+    "### Key Location One\n",
+    "## Protaganists\n",
+]
+
+class TestOutlineTree(unittest.TestCase):
+
+    def setUp(self):
+        self.tree = OutlineTree.parse(OUTLINE)
+
+    def test_sections_and_ids(self):
+        self.assertEqual([section.id for section in self.tree], [
+            "title",
+            "title/key-locations",
+            "title/key-locations/key-location-one",
+            "title/key-locations/key-location-one/hidden-door",
+            "title/key-locations/key-location-two",
+            "title/protaganists",
+            "title/protaganists/key-location-one",
+            "title/protaganists-2",
+        ])
+        door = self.tree["title/key-locations/key-location-one/hidden-door"]
+        self.assertEqual((door.level, door.title, door.line_number, door.index), (4, "Hidden Door", 5, 3))
+
+    def test_ids_are_stable(self):
+        self.assertEqual([s.id for s in OutlineTree.parse(OUTLINE)], [s.id for s in self.tree])
+
+    def test_parent_chain(self):
+        self.assertEqual([s.title for s in self.tree.ancestors("title/key-locations/key-location-one/hidden-door")], ["Title", "Key Locations", "Key Location One"])
+        self.assertEqual(self.tree["title/key-locations"].children, ["title/key-locations/key-location-one", "title/key-locations/key-location-two"])
+        self.assertEqual(
+            self.tree.header_path("title/key-locations/key-location-one/hidden-door"),
+            "## Key Locations\n### Key Location One\n#### Hidden Door ##\n",
+        )
+
+    def test_dependencies(self):
+        self.assertEqual(self.tree["title/key-locations"].depends_on, [])
+        self.assertEqual(self.tree["title/key-locations/key-location-one"].depends_on, ["title/key-locations"])
+        self.assertEqual(self.tree["title/key-locations/key-location-two"].depends_on, ["title/key-locations/key-location-one/hidden-door"])
+        for group in self.tree.subtrees():
+            ids = {section.id for section in group}
+            for section in group:
+                self.assertTrue(set(section.depends_on) <= ids)
+
+    def test_subtrees(self):
+        groups = [[section.title for section in group] for group in self.tree.subtrees()]
+        self.assertEqual(groups, [
+            ["Title"],
+            ["Key Locations", "Key Location One", "Hidden Door", "Key Location Two"],
+            ["Protaganists", "Key Location One"],
+            ["Protaganists"],
+        ])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import time
+import unittest
+from crews.pipeline import Pipeline, PipelineStopped, StageTimeout, parse_timeouts
+
+class TestPipeline(unittest.TestCase):
+
+    def test_parse_timeouts(self):
+        self.assertEqual(parse_timeouts("outline=600, fill=3600.5"), {"outline": 600.0, "fill": 3600.5})
+        self.assertEqual(parse_timeouts(None), {})
+
+    def test_stage_starts_at_boundary_inside_another_stage(self):
+        pipeline = Pipeline()
+        events = []
+        review_done = threading.Event()
+
+        def outline():
+            events.append("review")
+            pipeline.mark_done("review")
+            # The editor pass keeps going while the first session is drafted
+            self.assertTrue(review_done.wait(5))
+            events.append("edit")
+
+        def first_session():
+            events.append("first_session")
+            review_done.set()
+            return "session"
+
+        pipeline.add("outline", outline)
+        pipeline.add("first_session", first_session, after=["review"])
+        pipeline.add("fill", lambda: events.append("fill"), after=["outline"])
+        results = pipeline.run_sync()
+
+        self.assertEqual(events, ["review", "first_session", "edit", "fill"])
+        self.assertEqual(results["first_session"], "session")
+
+    def test_done_stages_do_not_wait(self):
+        pipeline = Pipeline(done=["outline"])
+        pipeline.add("fill", lambda: "filled", after=["outline"])
+        self.assertEqual(pipeline.run_sync(), {"fill": "filled"})
+
+    def test_coroutine_stage(self):
+        async def draft():
+            await asyncio.sleep(0)
+            return "draft"
+
+        pipeline = Pipeline()
+        pipeline.add("draft", draft)
+        self.assertEqual(pipeline.run_sync(), {"draft": "draft"})
+
+    def test_timeout_stops_the_rest(self):
+        pipeline = Pipeline()
+        sections = []
+
+        def fill():
+            for number in range(100):
+                if pipeline.stopping.is_set():
+                    raise PipelineStopped()
+                sections.append(number)
+                time.sleep(0.01)
+
+        pipeline.add("outline", lambda: time.sleep(0.3), timeout=0.05)
+        pipeline.add("fill", fill)
+        with self.assertRaises(StageTimeout) as raised:
+            pipeline.run_sync()
+        self.assertEqual(raised.exception.stage, "outline")
+        self.assertTrue(pipeline.stopping.is_set())
+        self.assertLess(len(sections), 100)
+
+    def test_timeout_does_not_wait_for_the_thread(self):
+        pipeline = Pipeline()
+        release = threading.Event()
+        pipeline.add("outline", lambda: release.wait(5), timeout=0.2)
+        start = time.monotonic()
+        try:
+            with self.assertRaises(StageTimeout):
+                pipeline.run_sync()
+            self.assertLess(time.monotonic() - start, 1.5)
+        finally:
+            release.set()
+
+    def test_failure_cancels_waiting_stages(self):
+        pipeline = Pipeline()
+        ran = []
+
+        def outline():
+            raise RuntimeError("outline failed")
+
+        pipeline.add("outline", outline)
+        pipeline.add("fill", lambda: ran.append("fill"), after=["outline"])
+        with self.assertRaisesRegex(RuntimeError, "outline failed"):
+            pipeline.run_sync()
+        self.assertEqual(ran, [])
+        self.assertFalse(pipeline.is_done("outline"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import importlib.util
+import unittest
+from typing import Any, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from crews.prompts import PromptProfiler, StablePrefixes, common_prefix_length, common_suffix_length, restore_cache_control
+from crews.rate_limit import RateLimitedChatModel, RateScheduler
+
+class RecordingChatModel(BaseChatModel):
+    seen: list = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        self.seen.append(messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="ok"))])
+
+PREFIX = "You are Writer. " + "A long backstory line.\n" * 40
+
+class TestPrompts(unittest.TestCase):
+
+    def test_common_prefix_and_suffix(self):
+        self.assertEqual(common_prefix_length("abcdef", "abcxef"), 3)
+        self.assertEqual(common_prefix_length("abc", "abcd"), 3)
+        self.assertEqual(common_prefix_length("", "abc"), 0)
+        self.assertEqual(common_suffix_length("xxhello", "yhello"), 5)
+        self.assertEqual(common_suffix_length("hello", "hello", limit=2), 2)
+
+    def test_profiler(self):
+        profiler = PromptProfiler(label=lambda: "fill_section (Writer)")
+        for section in ("## Places", "### The Harbor at Dawn"):
+            profiler.on_chat_model_start({}, [[HumanMessage(content=f"{PREFIX}Section: {section}\nAnswer in markdown.")]])
+
+        [row] = profiler.report()
+        self.assertEqual(row["prompt"], "fill_section (Writer)")
+        self.assertEqual(row["calls"], 2)
+        self.assertGreater(row["static_prefix_tokens"], 200)
+        self.assertGreater(row["static_suffix_tokens"], 0)
+        self.assertGreater(row["dynamic_tokens"], 0)
+        self.assertGreater(row["static_share"], 0.9)
+        self.assertIn("fill_section (Writer)", profiler.format_report())
+
+    def test_stable_prefix_is_marked_from_the_second_call(self):
+        prefixes = StablePrefixes(min_tokens=100)
+        first = [HumanMessage(content=PREFIX + "Section: ## Places\n")]
+        self.assertIs(prefixes.mark(first), first)
+
+        second = prefixes.mark([HumanMessage(content=PREFIX + "Section: ## People\n")])
+        blocks = second[0].content
+        self.assertEqual(blocks[0]["cache_control"], {"type": "ephemeral"})
+        self.assertEqual(blocks[0]["text"] + blocks[1]["text"], PREFIX + "Section: ## People\n")
+        # Cut at the last line break the prompts share
+        self.assertEqual(blocks[0]["text"], PREFIX)
+        self.assertEqual(prefixes.marked, 1)
+
+    def test_prefix_without_a_line_break(self):
+        prefixes = StablePrefixes(min_tokens=10)
+        stable = "You are Writer, " * 40
+        self.assertEqual(prefixes.learn(stable + "section one"), "")
+        # Cut where the prompts part, not at a line break there isn't
+        self.assertEqual(prefixes.learn(stable + "section two"), stable + "section ")
+        self.assertEqual(prefixes.learn(stable + "section three"), stable + "section ")
+        self.assertEqual(prefixes.marked, 2)
+
+    def test_system_messages_are_not_marked(self):
+        prefixes = StablePrefixes(min_tokens=100)
+        for section in ("## Places", "## People"):
+            messages = [SystemMessage(content=PREFIX + section), HumanMessage(content=section)]
+            self.assertIs(prefixes.mark(messages), messages)
+
+    def test_restore_cache_control(self):
+        prefixes = StablePrefixes(min_tokens=100)
+        prefixes.mark([HumanMessage(content=PREFIX + "Section: ## Places\n")])
+        messages = prefixes.mark([HumanMessage(content=PREFIX + "Section: ## People\n")])
+        # What a formatter that keeps only the text makes of them
+        request = [{"role": "user", "content": [{"type": "text", "text": block["text"]} for block in messages[0].content]}]
+        restore_cache_control(messages, request)
+        self.assertEqual(request[0]["content"][0], {"type": "text", "text": PREFIX, "cache_control": {"type": "ephemeral"}})
+        self.assertNotIn("cache_control", request[0]["content"][1])
+
+    @unittest.skipUnless(importlib.util.find_spec("langchain_anthropic"), "needs langchain-anthropic")
+    def test_cache_control_reaches_the_anthropic_request(self):
+        from crews.anthropic_cache import CachingChatAnthropic
+
+        prefixes = StablePrefixes(min_tokens=100)
+        prefixes.mark([HumanMessage(content=PREFIX + "Section: ## Places\n")])
+        messages = prefixes.mark([HumanMessage(content=PREFIX + "Section: ## People\n")])
+        llm = CachingChatAnthropic(model="claude-3-haiku-20240307", api_key="test")
+        params = llm._format_params(messages=messages)
+        self.assertEqual(params["messages"], [{"role": "user", "content": [
+            {"type": "text", "text": PREFIX, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": "Section: ## People\n"},
+        ]}])
+
+    def test_short_prefixes_are_not_marked(self):
+        prefixes = StablePrefixes(min_tokens=5000)
+        for section in ("## Places", "## People"):
+            messages = [HumanMessage(content=PREFIX + section)]
+            self.assertIs(prefixes.mark(messages), messages)
+
+    def test_rate_limited_model_marks_prompts(self):
+        inner = RecordingChatModel(seen=[])
+        llm = RateLimitedChatModel(llm=inner, scheduler=RateScheduler(), prompt_prefixes=StablePrefixes(min_tokens=100))
+        llm.invoke(PREFIX + "Section: ## Places\n")
+        llm.invoke(PREFIX + "Section: ## People\n")
+        self.assertIsInstance(inner.seen[0][0].content, str)
+        self.assertEqual(inner.seen[1][0].content[0]["text"], PREFIX)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import threading
+import time
+import unittest
+from typing import Any, List, Optional
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from crews.rate_limit import RateLimitedChatModel, RateScheduler, TokenBucket, current_lane, request_lane
+
+class RateLimitError(Exception):
+    status_code = 429
+
+class FlakyChatModel(BaseChatModel):
+    """Fails with a rate-limit error `failures` times, then answers with its token usage."""
+
+    failures: int = 0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "flaky"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RateLimitError("slow down")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="ok"))], llm_output={"usage": {"input_tokens": 40, "output_tokens": 10}})
+
+class RetryRecorder(BaseCallbackHandler):
+    def __init__(self):
+        self.states = []
+
+    def on_retry(self, retry_state: Any, **kwargs: Any) -> None:
+        self.states.append(retry_state)
+
+class TestRateScheduler(unittest.TestCase):
+
+    def test_bucket_refills(self):
+        bucket = TokenBucket(600)
+        bucket.level = 0
+        bucket.updated -= 0.5
+        bucket.refill(bucket.updated + 0.5)
+        self.assertAlmostEqual(bucket.level, 5)
+        self.assertAlmostEqual(bucket.wait_time(6), 0.1)
+
+    def test_requests_wait_for_the_bucket(self):
+        scheduler = RateScheduler(rpm=600)
+        scheduler.requests.level = 1
+        start = time.monotonic()
+        scheduler.acquire()
+        scheduler.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_tokens_settle_into_debt(self):
+        scheduler = RateScheduler(tpm=6000)
+        scheduler.acquire(tokens=100)
+        scheduler.settle(100, 7000)
+        self.assertLess(scheduler.tokens.level, 0)
+
+    def test_higher_lanes_go_first(self):
+        scheduler = RateScheduler(rpm=1200)
+        scheduler.requests.level = 0
+        order = []
+
+        def request(lane: str):
+            scheduler.acquire(lane)
+            order.append(lane)
+
+        threads = [threading.Thread(target=request, args=("bulk",)) for _ in range(3)]
+        threads.append(threading.Thread(target=request, args=("outline",)))
+        threads.append(threading.Thread(target=request, args=("interactive",)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(order[:2], ["interactive", "outline"])
+        self.assertEqual(order[2:], ["bulk"] * 3)
+
+    def test_backoff_pauses_and_slows(self):
+        scheduler = RateScheduler(rpm=600, base_delay=0.05)
+        first = scheduler.backoff()
+        second = scheduler.backoff()
+        self.assertLessEqual(first, 0.05)
+        self.assertGreater(second, 0.049)
+        self.assertEqual(scheduler.scale, 0.25)
+        self.assertEqual(scheduler.backoff(retry_after=0.2), 0.2)
+        scheduler.success(0.1)
+        self.assertAlmostEqual(scheduler.scale, 0.175)
+
+    def test_request_lane(self):
+        self.assertEqual(current_lane(), "interactive")
+        with request_lane("bulk"):
+            self.assertEqual(current_lane(), "bulk")
+        self.assertEqual(current_lane(), "interactive")
+        with self.assertRaises(ValueError):
+            with request_lane("express"):
+                pass
+
+class TestRateLimitedChatModel(unittest.TestCase):
+
+    def test_retries_rate_limit_errors(self):
+        scheduler = RateScheduler(rpm=6000, tpm=60000, base_delay=0.01)
+        inner = FlakyChatModel(failures=2)
+        llm = RateLimitedChatModel(llm=inner, scheduler=scheduler)
+        self.assertEqual(llm.invoke("hello").content, "ok")
+        self.assertEqual(inner.calls, 3)
+        self.assertEqual(scheduler.rate_limited, 2)
+        # Two failed attempts at the 2-token estimate for "hello", then one that used 50 tokens
+        self.assertAlmostEqual(scheduler.tokens.level, 60000 - 2 * 2 - 50, delta=5)
+
+    def test_retries_are_reported_to_callbacks(self):
+        handler = RetryRecorder()
+        llm = RateLimitedChatModel(llm=FlakyChatModel(failures=2), scheduler=RateScheduler(base_delay=0.01), callbacks=[handler])
+        llm.invoke("hello")
+        self.assertEqual([state.attempt_number for state in handler.states], [1, 2])
+        self.assertIsInstance(handler.states[0].outcome.exception(), RateLimitError)
+
+    def test_stream_settles_and_recovers(self):
+        scheduler = RateScheduler(rpm=6000, tpm=60000)
+        scheduler.scale = 0.5
+        llm = RateLimitedChatModel(llm=FakeListChatModel(responses=["a streamed answer"]), scheduler=scheduler)
+        self.assertEqual("".join(chunk.content for chunk in llm.stream("hello")), "a streamed answer")
+        self.assertGreater(scheduler.scale, 0.5)
+        # The 2-token estimate for "hello", settled to that plus the 5 tokens streamed back
+        self.assertAlmostEqual(scheduler.tokens.level, 60000 - 2 - 5, delta=1)
+
+    def test_gives_up_after_max_retries(self):
+        llm = RateLimitedChatModel(llm=FlakyChatModel(failures=5), scheduler=RateScheduler(base_delay=0.01), max_retries=1)
+        with self.assertRaises(RateLimitError):
+            llm.invoke("hello")
+
+    def test_other_errors_are_not_retried(self):
+        inner = FakeListChatModel(responses=[])
+        llm = RateLimitedChatModel(llm=inner, scheduler=RateScheduler())
+        with self.assertRaises(IndexError):
+            llm.invoke("hello")
+
+    def test_cache_key_matches_inner_model(self):
+        inner = FakeListChatModel(responses=["a"])
+        llm = RateLimitedChatModel(llm=inner, scheduler=RateScheduler())
+        self.assertEqual(llm._get_llm_string(), inner._get_llm_string())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from crews.search_cache import CachingSearchTool, FakeSearch, SearchCache, normalize_query
+
+class TestSearchCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "search.sqlite")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query("The Sunken Kingdom?"), normalize_query("sunken  kingdom"))
+        self.assertEqual(normalize_query("kingdom, sunken"), "kingdom sunken")
+        self.assertNotEqual(normalize_query("sunken kingdom"), normalize_query("sunken city"))
+        # A query of nothing but filler words is kept as it is
+        self.assertEqual(normalize_query("Who is the"), "who is the")
+
+    def test_normalize_keeps_meaning(self):
+        self.assertNotEqual(normalize_query("dog bites man"), normalize_query("man bites dog"))
+        self.assertEqual(normalize_query("東京の天気"), "東京の天気")
+        self.assertEqual(normalize_query("Париж?"), "париж")
+        self.assertNotEqual(normalize_query("東京の天気"), normalize_query("Париж"))
+        self.assertEqual(normalize_query("C++ templates"), "c++ templates")
+        self.assertNotEqual(normalize_query("C++"), normalize_query("C#"))
+        self.assertEqual(normalize_query("  ??? "), "???")
+        self.assertNotEqual(normalize_query("???"), normalize_query("!!!"))
+
+    def test_different_scripts_do_not_share_results(self):
+        backend = FakeSearch({"東京の天気": "Sunny in Tokyo.", "Париж": "Rainy in Paris."})
+        cache = SearchCache(self.path)
+        self.assertEqual(cache.search("東京の天気", backend.run), "Sunny in Tokyo.")
+        self.assertEqual(cache.search("Париж", backend.run), "Rainy in Paris.")
+        self.assertEqual(backend.calls, 2)
+
+    def test_near_duplicates_hit(self):
+        backend = FakeSearch({"sunken kingdom": "Atlantis, mostly."})
+        cache = SearchCache(self.path)
+        self.assertEqual(cache.search("Sunken Kingdom", backend.run), "Atlantis, mostly.")
+        self.assertEqual(cache.search("the sunken kingdom?", backend.run), "Atlantis, mostly.")
+        self.assertEqual(backend.calls, 1)
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "coalesced": 0, "entries": 1})
+
+    def test_persists_across_instances(self):
+        backend = FakeSearch()
+        SearchCache(self.path).search("clockwork city", backend.run)
+        self.assertEqual(SearchCache(self.path).get("Clockwork City"), backend.run("clockwork city"))
+
+    def test_ttl(self):
+        backend = FakeSearch()
+        cache = SearchCache(self.path, ttl=60)
+        cache.search("clockwork city", backend.run)
+        with mock.patch("crews.search_cache.time.time", return_value=time.time() + 61):
+            self.assertIsNone(cache.get("clockwork city"))
+        self.assertEqual(cache.count(), 0)
+
+    def test_failures_are_not_cached(self):
+        def failing(query):
+            raise RuntimeError("network down")
+
+        cache = SearchCache(self.path)
+        with self.assertRaises(RuntimeError):
+            cache.search("clockwork city", failing)
+        self.assertEqual(cache.count(), 0)
+        self.assertEqual(cache.search("clockwork city", FakeSearch({"clockwork city": "Gears."}).run), "Gears.")
+
+    def test_concurrent_queries_coalesce(self):
+        backend = FakeSearch(latency=0.2)
+        cache = SearchCache(self.path)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.search("Clockwork city", backend.run))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(backend.calls, 1)
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(cache.stats()["coalesced"], 4)
+
+    def test_tool(self):
+        backend = FakeSearch({"sunken kingdom": "Atlantis, mostly."})
+        tool = CachingSearchTool(name="duckduckgo_search", description="A search engine.", search=backend, cache=SearchCache(self.path))
+        self.assertEqual(tool.run("Sunken Kingdom"), "Atlantis, mostly.")
+        self.assertEqual(tool.run("sunken kingdom"), "Atlantis, mostly.")
+        self.assertEqual(backend.calls, 1)
+
+if __name__ == '__main__':
+    unittest.main()
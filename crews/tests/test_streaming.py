@@ -0,0 +1,31 @@
+import unittest
+from crews.streaming import FinalAnswerStreamer
+
+class TestFinalAnswerStreamer(unittest.TestCase):
+
+    def stream(self, streamer, tokens):
+        for token in tokens:
+            streamer.on_llm_new_token(token)
+
+    def test_forwards_only_the_final_answer(self):
+        received = []
+        streamer = FinalAnswerStreamer(received.append)
+        self.stream(streamer, ["Thought: I now", " can give", " a great answer\nFinal", " Ans", "wer:", " ", "The clock", " tower", " hums."])
+        self.assertEqual("".join(received), "The clock tower hums.")
+
+    def test_marker_and_answer_in_one_token(self):
+        received = []
+        streamer = FinalAnswerStreamer(received.append)
+        self.stream(streamer, ["Thought: done\nFinal Answer: The", " end"])
+        self.assertEqual(received, ["The", " end"])
+
+    def test_new_llm_call_resets(self):
+        received = []
+        streamer = FinalAnswerStreamer(received.append)
+        self.stream(streamer, ["Final Answer: first"])
+        streamer.on_chat_model_start({}, [])
+        self.stream(streamer, ["Thought: using a tool", "\nAction: search"])
+        self.assertEqual(received, ["first"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from langchain_core.agents import AgentAction
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+from crews.llm_cache import PersistentLLMCache
+from crews.rate_limit import RateLimitedChatModel, RateScheduler
+from crews.tracing import Tracer, usage
+from tests.test_rate_limit import FlakyChatModel
+
+class TestTracer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "trace.jsonl")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def read(self):
+        with open(self.path, 'r', encoding='utf-8') as file:
+            return [json.loads(line) for line in file]
+
+    def test_tasks_within_kickoff(self):
+        tracer = Tracer(self.path)
+        llm = FakeListChatModel(responses=["a", "b", "c"], callbacks=[tracer.handler])
+        with tracer.kickoff("outline", tasks=[("01_outline_init", "Writer"), ("02_game_master_review", "Game Master")]):
+            llm.invoke("first")
+            tracer.step_callback((AgentAction("search", "query", ""), "result"))
+            tracer.task_done()
+            llm.invoke("second")
+            llm.invoke("third")
+
+        records = self.read()
+        self.assertEqual([(r["type"], r["name"], r["agent"]) for r in records], [
+            ("task", "01_outline_init", "Writer"),
+            ("task", "02_game_master_review", "Game Master"),
+            ("kickoff", "outline", None),
+        ])
+        self.assertEqual([r["llm_calls"] for r in records], [1, 2, 3])
+        self.assertEqual([r["tool_calls"] for r in records], [1, 0, 1])
+        self.assertEqual(records[0]["parent"], records[2]["id"])
+
+        metrics = tracer.metrics()
+        self.assertEqual(metrics["agents"]["Game Master"]["llm_calls"], 2)
+        self.assertEqual(metrics["kickoffs"]["outline"]["count"], 1)
+
+    def test_calls_outside_a_kickoff_are_ignored(self):
+        tracer = Tracer()
+        FakeListChatModel(responses=["a"], callbacks=[tracer.handler]).invoke("prompt")
+        self.assertEqual(tracer.records, [])
+
+    def test_failed_kickoff_is_recorded(self):
+        tracer = Tracer(self.path)
+        with self.assertRaises(RuntimeError):
+            with tracer.kickoff("fill_section", tasks=[("fill_section", "Writer")], section="## One"):
+                raise RuntimeError("boom")
+        task, kickoff = self.read()
+        self.assertEqual(kickoff["errors"], 1)
+        self.assertEqual(kickoff["section"], "## One")
+        self.assertEqual(task["name"], "fill_section")
+
+    def test_threads_are_traced_separately(self):
+        tracer = Tracer()
+
+        def fill(section: str, calls: int):
+            llm = FakeListChatModel(responses=["body"] * calls, callbacks=[tracer.handler])
+            with tracer.kickoff("fill_section", tasks=[("fill_section", "Writer")], section=section):
+                for _ in range(calls):
+                    llm.invoke(section)
+
+        threads = [threading.Thread(target=fill, args=(f"## {i}", i)) for i in range(1, 5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        calls = {r["section"]: r["llm_calls"] for r in tracer.records if r["type"] == "kickoff"}
+        self.assertEqual(calls, {"## 1": 1, "## 2": 2, "## 3": 3, "## 4": 4})
+        self.assertEqual(tracer.slowest(1, key="llm_calls")[0]["section"], "## 4")
+        self.assertEqual(tracer.metrics()["tasks"]["fill_section"]["llm_calls"], 10)
+
+    def test_cache_hits_do_not_count_tokens(self):
+        tracer = Tracer()
+        cache = PersistentLLMCache(os.path.join(self.tmp_dir.name, "cache.sqlite"))
+        cache.on_lookup = tracer.cache_lookup
+        with tracer.kickoff("fill_section"):
+            for _ in range(2):
+                FakeListChatModel(responses=["answer"], cache=cache, callbacks=[tracer.handler]).invoke("prompt")
+        record = tracer.records[0]
+        self.assertEqual(record["llm_calls"], 2)
+        self.assertEqual(record["cache_hits"], 1)
+
+    def test_rate_limit_retries_are_counted(self):
+        tracer = Tracer()
+        llm = RateLimitedChatModel(llm=FlakyChatModel(failures=2), scheduler=RateScheduler(base_delay=0.01), callbacks=[tracer.handler])
+        with tracer.kickoff("outline"):
+            llm.invoke("hello")
+        self.assertEqual(tracer.records[0]["retries"], 2)
+        self.assertEqual(tracer.metrics()["kickoffs"]["outline"]["retries"], 2)
+
+    def test_usage(self):
+        message = AIMessage(content="x", usage_metadata={"input_tokens": 12, "output_tokens": 3, "total_tokens": 15})
+        self.assertEqual(usage(LLMResult(generations=[[ChatGeneration(message=message)]])), (12, 3))
+        result = LLMResult(generations=[[ChatGeneration(message=AIMessage(content="x"))]], llm_output={"usage": {"input_tokens": 7, "output_tokens": 2}})
+        self.assertEqual(usage(result), (7, 2))
+
+if __name__ == '__main__':
+    unittest.main()
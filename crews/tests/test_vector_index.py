@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+from crews.vector_index import VectorIndex, hash_features
+
+class TestVectorIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "vectors.jsonl")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_hash_features(self):
+        vector = hash_features("The clock tower, the clock.")
+        self.assertAlmostEqual(sum(weight * weight for weight in vector.values()), 1.0)
+        self.assertEqual(vector, hash_features("the CLOCK tower the clock"))
+        self.assertEqual(hash_features(""), {})
+
+    def test_search_ranks_by_similarity(self):
+        index = VectorIndex(self.path)
+        index.add("04_design_doc", "Doctor Vex", "A rogue chronomancer who hides in the clock tower.")
+        index.add("04_design_doc", "Captain Mira", "Sails the harbor on a ship from another century.")
+        index.add("03_editor_review", "The Clock Tower", "### The Clock Tower")
+        results = index.search("who hides in the clock tower", k=2)
+        self.assertEqual([chunk.title for _, chunk in results], ["Doctor Vex", "The Clock Tower"])
+        self.assertEqual([chunk.title for _, chunk in index.search("clock tower", source="03_editor_review")], ["The Clock Tower"])
+        self.assertEqual(index.search("nothing matches zzz"), [])
+
+    def test_persists_and_replaces(self):
+        index = VectorIndex(self.path, chunk_chars=40)
+        index.add("doc", "Vex", "First paragraph about Vex.\n\nSecond paragraph about the tower.")
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.add("doc", "Vex", "First paragraph about Vex.\n\nSecond paragraph about the tower."), 0)
+        index.add("doc", "Vex", "Rewritten: Vex sails the harbor.")
+        self.assertEqual(len(index), 1)
+
+        reloaded = VectorIndex(self.path)
+        self.assertEqual(len(reloaded), 1)
+        self.assertEqual(reloaded.search("tower"), [])
+        self.assertEqual(reloaded.search("harbor")[0][1].text, "Rewritten: Vex sails the harbor.")
+
+    def test_refills_do_not_grow_the_index(self):
+        index = VectorIndex(self.path)
+        index.add("doc", "Harbor", "The harbor at dawn.")
+        index.add("doc", "Vex", "Vex bends time.")
+        postings = index.stats()["postings"]
+        for attempt in range(100):
+            index.add("doc", "Vex", f"Vex bends time, take {attempt}.")
+        stats = index.stats()
+        self.assertLessEqual(stats["postings"], postings + 10)
+        self.assertEqual(stats["slots"], 2)
+        with open(self.path, 'r', encoding='utf-8') as fh:
+            self.assertEqual(sum(1 for _ in fh), stats["records"])
+        self.assertLess(stats["records"], 25)
+
+        reloaded = VectorIndex(self.path)
+        self.assertEqual(len(reloaded), 2)
+        self.assertEqual(reloaded.search("take 99", k=1)[0][1].text, "Vex bends time, take 99.")
+        self.assertEqual(reloaded.search("harbor", k=1)[0][1].title, "Harbor")
+
+    def test_add_document(self):
+        doc = os.path.join(self.tmp_dir.name, "doc.md")
+        with open(doc, 'w', encoding='utf-8') as fh:
+            fh.write("# Title\n## Villains\n### Vex\nVex bends time.\n## Villains\n### Mira\nMira sails.\n")
+        index = VectorIndex(self.path)
+        self.assertEqual(index.add_document("doc", doc), 5)
+        self.assertEqual(index.add_document("doc", doc), 0)
+        self.assertEqual(index.search("bends time", k=1)[0][1].title, "Vex")
+
+if __name__ == '__main__':
+    unittest.main()